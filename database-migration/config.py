@@ -31,6 +31,99 @@ SCHEMA_EXTRACT_FILE = 'local_schema.sql'
 PRODUCTION_SCHEMA_FILE = 'production_schema.sql'
 MIGRATION_SCRIPT_FILE = 'migration_script.sql'
 DIFF_REPORT_FILE = 'schema_diff_report.txt'
+# Diferencias en NDJSON que escribe la comparación y lee generate
+DIFF_STREAM_FILE = 'schema_diff.ndjson'
+# Resultados de comparación memorizados en memoria, por par de huellas de
+# los catálogos (útil en procesos largos que comparan varias veces)
+DIFF_RESULT_CACHE_SIZE = 16
+LOCAL_SNAPSHOT_FILE = 'local_snapshot.json'
+PRODUCTION_SNAPSHOT_FILE = 'production_snapshot.json'
+
+# Comparación a tres bandas (compare-3way, generate --three-way): snapshot base
+# con el esquema de producción tras la última migración aplicada (se guarda
+# con set-baseline y después de cada migrate) y reporte de la comparación
+BASELINE_SNAPSHOT_FILE = 'baseline_snapshot.json'
+THREE_WAY_REPORT_FILE = 'three_way_report.txt'
+
+# Plan de migración por bloqueos: las sentencias que bloquean una tabla más
+# de MIGRATION_ONLINE_MAX_SECONDS (MIGRATION_HOT_ONLINE_MAX_SECONDS en las
+# tablas calientes del punto de venta) van al script de la ventana de
+# mantenimiento. Las estimaciones usan el tamaño de las tablas de producción
+# y estas velocidades aproximadas.
+MAINTENANCE_SCRIPT_FILE = 'migration_maintenance.sql'
+# Índices sobre tablas grandes o calientes, con CREATE INDEX CONCURRENTLY
+# fuera de una transacción (migrate los ejecuta tras la fase en línea)
+CONCURRENT_INDEX_SCRIPT_FILE = 'migration_concurrent_indexes.sql'
+# Claves foráneas, CHECK y NOT NULL sobre tablas grandes en dos fases: se
+# añaden con NOT VALID en la fase en línea (solo catálogo) y se validan
+# después sin bloquear escrituras (migrate ejecuta este script tras los
+# índices concurrentes). Con False van a la ventana de mantenimiento.
+MIGRATION_TWO_PHASE_CONSTRAINTS = True
+VALIDATE_CONSTRAINTS_SCRIPT_FILE = 'migration_validate_constraints.sql'
+MIGRATION_HOT_TABLES = ['ventas', 'detalle_ventas', 'mesas', 'prefacturas', 'movimientos_inventario']
+MIGRATION_ONLINE_MAX_SECONDS = 2
+MIGRATION_HOT_ONLINE_MAX_SECONDS = 0.2
+MIGRATION_LOCK_TIMEOUT = '5s'
+MIGRATION_SCAN_BYTES_PER_SECOND = 100 * 1024 * 1024
+MIGRATION_INDEX_BYTES_PER_SECOND = 30 * 1024 * 1024
+MIGRATION_REWRITE_BYTES_PER_SECOND = 20 * 1024 * 1024
+
+# Migración propuesta por advise-indexes (CREATE/DROP INDEX CONCURRENTLY)
+INDEX_ADVICE_FILE = 'index_advice.sql'
+
+# Caché de snapshots: se reutiliza el esquema extraído mientras la huella del
+# catálogo no cambie y el snapshot tenga menos de SNAPSHOT_CACHE_TTL segundos
+SNAPSHOT_CACHE_DIR = 'snapshot_cache'
+SNAPSHOT_CACHE_TTL = 3600
+
+# Huellas normalizadas de las definiciones (sin comentarios ni diferencias de
+# formato), guardadas junto a la caché de snapshots para no volver a
+# normalizar definiciones ya vistas
+DEFINITION_FINGERPRINTS_FILE = 'definition_fingerprints.json.gz'
+DEFINITION_FINGERPRINTS_MAX = 200000
+
+# Modo de extracción de esquemas
+# - 'legacy': una conexión nueva por cada consulta del catálogo
+# - 'session': todas las consultas en una sola conexión, dentro de una
+#   transacción READ ONLY / REPEATABLE READ (snapshot consistente)
+# - 'json': el servidor construye el esquema completo como un único
+#   documento JSON (un solo viaje de ida y vuelta)
+EXTRACTION_MODES = ['legacy', 'session', 'json']
+EXTRACTION_MODE = 'session'
+
+# Comparación en streaming (--stream): cada tipo de objeto se lee ordenado
+# por clave con un cursor del servidor, de a STREAM_FETCH_SIZE filas, y se
+# compara con un merge join sin cargar el esquema completo en memoria.
+# Las definiciones diferidas se cargan en lotes de STREAM_LAZY_BATCH pares.
+STREAM_COMPARISON = False
+STREAM_FETCH_SIZE = 2000
+STREAM_LAZY_BATCH = 500
+
+# Comparar primero las definiciones de triggers y vistas por md5 y descargar
+# el texto completo solo de las que difieren (compare/generate). Las de
+# funciones siempre se cargan bajo demanda.
+HASH_FIRST_DEFINITIONS = False
+
+# Extraer también las funciones instaladas por extensiones (pg_depend
+# deptype 'e'). Los agregados se omiten siempre.
+INCLUDE_EXTENSION_FUNCTIONS = False
+
+# Flota de bases de datos (extract-fleet): archivo JSON con los destinos con
+# nombre, número máximo de extracciones simultáneas y carpeta de los snapshots
+# (dentro de OUTPUT_DIR)
+FLEET_CONFIG_FILE = 'fleet.json'
+FLEET_MAX_WORKERS = 8
+FLEET_SNAPSHOT_DIR = 'fleet'
+
+# Matriz de deriva (compare-fleet): JSON para tableros y filas de la matriz
+# que se muestran en consola
+FLEET_DRIFT_FILE = 'fleet_drift.json'
+FLEET_MATRIX_MAX_ROWS = 50
+
+# Esquemas visibles en el search_path de la sesión de extracción. pg_get_*
+# omite estos esquemas en los nombres, así que al leer un volcado de pg_dump
+# (que califica todo) se quitan para que coincida con la extracción en vivo
+DUMP_SEARCH_PATH = ['public']
 
 # Tipos de objetos a migrar
 MIGRATABLE_OBJECTS = [
@@ -2,16 +2,46 @@
 Gestor de conexiones y operaciones de base de datos
 """
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 from contextlib import contextmanager
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional
+import json
 import logging
-from config import LOCAL_DB_CONFIG, PRODUCTION_DB_CONFIG
+import os
+import re
+import time
+from config import LOCAL_DB_CONFIG, PRODUCTION_DB_CONFIG, STREAM_FETCH_SIZE
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class SnapshotSession:
+    """Sesión de solo lectura sobre una única conexión y un único snapshot"""
+    
+    def __init__(self, connection, connect_time: float = 0.0):
+        self.connection = connection
+        self.connect_time = connect_time
+        self.cursors = 0
+    
+    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Ejecutar una consulta dentro de la transacción de la sesión"""
+        with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    def iter_query(self, query: str, params: Optional[tuple] = None,
+                   itersize: int = STREAM_FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Recorrer el resultado con un cursor del servidor, pidiendo itersize
+        filas cada vez en lugar de cargarlo completo en memoria"""
+        self.cursors += 1
+        with self.connection.cursor(name=f"stream_{self.cursors}",
+                                    cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            yield from cursor
+
 class DatabaseManager:
     """Gestor de conexiones y operaciones de base de datos"""
     
@@ -42,6 +72,33 @@ class DatabaseManager:
                 cursor.execute(query, params)
                 return cursor.fetchall()
     
+    @contextmanager
+    def snapshot_session(self):
+        """Context manager que abre una sola conexión en una transacción
+        READ ONLY + REPEATABLE READ, de modo que todas las consultas vean
+        el mismo snapshot del catálogo"""
+        start = time.perf_counter()
+        with self.get_connection() as conn:
+            conn.set_session(
+                isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                readonly=True
+            )
+            session = SnapshotSession(conn, time.perf_counter() - start)
+            try:
+                yield session
+            finally:
+                # Transacción de solo lectura: no hay nada que confirmar
+                conn.rollback()
+    
+    @contextmanager
+    def autocommit_connection(self):
+        """Context manager con una conexión en modo autocommit, para las
+        sentencias que no pueden ejecutarse dentro de una transacción (p. ej.
+        CREATE INDEX CONCURRENTLY)"""
+        with self.get_connection() as conn:
+            conn.autocommit = True
+            yield conn
+    
     def execute_script(self, script: str) -> bool:
         """Ejecutar un script SQL completo"""
         try:
@@ -67,6 +124,35 @@ class DatabaseManager:
             logger.error(f"Error de conexión: {e}")
             return False
 
+def load_fleet_config(path: str) -> Dict[str, DatabaseManager]:
+    """Leer los destinos con nombre de un archivo JSON de flota.
+    
+    Formato: {"targets": [{"name": "staging", "dsn": "postgresql://..."}, ...]}.
+    En lugar de dsn se aceptan los parámetros de conexión (host, port, user,
+    database...), y password_env indica la variable de entorno de la contraseña."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    
+    targets = {}
+    for entry in data.get('targets', []):
+        config = dict(entry)
+        name = config.pop('name', None)
+        # El nombre se usa en los archivos de snapshot y de caché
+        if not isinstance(name, str) or not re.fullmatch(r'[\w.-]+', name):
+            raise ValueError(f"Nombre de destino no válido en {path}: {name!r}")
+        if name in targets:
+            raise ValueError(f"Destino duplicado en {path}: {name}")
+        password_env = config.pop('password_env', None)
+        if password_env:
+            config['password'] = os.getenv(password_env)
+        if not config:
+            raise ValueError(f"El destino {name} no tiene DSN ni parámetros de conexión")
+        targets[name] = DatabaseManager(config)
+    
+    if not targets:
+        raise ValueError(f"No hay destinos definidos en {path}")
+    return targets
+
 # Instancias globales
 local_db = DatabaseManager(LOCAL_DB_CONFIG)
 production_db = DatabaseManager(PRODUCTION_DB_CONFIG)
@@ -0,0 +1,145 @@
+"""
+Huellas normalizadas de definiciones (funciones, vistas y triggers)
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from typing import Optional
+from config import OUTPUT_DIR, SNAPSHOT_CACHE_DIR, DEFINITION_FINGERPRINTS_FILE, DEFINITION_FINGERPRINTS_MAX
+
+logger = logging.getLogger(__name__)
+
+# Cambiarla invalida las huellas guardadas (p. ej. al cambiar la normalización)
+NORMALIZATION_VERSION = 1
+
+_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<dollar>\$(?:[A-Za-z_\u0080-\uffff][A-Za-z0-9_\u0080-\uffff]*)?\$)
+  | (?P<word>[A-Za-z_\u0080-\uffff][A-Za-z0-9_$\u0080-\uffff]*)
+  | (?P<space>\s+)
+  | (?P<other>::|:=|<=|>=|<>|!=|\|\||=>|->>|->|.)
+""", re.S | re.X)
+
+# Identificador que no necesita comillas ("ventas" equivale a ventas)
+_PLAIN_IDENTIFIER = re.compile(r'[a-z_][a-z0-9_$]*')
+
+def normalize_definition(text: str) -> str:
+    """Normalizar una definición SQL o PL/pgSQL para compararla.
+    
+    Quita comentarios, deja un solo espacio entre tokens, pasa a minúsculas
+    las palabras sin comillas, quita las comillas innecesarias de los
+    identificadores y unifica las etiquetas $tag$ y EXECUTE PROCEDURE /
+    EXECUTE FUNCTION. Los literales de cadena se conservan tal cual."""
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        token = match.group()
+        if kind in ('comment', 'space'):
+            continue
+        if kind == 'word':
+            token = token.lower()
+            if token == 'procedure' and tokens and tokens[-1] == 'execute':
+                token = 'function'
+        elif kind == 'quoted':
+            name = token[1:-1].replace('""', '"')
+            if _PLAIN_IDENTIFIER.fullmatch(name):
+                token = name
+        elif kind == 'dollar':
+            token = '$$'
+        tokens.append(token)
+    
+    # El ; final es opcional (pg_get_viewdef lo incluye, information_schema no)
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return " ".join(tokens)
+
+def definition_fingerprint(text: str) -> str:
+    """Huella md5 de la definición normalizada"""
+    return hashlib.md5(normalize_definition(text).encode('utf-8')).hexdigest()
+
+def text_md5(text: str) -> str:
+    """md5 del texto original (el mismo que md5() en el servidor)"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+class FingerprintStore:
+    """Huellas normalizadas indexadas por la huella del texto original.
+    
+    Se guardan junto a la caché de snapshots, de modo que cada definición se
+    normaliza una sola vez: en las siguientes comparaciones basta con el md5
+    del texto (o el md5 que trae una extracción hash-first, o el source_md5 de
+    una función) para obtener su huella sin volver a normalizarla."""
+    
+    def __init__(self, path: Optional[str] = os.path.join(OUTPUT_DIR, SNAPSHOT_CACHE_DIR,
+                                                           DEFINITION_FINGERPRINTS_FILE),
+                 max_entries: int = DEFINITION_FINGERPRINTS_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self.fingerprints = {}
+        self.computed = 0
+        self.dirty = False
+        self.lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load()
+    
+    def _load(self):
+        """Leer las huellas guardadas (se ignoran las de otra versión)"""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron leer las huellas de {self.path}: {e}")
+            return
+        if data.get('version') == NORMALIZATION_VERSION:
+            self.fingerprints = data.get('fingerprints', {})
+    
+    def get(self, raw_key: str) -> Optional[str]:
+        """Huella normalizada guardada para una clave, si existe"""
+        with self.lock:
+            fingerprint = self.fingerprints.pop(raw_key, None)
+            if fingerprint is not None:
+                # Reinsertar para conservar las más usadas al recortar
+                self.fingerprints[raw_key] = fingerprint
+            return fingerprint
+    
+    def put(self, raw_key: str, fingerprint: str):
+        """Guardar la huella normalizada de una clave"""
+        with self.lock:
+            if self.fingerprints.get(raw_key) != fingerprint:
+                self.fingerprints.pop(raw_key, None)
+                self.fingerprints[raw_key] = fingerprint
+                self.dirty = True
+    
+    def fingerprint(self, text: str) -> str:
+        """Huella normalizada de un texto, normalizándolo solo la primera vez"""
+        raw_key = text_md5(text)
+        fingerprint = self.get(raw_key)
+        if fingerprint is None:
+            fingerprint = definition_fingerprint(text)
+            with self.lock:
+                self.computed += 1
+            self.put(raw_key, fingerprint)
+        return fingerprint
+    
+    def save(self):
+        """Guardar las huellas si hubo cambios, conservando las max_entries más recientes"""
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            excess = len(self.fingerprints) - self.max_entries
+            if excess > 0:
+                for raw_key in list(self.fingerprints)[:excess]:
+                    del self.fingerprints[raw_key]
+            
+            tmp_path = f"{self.path}.tmp"
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump({'version': NORMALIZATION_VERSION, 'fingerprints': self.fingerprints}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        logger.info(f"Huellas de definiciones guardadas en {self.path} ({len(self.fingerprints)})")
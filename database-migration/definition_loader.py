@@ -0,0 +1,43 @@
+"""
+Carga bajo demanda de definiciones extensas del catálogo
+"""
+import threading
+import logging
+from typing import Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+class DefinitionLoader:
+    """Cargador de definiciones por clave con memorización.
+    
+    Cada llamada a load pide al servidor, en una sola consulta, solo las
+    claves que todavía no se cargaron. La consulta recibe las claves en
+    %(keys)s y devuelve las columnas key y value."""
+    
+    def __init__(self, db_manager, query: str, label: str = "definiciones"):
+        self.db_manager = db_manager
+        self.query = query
+        self.label = label
+        self.values = {}
+        self.queries = 0
+        self.lock = threading.Lock()
+    
+    def load(self, keys: List[Any]) -> Dict[str, Any]:
+        """Obtener los valores de las claves, cargando las que falten"""
+        with self.lock:
+            missing = list(dict.fromkeys(key for key in keys if key not in self.values))
+            if missing:
+                rows = self.db_manager.execute_query(self.query, {'keys': missing})
+                for row in rows:
+                    self.values[row['key']] = row['value']
+                # Objetos eliminados desde la extracción
+                for key in missing:
+                    self.values.setdefault(key, None)
+                self.queries += 1
+                logger.info(f"Cargadas bajo demanda {len(rows)} {self.label}")
+            return {key: self.values[key] for key in keys}
+    
+    @property
+    def loaded(self) -> int:
+        """Número de valores cargados hasta ahora"""
+        return len(self.values)
@@ -0,0 +1,55 @@
+"""
+Resultado inmutable de una comparación de esquemas
+"""
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Dict, List, Iterator, Optional, Tuple
+from config import MIGRATABLE_OBJECTS
+
+CHANGE_TYPES = ('added', 'removed', 'modified')
+
+def empty_differences() -> Dict[str, Dict[str, List]]:
+    """Diferencias vacías de todos los tipos de objeto, para llenarlas durante una comparación"""
+    return {object_type: {change_type: [] for change_type in CHANGE_TYPES} for object_type in MIGRATABLE_OBJECTS}
+
+class DiffResult(Mapping):
+    """Diferencias de una comparación, de solo lectura.
+    
+    Se usa igual que el diccionario {tipo: {'added'|'removed'|'modified': [...]}}
+    que reemplaza, pero las listas son tuplas y los diccionarios vistas de solo
+    lectura, de modo que un resultado memorizado se puede entregar muchas
+    veces sin que nadie lo altere. key identifica la comparación (el par de
+    huellas de los catálogos local y de producción) o es None."""
+    
+    __slots__ = ('key', '_differences')
+    
+    def __init__(self, differences: Dict[str, Dict[str, List]], key: Optional[Tuple[str, str]] = None):
+        self.key = key
+        self._differences = MappingProxyType({
+            object_type: MappingProxyType({
+                change_type: tuple(MappingProxyType(dict(change)) if change_type == 'modified' else change
+                                   for change in changes.get(change_type, ()))
+                for change_type in CHANGE_TYPES
+            })
+            for object_type, changes in differences.items()
+        })
+    
+    def __getitem__(self, object_type: str) -> Mapping:
+        return self._differences[object_type]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._differences)
+    
+    def __len__(self) -> int:
+        return len(self._differences)
+    
+    def __repr__(self) -> str:
+        return f"<DiffResult {self.count()} diferencias>"
+    
+    def count(self) -> int:
+        """Número total de objetos añadidos, removidos y modificados"""
+        return sum(len(objects) for changes in self._differences.values() for objects in changes.values())
+    
+    def has_changes(self) -> bool:
+        """Verificar si hay cambios pendientes"""
+        return any(objects for changes in self._differences.values() for objects in changes.values())
@@ -0,0 +1,95 @@
+"""
+Diferencias de esquema en NDJSON (una línea JSON por objeto)
+"""
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from schema_model import SchemaObject, make_schema_object
+from diff_result import CHANGE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Cambiarla invalida los archivos de diferencias anteriores
+DIFF_FORMAT_VERSION = 1
+
+def _to_dict(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Objeto de esquema como diccionario serializable"""
+    return obj.to_dict() if isinstance(obj, SchemaObject) else dict(obj)
+
+class DiffWriter:
+    """Escritor de diferencias en NDJSON, línea a línea, a medida que el
+    comparador clasifica cada tipo de objeto.
+    
+    La primera línea es una cabecera con el formato y los metadatos de la
+    comparación (p. ej. las huellas de ambos catálogos); cada línea siguiente
+    es un objeto añadido o removido, o el par local/producción de uno
+    modificado. Se escribe en un archivo temporal que solo reemplaza al
+    anterior si la comparación termina bien."""
+    
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.metadata = metadata or {}
+        self.counts = {}
+        self.file = None
+    
+    def __enter__(self) -> 'DiffWriter':
+        self.file = open(f"{self.path}.tmp", 'w', encoding='utf-8')
+        self._write_line({'format': 'schema-diff', 'version': DIFF_FORMAT_VERSION,
+                          'created_at': time.time(), **self.metadata})
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(f"{self.path}.tmp", self.path)
+            logger.info(f"Diferencias guardadas en {self.path} ({sum(self.counts.values())} objetos)")
+        else:
+            os.remove(f"{self.path}.tmp")
+        return False
+    
+    def _write_line(self, entry: Dict[str, Any]):
+        self.file.write(json.dumps(entry, ensure_ascii=False, default=str))
+        self.file.write("\n")
+    
+    def write(self, object_type: str, change_type: str, obj: Dict[str, Any]):
+        """Escribir una diferencia (para 'modified', obj es {'local': ..., 'production': ...})"""
+        entry = {'type': object_type, 'change': change_type}
+        if change_type == 'modified':
+            entry['local'] = _to_dict(obj['local'])
+            entry['production'] = _to_dict(obj['production'])
+        else:
+            entry['object'] = _to_dict(obj)
+        self._write_line(entry)
+        self.counts[object_type] = self.counts.get(object_type, 0) + 1
+
+def _check_header(header: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Verificar que la cabecera corresponde a un archivo de DiffWriter"""
+    if header.get('format') != 'schema-diff' or header.get('version') != DIFF_FORMAT_VERSION:
+        raise ValueError(f"Formato de diferencias no soportado en {path}")
+    return header
+
+def read_diff_header(path: str) -> Dict[str, Any]:
+    """Leer solo la cabecera de un archivo de diferencias"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return _check_header(json.loads(f.readline()), path)
+
+def read_diff_file(path: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, List]]]:
+    """Leer un archivo de DiffWriter. Retorna la cabecera y las diferencias
+    con la misma forma que SchemaComparator.differences."""
+    differences = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        header = _check_header(json.loads(f.readline()), path)
+        for line in f:
+            entry = json.loads(line)
+            object_type = entry['type']
+            changes = differences.setdefault(object_type, {change_type: [] for change_type in CHANGE_TYPES})
+            if entry['change'] == 'modified':
+                changes['modified'].append({
+                    'local': make_schema_object(object_type, entry['local']),
+                    'production': make_schema_object(object_type, entry['production'])
+                })
+            else:
+                changes[entry['change']].append(make_schema_object(object_type, entry['object']))
+    return header, differences
@@ -0,0 +1,96 @@
+"""
+Matriz de deriva de esquema: una referencia contra varias bases de datos
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from tabulate import tabulate
+from schema_model import get_object_key
+
+logger = logging.getLogger(__name__)
+
+# Estado de un objeto en un destino respecto a la referencia
+DRIFT_STATES = {
+    'added': 'missing',     # en la referencia, falta en el destino
+    'removed': 'extra',     # solo en el destino
+    'modified': 'modified'
+}
+DRIFT_SYMBOLS = {'missing': '✗ falta', 'extra': '+ sobra', 'modified': '~ distinto'}
+
+class DriftMatrix:
+    """Matriz objeto × base de datos con las diferencias de cada destino
+    respecto al esquema de referencia. Solo guarda las claves y el estado de
+    los objetos que difieren, no los objetos."""
+    
+    def __init__(self, reference: str, targets: List[str]):
+        self.reference = reference
+        self.targets = list(targets)
+        self.objects = {}
+        self.results = {name: {'status': 'pending', 'error': None, 'counts': {}} for name in targets}
+    
+    def add_target(self, name: str, differences: Dict[str, Dict[str, List]]):
+        """Registrar las diferencias de un destino (resultado de SchemaComparator)"""
+        counts = {state: 0 for state in DRIFT_STATES.values()}
+        for object_type, changes in differences.items():
+            for change_type, state in DRIFT_STATES.items():
+                for obj in changes[change_type]:
+                    if change_type == 'modified':
+                        obj = obj['local']
+                    key = (object_type, get_object_key(obj, object_type))
+                    self.objects.setdefault(key, {})[name] = state
+                    counts[state] += 1
+        self.results[name] = {'status': 'ok', 'error': None, 'counts': counts}
+    
+    def add_error(self, name: str, error: str):
+        """Registrar un destino que no se pudo comparar"""
+        self.results[name] = {'status': 'error', 'error': error, 'counts': {}}
+    
+    def get_summary_table(self) -> str:
+        """Tabla con el número de diferencias de cada destino"""
+        headers = ["Destino", "Estado", "Faltan", "Sobran", "Distintos", "Total"]
+        rows = []
+        for name in self.targets:
+            result = self.results[name]
+            if result['status'] != 'ok':
+                rows.append([name, f"❌ {result['error']}", '', '', '', ''])
+                continue
+            counts = result['counts']
+            total = sum(counts.values())
+            rows.append([name, '✅ igual' if total == 0 else '⚠️  deriva',
+                         counts['missing'], counts['extra'], counts['modified'], total])
+        return tabulate(rows, headers=headers, tablefmt="grid")
+    
+    def get_matrix_table(self, max_rows: Optional[int] = None) -> str:
+        """Tabla objeto × destino; vacía para los objetos iguales a la referencia"""
+        if not self.objects:
+            return "Todos los destinos coinciden con la referencia."
+        
+        keys = sorted(self.objects)
+        headers = ["Tipo", "Objeto"] + self.targets
+        rows = [[object_type, key] + [DRIFT_SYMBOLS.get(self.objects[(object_type, key)].get(name), '')
+                                      for name in self.targets]
+                for object_type, key in keys[:max_rows]]
+        table = tabulate(rows, headers=headers, tablefmt="grid")
+        if max_rows is not None and len(keys) > max_rows:
+            table += f"\n... y {len(keys) - max_rows} objetos más (ver el JSON)"
+        return table
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Representación JSON para tableros"""
+        return {
+            'reference': self.reference,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'targets': {name: self.results[name] for name in self.targets},
+            'objects': [
+                {'type': object_type, 'key': key, 'states': self.objects[(object_type, key)]}
+                for object_type, key in sorted(self.objects)
+            ]
+        }
+    
+    def save_json(self, filepath: str) -> str:
+        """Guardar la matriz como JSON"""
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        logger.info(f"Matriz de deriva guardada en {filepath}")
+        return filepath
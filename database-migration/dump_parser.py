@@ -0,0 +1,1067 @@
+"""
+Lectura de esquemas desde volcados de pg_dump (sin conexión a la base de datos)
+"""
+import os
+import re
+import gzip
+import tarfile
+import subprocess
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from config import EXCLUDED_SCHEMAS, DUMP_SEARCH_PATH
+
+logger = logging.getLogger(__name__)
+
+# Tipos de pg_catalog: nombre de format_type sin modificadores -> (typname, typcategory)
+BUILTIN_TYPES = {
+    'boolean': ('bool', 'B'),
+    'date': ('date', 'D'),
+    'time without time zone': ('time', 'D'),
+    'time with time zone': ('timetz', 'D'),
+    'timestamp without time zone': ('timestamp', 'D'),
+    'timestamp with time zone': ('timestamptz', 'D'),
+    'interval': ('interval', 'T'),
+    'smallint': ('int2', 'N'),
+    'integer': ('int4', 'N'),
+    'bigint': ('int8', 'N'),
+    'real': ('float4', 'N'),
+    'double precision': ('float8', 'N'),
+    'numeric': ('numeric', 'N'),
+    'money': ('money', 'N'),
+    'oid': ('oid', 'N'),
+    'regclass': ('regclass', 'N'),
+    'regtype': ('regtype', 'N'),
+    'regproc': ('regproc', 'N'),
+    'regprocedure': ('regprocedure', 'N'),
+    'regconfig': ('regconfig', 'N'),
+    'regnamespace': ('regnamespace', 'N'),
+    'regrole': ('regrole', 'N'),
+    'text': ('text', 'S'),
+    'name': ('name', 'S'),
+    'character': ('bpchar', 'S'),
+    'bpchar': ('bpchar', 'S'),
+    'character varying': ('varchar', 'S'),
+    '"char"': ('char', 'Z'),
+    'bit': ('bit', 'V'),
+    'bit varying': ('varbit', 'V'),
+    'bytea': ('bytea', 'U'),
+    'json': ('json', 'U'),
+    'jsonb': ('jsonb', 'U'),
+    'jsonpath': ('jsonpath', 'U'),
+    'uuid': ('uuid', 'U'),
+    'xml': ('xml', 'U'),
+    'macaddr': ('macaddr', 'U'),
+    'macaddr8': ('macaddr8', 'U'),
+    'tsvector': ('tsvector', 'U'),
+    'tsquery': ('tsquery', 'U'),
+    'pg_lsn': ('pg_lsn', 'U'),
+    'pg_snapshot': ('pg_snapshot', 'U'),
+    'txid_snapshot': ('txid_snapshot', 'U'),
+    'xid8': ('xid8', 'U'),
+    'tid': ('tid', 'U'),
+    'xid': ('xid', 'U'),
+    'cid': ('cid', 'U'),
+    'refcursor': ('refcursor', 'U'),
+    'inet': ('inet', 'I'),
+    'cidr': ('cidr', 'I'),
+    'point': ('point', 'G'),
+    'line': ('line', 'G'),
+    'lseg': ('lseg', 'G'),
+    'box': ('box', 'G'),
+    'path': ('path', 'G'),
+    'polygon': ('polygon', 'G'),
+    'circle': ('circle', 'G'),
+    'int4range': ('int4range', 'R'),
+    'int8range': ('int8range', 'R'),
+    'numrange': ('numrange', 'R'),
+    'tsrange': ('tsrange', 'R'),
+    'tstzrange': ('tstzrange', 'R'),
+    'daterange': ('daterange', 'R'),
+    'int4multirange': ('int4multirange', 'R'),
+    'int8multirange': ('int8multirange', 'R'),
+    'nummultirange': ('nummultirange', 'R'),
+    'tsmultirange': ('tsmultirange', 'R'),
+    'tstzmultirange': ('tstzmultirange', 'R'),
+    'datemultirange': ('datemultirange', 'R')
+}
+
+# Rango de valores de cada tipo de secuencia (mínimo, máximo)
+SEQUENCE_TYPE_RANGES = {
+    'smallint': (-32768, 32767),
+    'integer': (-2147483648, 2147483647),
+    'bigint': (-9223372036854775808, 9223372036854775807)
+}
+
+# Eventos que information_schema.triggers expone (una fila por evento)
+TRIGGER_EVENTS = ['INSERT', 'DELETE', 'UPDATE']
+
+# Orden de los atributos de función en pg_get_functiondef
+FUNCTION_ATTRIBUTES = re.compile(
+    r"WINDOW|IMMUTABLE|STABLE|PARALLEL (?:SAFE|RESTRICTED)|STRICT|SECURITY DEFINER|LEAKPROOF|"
+    r"COST \S+|ROWS \S+|SUPPORT \S+")
+FUNCTION_ATTRIBUTE_ORDER = ['WINDOW', 'IMMUTABLE', 'STABLE', 'PARALLEL', 'STRICT', 'SECURITY',
+                            'LEAKPROOF', 'COST', 'ROWS', 'SUPPORT']
+
+REFERENTIAL_ACTIONS = r"(CASCADE|RESTRICT|SET NULL|SET DEFAULT|NO ACTION)"
+
+IDENTIFIER = r'(?:"(?:[^"]|"")+"|[^\W\d][\w$]*)'
+QUALIFIED_NAME = rf'{IDENTIFIER}(?:\.{IDENTIFIER})?'
+
+_TOKEN = re.compile(r"""[Ee]'|'|"|\$(?:[^\W\d]\w*)?\$|--|/\*|[(),;]""")
+
+def _skip_quoted(text: str, pos: int, quote: str, backslash: bool = False) -> int:
+    """Posición siguiente al cierre de un literal o identificador entre comillas"""
+    while True:
+        end = text.find(quote, pos)
+        if end < 0:
+            return len(text)
+        if backslash:
+            escapes = 0
+            while text[end - 1 - escapes] == '\\':
+                escapes += 1
+            if escapes % 2:
+                pos = end + 1
+                continue
+        if text.startswith(quote, end + 1):
+            pos = end + 2
+            continue
+        return end + 1
+
+def iter_tokens(text: str, pos: int = 0):
+    """Recorrer los tokens estructurales ( ) , ; de un texto SQL, saltando
+    literales, identificadores entre comillas, cuerpos $$ y comentarios"""
+    while True:
+        match = _TOKEN.search(text, pos)
+        if match is None:
+            return
+        token = match.group()
+        start = match.start()
+        if token in '(),;':
+            yield start, token
+            pos = match.end()
+        elif token in ("E'", "e'") and (start == 0 or not (text[start - 1].isalnum() or text[start - 1] == '_')):
+            pos = _skip_quoted(text, match.end(), "'", backslash=True)
+        elif token.endswith("'"):
+            pos = _skip_quoted(text, start + len(token), "'")
+        elif token == '"':
+            pos = _skip_quoted(text, match.end(), '"')
+        elif token == '--':
+            end = text.find('\n', start)
+            pos = len(text) if end < 0 else end + 1
+        elif token == '/*':
+            end = text.find('*/', start + 2)
+            pos = len(text) if end < 0 else end + 2
+        elif start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+            # '$' dentro de un identificador (p. ej. foo$bar$)
+            pos = start + 1
+        else:
+            end = text.find(token, match.end())
+            pos = len(text) if end < 0 else end + len(token)
+
+def find_closing_paren(text: str, open_pos: int) -> int:
+    """Posición del paréntesis que cierra el abierto en open_pos"""
+    depth = 0
+    for pos, token in iter_tokens(text, open_pos):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if depth == 0:
+                return pos
+    raise ValueError(f"Paréntesis sin cerrar: {text[open_pos:open_pos + 60]}")
+
+def split_top_level(text: str) -> List[str]:
+    """Separar por comas que no estén dentro de paréntesis ni literales"""
+    parts = []
+    depth = 0
+    start = 0
+    for pos, token in iter_tokens(text):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif token == ',' and depth == 0:
+            parts.append(text[start:pos].strip())
+            start = pos + 1
+    last = text[start:].strip()
+    if last:
+        parts.append(last)
+    return parts
+
+def like_to_regex(pattern: str):
+    """Compilar un patrón LIKE (con \\ como escape) a expresión regular"""
+    regex = ""
+    escaped = False
+    for char in pattern:
+        if escaped:
+            regex += re.escape(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '%':
+            regex += '.*'
+        elif char == '_':
+            regex += '.'
+        else:
+            regex += re.escape(char)
+    return re.compile(regex + r'\Z', re.DOTALL)
+
+def unquote_identifier(identifier: str) -> str:
+    """Nombre real de un identificador (sin comillas dobles)"""
+    if identifier.startswith('"') and identifier.endswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+def split_qualified_name(name: str) -> Tuple[Optional[str], str]:
+    """Separar esquema y nombre de un identificador calificado"""
+    parts = re.findall(IDENTIFIER, name)
+    if len(parts) == 1:
+        return None, unquote_identifier(parts[0])
+    return unquote_identifier(parts[0]), unquote_identifier(parts[1])
+
+class DumpParser:
+    """Intérprete de volcados de pg_dump --schema-only.
+    
+    Produce el mismo diccionario de esquema que SchemaExtractor obtiene del
+    catálogo, de modo que SchemaComparator puede comparar un volcado con una
+    base de datos en vivo (o dos volcados entre sí). Los nombres calificados con
+    un esquema de DUMP_SEARCH_PATH se escriben sin calificar, igual que los
+    muestra pg_get_* en la sesión de extracción."""
+    
+    def __init__(self, excluded_schemas: Optional[List[str]] = None,
+                 search_path: Optional[List[str]] = None,
+                 filters: Optional[Dict[str, List[str]]] = None,
+                 object_types: Optional[List[str]] = None):
+        self.excluded_schemas = set(EXCLUDED_SCHEMAS if excluded_schemas is None else excluded_schemas)
+        self.search_path = list(DUMP_SEARCH_PATH if search_path is None else search_path)
+        # Mismos filtros (patrones LIKE) que las consultas del catálogo
+        self.filters = {name: [like_to_regex(pattern) for pattern in patterns]
+                        for name, patterns in (filters or {}).items()}
+        self.object_types = object_types
+        schemas = "|".join(re.escape(schema) for schema in self.search_path) or r"(?!)"
+        # Literales seguidos de ::regclass (nextval('public.seq'::regclass)),
+        # otros literales e identificadores entre comillas, o un prefijo de esquema
+        self._qualified_pattern = re.compile(
+            rf"""('(?:[^']|'')*')(?=::reg)|'(?:[^']|'')*'|"(?:[^"]|"")*"|(?<![\w$."])(?:{schemas})\.(?=[\w"])""")
+        self._literal_prefix = re.compile(rf"^'(?:{schemas})\.")
+        self._reset()
+    
+    def _reset(self):
+        """Limpiar el estado de la lectura anterior"""
+        self.tables = {}
+        self.constraints = []
+        self.indexes = []
+        self.functions = []
+        self.triggers = []
+        self.views = {}
+        self.materialized_views = []
+        self.sequences = []
+        self.enums = []
+        self.composites = []
+        self.domains = {}
+        self.extensions = []
+        self.column_changes = []
+        self.rules = set()
+    
+    def read_archive(self, path: str) -> str:
+        """Obtener el SQL del volcado: los formatos custom, directory y tar se
+        convierten a SQL plano con pg_restore; los planos se leen tal cual
+        (también comprimidos con gzip)"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Volcado no encontrado: {path}")
+        
+        if not os.path.isdir(path):
+            with open(path, 'rb') as f:
+                header = f.read(5)
+            if header[:2] == b'\x1f\x8b':
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    return f.read()
+            if header != b'PGDMP' and not tarfile.is_tarfile(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+        
+        logger.info(f"Convirtiendo {path} a SQL con pg_restore...")
+        result = subprocess.run(['pg_restore', '--schema-only', '-f', '-', path],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Error leyendo el volcado con pg_restore: {result.stderr.strip()}")
+        return result.stdout
+    
+    def parse_archive(self, path: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Leer e interpretar un volcado"""
+        return self.parse(self.read_archive(path))
+    
+    def parse(self, sql: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Interpretar el SQL de un volcado y construir el esquema"""
+        self._reset()
+        handlers = [
+            (r"CREATE (?:UNLOGGED |FOREIGN )?TABLE ", self._parse_table),
+            (r"ALTER TABLE ", self._parse_alter_table),
+            (r"CREATE (?:UNIQUE )?INDEX ", self._parse_index),
+            (r"CREATE (?:OR REPLACE )?(?:FUNCTION|PROCEDURE) ", self._parse_function),
+            (r"CREATE (?:CONSTRAINT )?TRIGGER ", self._parse_trigger),
+            (r"CREATE (?:OR REPLACE )?VIEW ", self._parse_view),
+            (r"CREATE MATERIALIZED VIEW ", self._parse_materialized_view),
+            (r"CREATE SEQUENCE ", self._parse_sequence),
+            (r"CREATE TYPE ", self._parse_type),
+            (r"CREATE DOMAIN ", self._parse_domain),
+            (r"CREATE EXTENSION ", self._parse_extension),
+            (r"CREATE RULE ", self._parse_rule)
+        ]
+        dispatch = re.compile("|".join(f"(?P<h{i}>{prefix})" for i, (prefix, _) in enumerate(handlers)))
+        
+        statements = 0
+        for statement in self.split_statements(sql):
+            match = dispatch.match(statement)
+            if match:
+                handlers[int(match.lastgroup[1:])][1](statement)
+                statements += 1
+        
+        schema = self._build_schema()
+        logger.info(f"Volcado interpretado: {statements} sentencias, "
+                    f"{sum(len(objects) for objects in schema.values())} objetos")
+        return schema
+    
+    def split_statements(self, sql: str) -> List[str]:
+        """Separar el volcado en sentencias sin comentarios ni punto y coma final"""
+        # Quitar datos de COPY (volcados completos) y metacomandos de psql
+        if 'FROM stdin;' in sql:
+            sql = re.sub(r"^COPY [^\n]*FROM stdin;\n.*?^\\\.$", "", sql, flags=re.MULTILINE | re.DOTALL)
+        sql = re.sub(r"^\\(?:connect|restrict|unrestrict)\b[^\n]*$", "", sql, flags=re.MULTILINE)
+        
+        statements = []
+        start = 0
+        for pos, token in iter_tokens(sql):
+            if token != ';':
+                continue
+            statement = re.sub(r"^(?:\s*--[^\n]*\n)*\s*", "", sql[start:pos])
+            # El cuerpo BEGIN ATOMIC ... END contiene sus propios punto y coma
+            if (re.match(r"CREATE (?:OR REPLACE )?(?:FUNCTION|PROCEDURE) ", statement) and
+                    re.search(r"\n\s+BEGIN ATOMIC\n", statement) and not re.search(r"\nEND$", statement)):
+                continue
+            if statement:
+                statements.append(statement.rstrip())
+            start = pos + 1
+        return statements
+    
+    def _unqualify(self, text: Optional[str]) -> Optional[str]:
+        """Quitar los esquemas del search_path de los nombres calificados"""
+        if text is None:
+            return None
+        
+        def replace(match):
+            if match.group(1) is not None:
+                return self._literal_prefix.sub("'", match.group(1))
+            token = match.group(0)
+            return token if token[0] in "'\"" else ''
+        
+        return self._qualified_pattern.sub(replace, text)
+    
+    def _get_table(self, name: str) -> Dict[str, Any]:
+        """Tabla del volcado por nombre calificado (se crea si no existe)"""
+        key = split_qualified_name(name)
+        if key not in self.tables:
+            self.tables[key] = {
+                'key': key, 'name': name, 'kind': 'r', 'owner': None, 'columns': [],
+                'parents': [], 'partitions': [], 'rowsecurity': False
+            }
+        return self.tables[key]
+    
+    def _parse_table(self, statement: str):
+        """CREATE TABLE / CREATE FOREIGN TABLE con sus columnas"""
+        match = re.match(rf"CREATE (UNLOGGED |FOREIGN )?TABLE ({QUALIFIED_NAME}) (PARTITION OF ({QUALIFIED_NAME}) )?", statement)
+        if match is None or re.match(r"OF ", statement[match.end():]):
+            return
+        table = self._get_table(match.group(2))
+        if match.group(1) == 'FOREIGN ':
+            table['kind'] = 'f'
+        if match.group(4):
+            table['parents'].append(split_qualified_name(match.group(4)))
+            table['partition'] = True
+        
+        rest = statement[match.end():]
+        if rest.startswith('('):
+            close = find_closing_paren(rest, 0)
+            for element in split_top_level(rest[1:close]):
+                self._parse_table_element(table, element)
+            rest = rest[close + 1:]
+        
+        inherits = re.search(r"\bINHERITS \((.*?)\)", rest)
+        if inherits:
+            table['parents'].extend(split_qualified_name(name) for name in split_top_level(inherits.group(1)))
+        if re.search(r"\bPARTITION BY ", rest):
+            table['kind'] = 'p'
+    
+    def _parse_table_element(self, table: Dict[str, Any], element: str):
+        """Columna o restricción dentro de CREATE TABLE"""
+        constraint = re.match(rf"CONSTRAINT ({IDENTIFIER}) (.*)$", element, re.DOTALL)
+        if constraint:
+            self._add_constraint(table['name'], constraint.group(1), constraint.group(2))
+            return
+        
+        element = re.sub(r"\s+OPTIONS \((?:[^()']|'(?:[^']|'')*')*\)", "", element)
+        element = re.sub(rf"\s+COLLATE {QUALIFIED_NAME}$", "", element)
+        not_null = element.endswith(' NOT NULL')
+        if not_null:
+            element = element[:-len(' NOT NULL')]
+        
+        match = re.match(rf"({IDENTIFIER}) (.*?)(?: (DEFAULT|GENERATED ALWAYS AS) (.*))?$", element, re.DOTALL)
+        table['columns'].append({
+            'name': unquote_identifier(match.group(1)),
+            'type': match.group(2),
+            'default': match.group(4) if match.group(3) == 'DEFAULT' else None,
+            'generated': match.group(3) is not None and match.group(3) != 'DEFAULT',
+            'not_null': not_null
+        })
+    
+    def _parse_alter_table(self, statement: str):
+        """ALTER TABLE: restricciones, propietario, defaults, particiones y RLS"""
+        match = re.match(rf"ALTER TABLE (ONLY )?({QUALIFIED_NAME})\s+(.*)$", statement, re.DOTALL)
+        if match is None:
+            return
+        only, name, action = match.groups()
+        
+        constraint = re.match(rf"ADD CONSTRAINT ({IDENTIFIER}) (.*)$", action, re.DOTALL)
+        if constraint:
+            self._add_constraint(name, constraint.group(1), constraint.group(2), only=bool(only))
+            return
+        
+        owner = re.match(rf"OWNER TO ({IDENTIFIER})$", action)
+        if owner:
+            self._get_table(name)['owner'] = unquote_identifier(owner.group(1))
+            return
+        
+        column = re.match(rf"ALTER COLUMN ({IDENTIFIER}) (SET DEFAULT (.*)|SET NOT NULL)$", action, re.DOTALL)
+        if column:
+            self.column_changes.append((split_qualified_name(name), unquote_identifier(column.group(1)),
+                                        column.group(3)))
+            return
+        
+        partition = re.match(rf"ATTACH PARTITION ({QUALIFIED_NAME}) ", action)
+        if partition:
+            child = self._get_table(partition.group(1))
+            child['parents'].append(split_qualified_name(name))
+            child['partition'] = True
+            self._get_table(name)['partitions'].append(child['key'])
+            return
+        
+        if action == 'ENABLE ROW LEVEL SECURITY':
+            self._get_table(name)['rowsecurity'] = True
+    
+    def _add_constraint(self, table_name: str, name: str, definition: str, only: bool = True):
+        """Registrar una restricción de tabla"""
+        self.constraints.append({
+            'table': split_qualified_name(table_name),
+            'name': name,
+            'definition': definition.strip(),
+            'only': only
+        })
+    
+    def _parse_index(self, statement: str):
+        """CREATE INDEX (el texto de pg_dump es el de pg_get_indexdef)"""
+        match = re.match(rf"CREATE (?:UNIQUE )?INDEX ({IDENTIFIER}) ON (?:ONLY )?({QUALIFIED_NAME}) (?=USING )",
+                         statement)
+        if match is None:
+            return
+        schema_name, table_name = split_qualified_name(match.group(2))
+        self.indexes.append({
+            'schemaname': schema_name,
+            'tablename': table_name,
+            'indexname': unquote_identifier(match.group(1)),
+            'indexdef': statement[:match.end()] + self._unqualify(statement[match.end():])
+        })
+    
+    def _parse_function(self, statement: str):
+        """CREATE FUNCTION/PROCEDURE, reconstruyendo el texto de pg_get_functiondef"""
+        match = re.match(rf"CREATE (?:OR REPLACE )?(FUNCTION|PROCEDURE) ({QUALIFIED_NAME})\(", statement)
+        if match is None:
+            return
+        keyword, qualified_name = match.groups()
+        close = find_closing_paren(statement, match.end() - 1)
+        arguments = self._unqualify(statement[match.end():close])
+        
+        header = re.match(r"(?: RETURNS (.*?))?\n\s+(?:TRANSFORM ([^\n]*)\n\s+)?LANGUAGE (\S+)([^\n]*)",
+                          statement[close + 1:], re.DOTALL)
+        return_type = self._unqualify(header.group(1))
+        language = header.group(3)
+        attributes = FUNCTION_ATTRIBUTES.findall(header.group(4))
+        rest = statement[close + 1 + header.end():]
+        
+        settings = []
+        while True:
+            setting = re.match(r"\n\s+(SET [^\n]*)", rest)
+            if setting is None:
+                break
+            settings.append(setting.group(1))
+            rest = rest[setting.end():]
+        body = rest.strip()
+        
+        kind = 'p' if keyword == 'PROCEDURE' else ('w' if 'WINDOW' in attributes else 'f')
+        attributes.sort(key=lambda attribute: FUNCTION_ATTRIBUTE_ORDER.index(attribute.split()[0]))
+        
+        definition = f"CREATE OR REPLACE {keyword} {qualified_name}({arguments})\n"
+        if return_type is not None:
+            definition += f" RETURNS {return_type}\n"
+        if header.group(2):
+            definition += f" TRANSFORM {header.group(2)}\n"
+        definition += f" LANGUAGE {language}\n"
+        if attributes:
+            definition += " " + " ".join(self._unqualify(attribute) for attribute in attributes) + "\n"
+        for setting in settings:
+            definition += f" {setting}\n"
+        definition += self._function_body(body, keyword) + "\n"
+        
+        schema_name, function_name = split_qualified_name(qualified_name)
+        self.functions.append({
+            'schema_name': schema_name,
+            'function_name': function_name,
+            'return_type': return_type,
+            'arguments': arguments,
+            'definition': definition,
+            'function_kind': kind
+        })
+    
+    def _function_body(self, body: str, keyword: str) -> str:
+        """Cuerpo de la función tal como lo escribe pg_get_functiondef"""
+        if not body.startswith('AS '):
+            # Cuerpo SQL estándar (BEGIN ATOMIC ... END o RETURN expr)
+            return self._unqualify(body)
+        
+        literals = []
+        for item in split_top_level(body[3:]):
+            dollar = re.match(r"(\$(?:[^\W\d]\w*)?\$)(.*)\1$", item, re.DOTALL)
+            if dollar:
+                literals.append(dollar.group(2))
+            else:
+                literals.append(re.sub(r"^[Ee]?'|'$", "", item).replace("''", "'"))
+        
+        source = literals[-1]
+        delimiter = "$" + keyword.lower()
+        while delimiter in source:
+            delimiter += "x"
+        delimiter += "$"
+        prefix = "AS "
+        if len(literals) > 1:
+            prefix += "'" + literals[0].replace("'", "''") + "', "
+        return f"{prefix}{delimiter}{source}{delimiter}"
+    
+    def _parse_trigger(self, statement: str):
+        """CREATE [CONSTRAINT] TRIGGER: una fila por evento, como information_schema.triggers"""
+        match = re.match(rf"CREATE (CONSTRAINT )?TRIGGER ({IDENTIFIER}) (BEFORE|AFTER|INSTEAD OF) (.+?) "
+                         rf"ON ({QUALIFIED_NAME}) (.*)$", statement, re.DOTALL)
+        if match is None:
+            return
+        is_constraint, name, timing, events, table_name, rest = match.groups()
+        schema_name, table = split_qualified_name(table_name)
+        
+        orientation = re.search(r"\bFOR EACH (ROW|STATEMENT)\b", rest)
+        action = re.search(r"\bEXECUTE (?:FUNCTION|PROCEDURE) .*$", rest, re.DOTALL)
+        event_names = {event.split()[0] for event in re.split(r" OR ", events)}
+        for event in TRIGGER_EVENTS:
+            if event in event_names:
+                self.triggers.append({
+                    'trigger_schema': schema_name,
+                    'trigger_name': unquote_identifier(name),
+                    'event_manipulation': event,
+                    'event_object_table': table,
+                    'action_statement': self._unqualify(action.group(0)),
+                    'action_timing': timing,
+                    'action_orientation': orientation.group(1) if orientation else 'STATEMENT'
+                })
+        
+        if is_constraint:
+            definition = "TRIGGER"
+            if re.search(r"(?<!NOT )\bDEFERRABLE\b", rest):
+                definition += " DEFERRABLE"
+            if "INITIALLY DEFERRED" in rest:
+                definition += " INITIALLY DEFERRED"
+            self._add_constraint(table_name, name, definition)
+    
+    def _parse_view(self, statement: str):
+        """CREATE VIEW (el texto de pg_dump es el de pg_get_viewdef)"""
+        match = re.match(rf"CREATE (?:OR REPLACE )?VIEW ({QUALIFIED_NAME})(?: \(.*?\))?(?: WITH \(.*?\))? AS\n",
+                         statement, re.DOTALL)
+        if match is None:
+            return
+        body = re.sub(r"\n\s+WITH (?:CASCADED|LOCAL) CHECK OPTION$", "", statement[match.end():])
+        key = split_qualified_name(match.group(1))
+        # pg_dump crea primero como tabla las vistas con dependencias circulares
+        self.tables.pop(key, None)
+        self.views[key] = {'name': match.group(1), 'definition': self._unqualify(body) + ";"}
+    
+    def _parse_materialized_view(self, statement: str):
+        """CREATE MATERIALIZED VIEW (solo aporta su tipo compuesto)"""
+        match = re.match(rf"CREATE MATERIALIZED VIEW ({QUALIFIED_NAME})", statement)
+        if match:
+            self.materialized_views.append(match.group(1))
+    
+    def _parse_sequence(self, statement: str):
+        """CREATE SEQUENCE con los valores por defecto de PostgreSQL"""
+        match = re.match(rf"CREATE SEQUENCE ({QUALIFIED_NAME})", statement)
+        if match is None:
+            return
+        options = statement[match.end():]
+        
+        def option(pattern):
+            found = re.search(pattern, options)
+            return int(found.group(1)) if found else None
+        
+        data_type = re.search(r"\bAS (smallint|integer|bigint)\b", options)
+        data_type = data_type.group(1) if data_type else 'bigint'
+        type_min, type_max = SEQUENCE_TYPE_RANGES[data_type]
+        increment = option(r"\bINCREMENT BY (-?\d+)") or 1
+        minimum = option(r"\bMINVALUE (-?\d+)")
+        maximum = option(r"\bMAXVALUE (-?\d+)")
+        if minimum is None:
+            minimum = 1 if increment > 0 else type_min
+        if maximum is None:
+            maximum = type_max if increment > 0 else -1
+        start = option(r"\bSTART WITH (-?\d+)")
+        if start is None:
+            start = minimum if increment > 0 else maximum
+        
+        schema_name, name = split_qualified_name(match.group(1))
+        self.sequences.append({
+            'sequence_schema': schema_name,
+            'sequence_name': name,
+            'data_type': data_type,
+            'start_value': str(start),
+            'minimum_value': str(minimum),
+            'maximum_value': str(maximum),
+            'increment': str(increment),
+            'cycle_option': 'YES' if re.search(r"\n\s+CYCLE$", options) else 'NO'
+        })
+    
+    def _parse_type(self, statement: str):
+        """CREATE TYPE: enums y tipos compuestos"""
+        match = re.match(rf"CREATE TYPE ({QUALIFIED_NAME})(?: AS (ENUM|RANGE)? ?\()?", statement)
+        if match is None or match.group(0).endswith('RANGE ('):
+            return
+        if match.group(2) == 'ENUM':
+            self.enums.append(match.group(1))
+        elif match.group(0).endswith(' AS ('):
+            self.composites.append(match.group(1))
+    
+    def _parse_domain(self, statement: str):
+        """CREATE DOMAIN: tipo base y NOT NULL (se heredan en las columnas)"""
+        match = re.match(rf"CREATE DOMAIN ({QUALIFIED_NAME}) AS (.+?)(?: COLLATE {QUALIFIED_NAME})?( NOT NULL)?"
+                         rf"(?: DEFAULT [^\n]*)?(?:\n|$)", statement)
+        if match:
+            self.domains[split_qualified_name(match.group(1))] = {
+                'name': match.group(1),
+                'type': match.group(2),
+                'not_null': bool(match.group(3))
+            }
+    
+    def _parse_extension(self, statement: str):
+        """CREATE EXTENSION (pg_dump no guarda la versión instalada)"""
+        match = re.match(rf"CREATE EXTENSION (?:IF NOT EXISTS )?({IDENTIFIER})(?: WITH SCHEMA ({IDENTIFIER}))?",
+                         statement)
+        if match:
+            self.extensions.append({
+                'extname': unquote_identifier(match.group(1)),
+                'schema_name': unquote_identifier(match.group(2)) if match.group(2) else self.search_path[0]
+            })
+    
+    def _parse_rule(self, statement: str):
+        """CREATE RULE (marca hasrules en la tabla)"""
+        match = re.match(rf"CREATE RULE ({IDENTIFIER}) AS\s+ON \w+ TO ({QUALIFIED_NAME})", statement)
+        if match and match.group(1) != '"_RETURN"':
+            self.rules.add(split_qualified_name(match.group(2)))
+    
+    def _resolve_inheritance(self, table: Dict[str, Any], resolved: set):
+        """Añadir a las tablas hijas las columnas y CHECK heredados (pg_dump
+        solo escribe los locales). Los padres se resuelven primero."""
+        if table['key'] in resolved:
+            return
+        resolved.add(table['key'])
+        
+        inherited_columns = []
+        for parent_key in table['parents']:
+            parent = self.tables.get(parent_key)
+            if parent is None:
+                continue
+            self._resolve_inheritance(parent, resolved)
+            
+            names = {column['name'] for column in table['columns'] + inherited_columns}
+            for column in parent['columns']:
+                if column['name'] not in names:
+                    # Los defaults heredados aparecen como ALTER COLUMN SET DEFAULT
+                    inherited_columns.append(dict(column, default=None))
+            
+            existing = {constraint['name'] for constraint in self.constraints if constraint['table'] == table['key']}
+            for constraint in list(self.constraints):
+                if (constraint['table'] == parent_key and constraint['name'] not in existing and
+                        constraint['definition'].startswith('CHECK ') and 'NO INHERIT' not in constraint['definition']):
+                    self.constraints.append(dict(constraint, table=table['key']))
+        
+        table['columns'] = inherited_columns + table['columns']
+    
+    def _clone_partition_foreign_keys(self):
+        """Las FK de una tabla particionada (sin ONLY) existen también en cada partición"""
+        pending = [constraint for constraint in self.constraints
+                   if not constraint['only'] and constraint['definition'].startswith('FOREIGN KEY ')]
+        while pending:
+            constraint = pending.pop()
+            parent = self.tables.get(constraint['table'])
+            for partition_key in (parent['partitions'] if parent else []):
+                if not any(c['table'] == partition_key and c['name'] == constraint['name'] for c in self.constraints):
+                    clone = dict(constraint, table=partition_key)
+                    self.constraints.append(clone)
+                    pending.append(clone)
+    
+    def _describe_type(self, type_text: str) -> Dict[str, Any]:
+        """Campos de tipo de una columna, calculados como en la consulta de columnas"""
+        info = {
+            'data_type': None, 'character_maximum_length': None, 'numeric_precision': None,
+            'numeric_scale': None, 'datetime_precision': None, 'udt_name': None,
+            'formatted_type': self._unqualify(type_text), 'not_null': False
+        }
+        base, modifiers, is_array = self._split_type(type_text)
+        
+        builtin = BUILTIN_TYPES.get('interval' if base.startswith('interval') else base)
+        if builtin is None:
+            schema_name, name = split_qualified_name(base)
+            domain = self.domains.get((schema_name, name)) if schema_name else None
+            if is_array:
+                info.update(data_type='ARRAY', udt_name=f"_{name}")
+            elif domain is not None:
+                base_info = self._describe_domain_base(domain['type'])
+                info.update(base_info, formatted_type=info['formatted_type'], not_null=domain['not_null'])
+            else:
+                info.update(data_type='USER-DEFINED', udt_name=name)
+            return info
+        
+        typname = builtin[0]
+        if is_array:
+            info.update(data_type='ARRAY', udt_name=f"_{typname}")
+            return info
+        
+        info.update(data_type=base if base != 'bpchar' else 'character', udt_name=typname)
+        if base.startswith('interval'):
+            info['data_type'] = 'interval'
+        info.update(self._type_metrics(typname, modifiers))
+        return info
+    
+    def _describe_domain_base(self, type_text: str) -> Dict[str, Any]:
+        """Campos de tipo de un dominio, a partir de su tipo base"""
+        base, modifiers, is_array = self._split_type(type_text)
+        builtin = BUILTIN_TYPES.get('interval' if base.startswith('interval') else base)
+        if is_array:
+            typname = builtin[0] if builtin else split_qualified_name(base)[1]
+            return {'data_type': 'ARRAY', 'udt_name': f"_{typname}"}
+        if builtin is None:
+            return {'data_type': 'USER-DEFINED', 'udt_name': split_qualified_name(base)[1]}
+        
+        info = {'data_type': 'interval' if base.startswith('interval') else base, 'udt_name': builtin[0]}
+        info.update(self._type_metrics(builtin[0], modifiers))
+        return info
+    
+    def _split_type(self, type_text: str) -> Tuple[str, List[int], bool]:
+        """Separar un tipo de format_type en nombre base, modificadores y si es array"""
+        is_array = type_text.endswith('[]')
+        type_text = re.sub(r"(\[\])+$", "", type_text)
+        modifiers = re.search(r"\((-?\d+)(?:,(-?\d+))?\)", type_text)
+        values = [int(value) for value in modifiers.groups() if value is not None] if modifiers else []
+        base = re.sub(r"\s+", " ", re.sub(r"\(-?\d+(?:,-?\d+)?\)", "", type_text)).strip()
+        return base, values, is_array
+    
+    def _type_metrics(self, typname: str, modifiers: List[int]) -> Dict[str, Any]:
+        """Longitud, precisión y escala según el tipo, como information_schema"""
+        metrics = {}
+        if typname in ('varchar', 'bpchar', 'bit', 'varbit'):
+            metrics['character_maximum_length'] = modifiers[0] if modifiers else None
+        elif typname in ('int2', 'int4', 'int8'):
+            metrics['numeric_precision'] = {'int2': 16, 'int4': 32, 'int8': 64}[typname]
+            metrics['numeric_scale'] = 0
+        elif typname in ('float4', 'float8'):
+            metrics['numeric_precision'] = 24 if typname == 'float4' else 53
+        elif typname == 'numeric' and modifiers:
+            metrics['numeric_precision'] = modifiers[0]
+            metrics['numeric_scale'] = modifiers[1] if len(modifiers) > 1 else 0
+        elif typname == 'date':
+            metrics['datetime_precision'] = 0
+        elif typname in ('time', 'timetz', 'timestamp', 'timestamptz', 'interval'):
+            metrics['datetime_precision'] = modifiers[0] if modifiers else 6
+        return metrics
+    
+    def _type_category(self, type_text: str) -> str:
+        """typcategory del tipo base de un dominio"""
+        base, _, is_array = self._split_type(type_text)
+        if is_array:
+            return 'A'
+        builtin = BUILTIN_TYPES.get('interval' if base.startswith('interval') else base)
+        if builtin:
+            return builtin[1]
+        key = split_qualified_name(base)
+        if key in self.domains:
+            return self._type_category(self.domains[key]['type'])
+        if base in self.enums:
+            return 'E'
+        if base in self.composites or key in self.tables:
+            return 'C'
+        return 'U'
+    
+    def _constraint_columns(self, definition: str, columns: List[str]) -> Optional[List[str]]:
+        """Columnas de la restricción en el orden de conkey"""
+        keys = re.match(r"(?:PRIMARY KEY|UNIQUE(?: NULLS NOT DISTINCT)?|FOREIGN KEY) \(", definition)
+        if keys:
+            close = find_closing_paren(definition, keys.end() - 1)
+            return [unquote_identifier(name) for name in split_top_level(definition[keys.end():close])]
+        
+        exclude = re.match(r"EXCLUDE USING \w+ \(", definition)
+        if exclude:
+            close = find_closing_paren(definition, exclude.end() - 1)
+            names = []
+            for element in split_top_level(definition[exclude.end():close]):
+                name = re.match(rf"({IDENTIFIER}) WITH ", element)
+                if name:
+                    names.append(unquote_identifier(name.group(1)))
+            return names or None
+        
+        if definition.startswith('CHECK '):
+            # Columnas referenciadas, en el orden en que aparecen en la expresión
+            expression = re.sub(r"'(?:[^']|'')*'", "''", definition)
+            names = []
+            for name in re.findall(rf"(?<![\w:.\"])({IDENTIFIER})(?!\s*\()", expression):
+                name = unquote_identifier(name)
+                if name in columns and name not in names:
+                    names.append(name)
+            return names or None
+        return None
+    
+    def _build_constraint(self, constraint: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+        """Fila de restricción como la de la consulta de pg_constraint"""
+        definition = constraint['definition']
+        schema_name, table_name = constraint['table']
+        column_names = self._constraint_columns(definition, columns)
+        row = {
+            'table_schema': schema_name,
+            'table_name': table_name,
+            'constraint_name': unquote_identifier(constraint['name']),
+            'constraint_type': None,
+            'column_names': column_names,
+            'column_name': ", ".join(column_names) if column_names else None,
+            'foreign_table_schema': None,
+            'foreign_table_name': None,
+            'foreign_column_names': None,
+            'foreign_column_name': None,
+            'delete_rule': None,
+            'update_rule': None,
+            'check_clause': None,
+            'definition': self._unqualify(definition)
+        }
+        
+        if definition.startswith('PRIMARY KEY'):
+            row['constraint_type'] = 'PRIMARY KEY'
+        elif definition.startswith('UNIQUE'):
+            row['constraint_type'] = 'UNIQUE'
+        elif definition.startswith('EXCLUDE'):
+            row['constraint_type'] = 'EXCLUDE'
+        elif definition.startswith('TRIGGER'):
+            row['constraint_type'] = 'TRIGGER'
+        elif definition.startswith('CHECK '):
+            open_pos = definition.index('(')
+            row['constraint_type'] = 'CHECK'
+            row['check_clause'] = self._unqualify(definition[open_pos + 1:find_closing_paren(definition, open_pos)])
+        elif definition.startswith('FOREIGN KEY'):
+            match = re.match(rf"FOREIGN KEY \(.*?\) REFERENCES ({QUALIFIED_NAME})\((.*?)\)(.*)$", definition, re.DOTALL)
+            foreign_columns = [unquote_identifier(name) for name in split_top_level(match.group(2))]
+            delete_rule = re.search(rf"\bON DELETE {REFERENTIAL_ACTIONS}", match.group(3))
+            update_rule = re.search(rf"\bON UPDATE {REFERENTIAL_ACTIONS}", match.group(3))
+            row.update(
+                constraint_type='FOREIGN KEY',
+                foreign_table_schema=split_qualified_name(match.group(1))[0],
+                foreign_table_name=split_qualified_name(match.group(1))[1],
+                foreign_column_names=foreign_columns,
+                foreign_column_name=", ".join(foreign_columns),
+                delete_rule=delete_rule.group(1) if delete_rule else 'NO ACTION',
+                update_rule=update_rule.group(1) if update_rule else 'NO ACTION'
+            )
+        return row
+    
+    def _build_constraint_index(self, constraint: Dict[str, Any], table: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Índice que PostgreSQL crea para una restricción PRIMARY KEY, UNIQUE o EXCLUDE"""
+        definition = re.sub(r"\s+(?:USING INDEX TABLESPACE \S+|(?:NOT )?DEFERRABLE|INITIALLY \w+)", "",
+                            constraint['definition'])
+        target = f"{'ONLY ' if table['kind'] == 'p' else ''}{table['name']}"
+        
+        keys = re.match(r"(?:PRIMARY KEY|UNIQUE( NULLS NOT DISTINCT)?) \(", definition)
+        if keys:
+            close = find_closing_paren(definition, keys.end() - 1)
+            rest = definition[close + 1:]
+            include = re.search(r"\bINCLUDE (\(.*?\))", rest)
+            options = re.search(r"\bWITH (\(.*?\))", rest)
+            indexdef = (f"CREATE UNIQUE INDEX {constraint['name']} ON {target} USING btree "
+                        f"({definition[keys.end():close]})")
+            if include:
+                indexdef += f" INCLUDE {include.group(1)}"
+            if keys.group(1):
+                indexdef += " NULLS NOT DISTINCT"
+            if options:
+                indexdef += f" WITH {options.group(1)}"
+        else:
+            exclude = re.match(r"EXCLUDE USING (\w+) \(", definition)
+            if exclude is None:
+                return None
+            close = find_closing_paren(definition, exclude.end() - 1)
+            elements = [re.sub(r"\s+WITH\s+\S+$", "", element)
+                        for element in split_top_level(definition[exclude.end():close])]
+            rest = definition[close + 1:]
+            include = re.search(r"\bINCLUDE (\(.*?\))", rest)
+            options = re.search(r"\bWITH (\(.*?\))", rest)
+            predicate = re.search(r"\bWHERE (\(.*\))", rest, re.DOTALL)
+            indexdef = (f"CREATE INDEX {constraint['name']} ON {target} USING {exclude.group(1)} "
+                        f"({', '.join(elements)})")
+            if include:
+                indexdef += f" INCLUDE {include.group(1)}"
+            if options:
+                indexdef += f" WITH {options.group(1)}"
+            if predicate:
+                indexdef += f" WHERE {predicate.group(1)}"
+        
+        schema_name, table_name = table['key']
+        return {
+            'schemaname': schema_name,
+            'tablename': table_name,
+            'indexname': unquote_identifier(constraint['name']),
+            'indexdef': indexdef[:indexdef.index(' USING ')] + self._unqualify(indexdef[indexdef.index(' USING '):])
+        }
+    
+    def _build_schema(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Construir las filas de cada tipo de objeto a partir de lo leído"""
+        resolved = set()
+        for table in list(self.tables.values()):
+            self._resolve_inheritance(table, resolved)
+        self._clone_partition_foreign_keys()
+        
+        for table_key, column_name, default in self.column_changes:
+            for column in self.tables.get(table_key, {}).get('columns', []):
+                if column['name'] == column_name:
+                    if default is None:
+                        column['not_null'] = True
+                    else:
+                        column['default'] = default
+        
+        # Columnas
+        columns = []
+        for table in self.tables.values():
+            schema_name, table_name = table['key']
+            for position, column in enumerate(table['columns'], start=1):
+                info = self._describe_type(column['type'])
+                columns.append({
+                    'table_schema': schema_name,
+                    'table_name': table_name,
+                    'column_name': column['name'],
+                    'ordinal_position': position,
+                    'column_default': None if column['generated'] else self._unqualify(column['default']),
+                    'is_nullable': 'NO' if column['not_null'] or info['not_null'] else 'YES',
+                    'data_type': info['data_type'],
+                    'character_maximum_length': info['character_maximum_length'],
+                    'numeric_precision': info['numeric_precision'],
+                    'numeric_scale': info['numeric_scale'],
+                    'datetime_precision': info['datetime_precision'],
+                    'udt_name': info['udt_name'],
+                    'formatted_type': info['formatted_type']
+                })
+        
+        # Restricciones e índices que las respaldan
+        constraints = []
+        indexes = list(self.indexes)
+        for constraint in self.constraints:
+            table = self.tables.get(constraint['table'])
+            if table is None:
+                continue
+            constraints.append(self._build_constraint(constraint, [column['name'] for column in table['columns']]))
+            index = self._build_constraint_index(constraint, table)
+            if index is not None:
+                indexes.append(index)
+        
+        # Tablas (pg_tables no incluye tablas foráneas)
+        indexed = {(index['schemaname'], index['tablename']) for index in indexes}
+        with_triggers = {(trigger['trigger_schema'], trigger['event_object_table']) for trigger in self.triggers}
+        for constraint in constraints:
+            if constraint['constraint_type'] in ('FOREIGN KEY', 'TRIGGER'):
+                with_triggers.add((constraint['table_schema'], constraint['table_name']))
+            if constraint['constraint_type'] == 'FOREIGN KEY':
+                with_triggers.add((constraint['foreign_table_schema'], constraint['foreign_table_name']))
+        
+        tables = []
+        for table in self.tables.values():
+            if table['kind'] == 'f':
+                continue
+            schema_name, table_name = table['key']
+            row = {'schemaname': schema_name, 'tablename': table_name}
+            # Sin OWNER TO (pg_dump --no-owner) el propietario es desconocido y
+            # se omite para que el comparador no lo tenga en cuenta
+            if table['owner'] is not None:
+                row['tableowner'] = table['owner']
+            row.update(
+                hasindexes=table['key'] in indexed,
+                hasrules=table['key'] in self.rules,
+                hastriggers=table['key'] in with_triggers,
+                rowsecurity=table['rowsecurity']
+            )
+            tables.append(row)
+        
+        # Tipos: compuestos de cada relación y tipo, enums y dominios
+        types = []
+        relations = ([table['name'] for table in self.tables.values()] +
+                     [view['name'] for view in self.views.values()] + self.materialized_views)
+        for name, type_type, category in ([(name, 'c', 'C') for name in relations + self.composites] +
+                                          [(name, 'e', 'E') for name in self.enums] +
+                                          [(domain['name'], 'd', self._type_category(domain['type']))
+                                           for domain in self.domains.values()]):
+            schema_name, type_name = split_qualified_name(name)
+            types.append({
+                'schema_name': schema_name,
+                'type_name': type_name,
+                'type_type': type_type,
+                'type_category': category,
+                'type_definition': self._unqualify(name)
+            })
+        
+        # plpgsql viene instalada en toda base de datos y pg_dump no la escribe
+        extensions = list(self.extensions)
+        if not any(extension['extname'] == 'plpgsql' for extension in extensions):
+            extensions.append({'extname': 'plpgsql', 'schema_name': 'pg_catalog'})
+        
+        views = [{'table_schema': key[0], 'table_name': key[1], 'view_definition': view['definition']}
+                 for key, view in self.views.items()]
+        
+        schema = {
+            'tables': self._filter(tables, 'schemaname', ('schemaname', 'tablename'), 'tablename'),
+            'columns': self._filter(columns, 'table_schema', ('table_schema', 'table_name', 'ordinal_position'),
+                                    'table_name'),
+            'indexes': self._filter(indexes, 'schemaname', ('schemaname', 'tablename', 'indexname'), 'tablename'),
+            'constraints': self._filter(constraints, 'table_schema', ('table_schema', 'table_name', 'constraint_name'),
+                                        'table_name'),
+            'functions': self._filter(self.functions, 'schema_name', ('schema_name', 'function_name')),
+            'triggers': self._filter(self.triggers, 'trigger_schema',
+                                     ('trigger_schema', 'event_object_table', 'trigger_name'), 'event_object_table'),
+            'views': self._filter(views, 'table_schema', ('table_schema', 'table_name'), 'table_name'),
+            'sequences': self._filter(self.sequences, 'sequence_schema', ('sequence_schema', 'sequence_name')),
+            'types': self._filter(types, 'schema_name', ('schema_name', 'type_name')),
+            'extensions': sorted(extensions, key=lambda extension: extension['extname'])
+        }
+        if self.object_types is not None:
+            for object_type in schema:
+                if object_type not in self.object_types:
+                    schema[object_type] = []
+        return schema
+    
+    def _matches(self, name: str, kind: str) -> bool:
+        """Aplicar los filtros include_<kind>/exclude_<kind> a un nombre"""
+        include = self.filters.get(f"include_{kind}")
+        if include and not any(pattern.match(name) for pattern in include):
+            return False
+        return not any(pattern.match(name) for pattern in self.filters.get(f"exclude_{kind}", []))
+    
+    def _filter(self, rows: List[Dict[str, Any]], schema_field: str, order: Tuple[str, ...],
+                table_field: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Descartar los esquemas excluidos y los objetos que no pasan los
+        filtros, y ordenar como las consultas del catálogo"""
+        rows = [row for row in rows if row[schema_field] not in self.excluded_schemas
+                and self._matches(row[schema_field], 'schemas')
+                and (table_field is None or self._matches(row[table_field], 'tables'))]
+        return sorted(rows, key=lambda row: tuple(row[field] for field in order))
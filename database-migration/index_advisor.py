@@ -0,0 +1,323 @@
+"""
+Asesor de índices: claves foráneas sin índice, índices redundantes y sin uso
+"""
+import re
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Tuple
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+# Uso y estructura de cada índice. column_names trae NULL en las posiciones
+# que son expresiones y excluye las columnas INCLUDE; column_options trae la
+# clase de operadores, la collation y las opciones (DESC, NULLS FIRST) de
+# cada una de esas columnas.
+INDEX_STATS_QUERY = """
+SELECT
+    s.schemaname,
+    s.relname AS tablename,
+    s.indexrelname AS indexname,
+    s.idx_scan,
+    pg_relation_size(s.indexrelid) AS index_size,
+    am.amname AS index_method,
+    i.indisunique AS is_unique,
+    i.indisprimary AS is_primary,
+    i.indisvalid AS is_valid,
+    i.indpred IS NOT NULL AS is_partial,
+    EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = s.indexrelid) AS backs_constraint,
+    cols.column_names,
+    cols.column_options,
+    t.n_live_tup,
+    t.seq_scan
+FROM pg_stat_user_indexes s
+JOIN pg_index i ON i.indexrelid = s.indexrelid
+JOIN pg_class ic ON ic.oid = s.indexrelid
+JOIN pg_am am ON am.oid = ic.relam
+JOIN pg_stat_user_tables t ON t.relid = s.relid
+CROSS JOIN LATERAL (
+    SELECT array_agg(a.attname::text ORDER BY k.ord) AS column_names,
+           array_agg(concat_ws(' ', i.indclass[k.ord - 1], i.indcollation[k.ord - 1], i.indoption[k.ord - 1])
+                     ORDER BY k.ord) AS column_options
+    FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+    LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum AND k.attnum <> 0
+    WHERE k.ord <= i.indnkeyatts
+) cols
+"""
+
+TABLE_STATS_QUERY = """
+SELECT schemaname, relname AS tablename, n_live_tup, seq_scan
+FROM pg_stat_user_tables
+"""
+
+STATS_RESET_QUERY = """
+SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()
+"""
+
+# Longitud máxima de un identificador en PostgreSQL (NAMEDATALEN - 1)
+MAX_IDENTIFIER_LENGTH = 63
+
+_INDEX_NAME = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON ')
+
+def _definition_without_name(indexdef: str) -> str:
+    """Definición del índice sin su nombre, para detectar duplicados"""
+    return _INDEX_NAME.sub(lambda m: f"CREATE {m.group(1) or ''}INDEX ON ", indexdef)
+
+def _format_size(size: int) -> str:
+    """Tamaño en bytes legible"""
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+class IndexAdvisor:
+    """Analiza los índices de una base de datos a partir del extractor de
+    esquemas y de las estadísticas de uso, y propone una migración con
+    CREATE INDEX CONCURRENTLY / DROP INDEX CONCURRENTLY"""
+    
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.missing_fk_indexes = []
+        self.redundant_indexes = []
+        self.unused_indexes = []
+        self.stats_reset = None
+    
+    def analyze(self, db_manager) -> Dict[str, List[Dict[str, Any]]]:
+        """Analizar los índices y las claves foráneas de una base de datos"""
+        logger.info("Analizando índices...")
+        indexes = self.extractor.extract_indexes(db_manager)
+        constraints = self.extractor.extract_constraints(db_manager)
+        stats = {(row['schemaname'], row['indexname']): row
+                 for row in db_manager.execute_query(INDEX_STATS_QUERY)}
+        tables = {(row['schemaname'], row['tablename']): row
+                  for row in db_manager.execute_query(TABLE_STATS_QUERY)}
+        rows = db_manager.execute_query(STATS_RESET_QUERY)
+        self.stats_reset = rows[0]['stats_reset'] if rows else None
+        
+        # Índices del extractor (respetan los filtros) con su uso y estructura
+        by_table = {}
+        for index in indexes:
+            info = stats.get((index['schemaname'], index['indexname']))
+            if info is None:
+                continue
+            by_table.setdefault((index['schemaname'], index['tablename']), []).append(
+                dict(info, indexdef=index['indexdef'], column_names=list(info['column_names'] or []),
+                     column_options=list(info['column_options'] or [])))
+        
+        self.missing_fk_indexes = self._find_missing_fk_indexes(constraints, by_table, tables)
+        self.redundant_indexes = self._find_redundant_indexes(by_table)
+        self.unused_indexes = self._find_unused_indexes(constraints, by_table, self.redundant_indexes)
+        
+        logger.info(f"Análisis de índices completado: {len(self.missing_fk_indexes)} claves foráneas sin índice, "
+                    f"{len(self.redundant_indexes)} índices redundantes, {len(self.unused_indexes)} sin uso")
+        return {
+            'missing_fk_indexes': self.missing_fk_indexes,
+            'redundant_indexes': self.redundant_indexes,
+            'unused_indexes': self.unused_indexes
+        }
+    
+    def _covers(self, index: Dict[str, Any], columns: List[str]) -> bool:
+        """Verificar si un índice sirve para buscar por las columnas dadas: las
+        columnas deben ser las primeras del índice, en cualquier orden"""
+        leading = index['column_names'][:len(columns)]
+        return (index['is_valid'] and not index['is_partial'] and index['index_method'] == 'btree' and
+                len(leading) == len(columns) and None not in leading and set(leading) == set(columns))
+    
+    def _find_missing_fk_indexes(self, constraints: List[Dict[str, Any]], by_table: Dict[Tuple[str, str], List],
+                                 tables: Dict[Tuple[str, str], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Claves foráneas cuyas columnas no encabezan ningún índice de la tabla.
+        Sin ese índice, cada borrado o actualización en la tabla referenciada
+        (y cada join por la clave) recorre la tabla completa."""
+        missing = []
+        existing_names = {index['indexname'] for indexes in by_table.values() for index in indexes}
+        for constraint in constraints:
+            if constraint['constraint_type'] != 'FOREIGN KEY' or not constraint.get('column_names'):
+                continue
+            table = (constraint['table_schema'], constraint['table_name'])
+            columns = list(constraint['column_names'])
+            if any(self._covers(index, columns) for index in by_table.get(table, [])):
+                continue
+            
+            table_stats = tables.get(table, {})
+            missing.append({
+                'schemaname': table[0],
+                'tablename': table[1],
+                'constraint_name': constraint['constraint_name'],
+                'column_names': columns,
+                'foreign_table': f"{constraint['foreign_table_schema']}.{constraint['foreign_table_name']}",
+                'n_live_tup': table_stats.get('n_live_tup'),
+                'seq_scan': table_stats.get('seq_scan'),
+                'indexname': self._index_name(table[1], columns, existing_names)
+            })
+        # Las tablas más grandes primero: son las que más sufren sin el índice
+        missing.sort(key=lambda item: -(item['n_live_tup'] or 0))
+        return missing
+    
+    def _index_name(self, tablename: str, columns: List[str], existing_names: set) -> str:
+        """Nombre libre para el índice de una clave foránea"""
+        base = f"idx_{tablename}_{'_'.join(columns)}"[:MAX_IDENTIFIER_LENGTH]
+        name, suffix = base, 1
+        while name in existing_names:
+            suffix += 1
+            name = f"{base[:MAX_IDENTIFIER_LENGTH - len(str(suffix)) - 1]}_{suffix}"
+        existing_names.add(name)
+        return name
+    
+    def _keep_order(self, index: Dict[str, Any]) -> Tuple:
+        """Orden de preferencia entre índices duplicados (el primero se conserva)"""
+        return (not index['backs_constraint'], not index['is_unique'], -(index['idx_scan'] or 0), index['indexname'])
+    
+    def _find_redundant_indexes(self, by_table: Dict[Tuple[str, str], List]) -> List[Dict[str, Any]]:
+        """Índices duplicados (misma definición con otro nombre) o cuyas columnas
+        son un prefijo de las de otro índice de la tabla, que ya sirve a las
+        mismas consultas. Nunca se proponen los que respaldan una restricción."""
+        redundant = []
+        for indexes in by_table.values():
+            valid = [index for index in indexes if index['is_valid']]
+            flagged = set()
+            
+            # Duplicados exactos: se conserva el preferido de cada grupo
+            groups = {}
+            for index in valid:
+                groups.setdefault(_definition_without_name(index['indexdef']), []).append(index)
+            for group in groups.values():
+                if len(group) < 2:
+                    continue
+                group.sort(key=self._keep_order)
+                for index in group[1:]:
+                    if not index['backs_constraint']:
+                        redundant.append(dict(index, reason='duplicado', covered_by=group[0]['indexname']))
+                        flagged.add(index['indexname'])
+            
+            # Prefijos: (a) sobra si (a, b) existe, salvo que sea único o parcial.
+            # Las columnas deben coincidir también en clase de operadores,
+            # collation y orden: (a text_pattern_ops) sirve a LIKE 'x%' y
+            # (a, b) no. Lo cubre el más largo de los que lo contienen, que
+            # nunca es a su vez prefijo de otro y por tanto se conserva.
+            duplicates = set(flagged)
+            for index in valid:
+                columns = index['column_names']
+                if (index['indexname'] in flagged or index['is_unique'] or index['backs_constraint'] or
+                        index['is_partial'] or index['index_method'] != 'btree' or None in columns):
+                    continue
+                covering = [other for other in valid
+                            if other is not index and other['indexname'] not in duplicates and
+                            other['index_method'] == 'btree' and not other['is_partial'] and
+                            len(other['column_names']) > len(columns) and
+                            self._key_prefix(other, len(columns)) == self._key_prefix(index, len(columns))]
+                if covering:
+                    cover = min(covering, key=lambda other: (-len(other['column_names']), self._keep_order(other)))
+                    redundant.append(dict(index, reason='prefijo', covered_by=cover['indexname']))
+                    flagged.add(index['indexname'])
+        return redundant
+    
+    def _key_prefix(self, index: Dict[str, Any], length: int) -> List[Tuple]:
+        """Primeras columnas del índice con su clase de operadores, collation y orden"""
+        return list(zip(index['column_names'][:length], index['column_options'][:length]))
+    
+    def _find_unused_indexes(self, constraints: List[Dict[str, Any]], by_table: Dict[Tuple[str, str], List],
+                             redundant: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Índices sin ningún scan desde el último reinicio de estadísticas, que
+        no son únicos, no respaldan restricciones, no son el único índice de
+        una clave foránea y no reemplazan a un índice redundante"""
+        flagged = {(index['schemaname'], index['indexname']) for index in redundant}
+        # Los que cubren a un redundante heredan sus consultas cuando se borre
+        keep = {(index['schemaname'], index['covered_by']) for index in redundant}
+        fk_columns = {}
+        for constraint in constraints:
+            if constraint['constraint_type'] == 'FOREIGN KEY' and constraint.get('column_names'):
+                fk_columns.setdefault((constraint['table_schema'], constraint['table_name']), []).append(
+                    list(constraint['column_names']))
+        
+        unused = []
+        for table, indexes in by_table.items():
+            remaining = [index for index in indexes if (index['schemaname'], index['indexname']) not in flagged]
+            for index in remaining:
+                if (index['idx_scan'] or not index['is_valid'] or index['is_unique'] or
+                        index['backs_constraint'] or (index['schemaname'], index['indexname']) in keep):
+                    continue
+                # Quitarlo dejaría sin índice a una clave foránea
+                if any(self._covers(index, columns) and
+                       not any(self._covers(other, columns) for other in remaining if other is not index)
+                       for columns in fk_columns.get(table, [])):
+                    continue
+                unused.append(index)
+        unused.sort(key=lambda index: -index['index_size'])
+        return unused
+    
+    def get_report_tables(self) -> str:
+        """Tablas con los resultados del análisis"""
+        sections = []
+        
+        sections.append("CLAVES FORÁNEAS SIN ÍNDICE:")
+        if self.missing_fk_indexes:
+            rows = [[f"{item['schemaname']}.{item['tablename']}", ", ".join(item['column_names']),
+                     item['foreign_table'], item['n_live_tup'], item['seq_scan']]
+                    for item in self.missing_fk_indexes]
+            sections.append(tabulate(rows, headers=["Tabla", "Columnas", "Referencia", "Filas", "Seq scans"],
+                                     tablefmt="grid"))
+        else:
+            sections.append("Todas las claves foráneas tienen un índice.")
+        
+        sections.append("\nÍNDICES DUPLICADOS O SOLAPADOS:")
+        if self.redundant_indexes:
+            rows = [[f"{index['schemaname']}.{index['indexname']}", index['tablename'], index['reason'],
+                     index['covered_by'], index['idx_scan'], _format_size(index['index_size'])]
+                    for index in self.redundant_indexes]
+            sections.append(tabulate(rows, headers=["Índice", "Tabla", "Motivo", "Cubierto por", "Scans", "Tamaño"],
+                                     tablefmt="grid"))
+        else:
+            sections.append("No hay índices duplicados ni solapados.")
+        
+        since = f" desde {self.stats_reset:%Y-%m-%d %H:%M}" if isinstance(self.stats_reset, datetime) else ""
+        sections.append(f"\nÍNDICES SIN USO (0 scans{since}):")
+        if self.unused_indexes:
+            rows = [[f"{index['schemaname']}.{index['indexname']}", index['tablename'], _format_size(index['index_size'])]
+                    for index in self.unused_indexes]
+            sections.append(tabulate(rows, headers=["Índice", "Tabla", "Tamaño"], tablefmt="grid"))
+        else:
+            sections.append("Todos los índices se usaron al menos una vez.")
+        
+        return "\n".join(sections)
+    
+    def generate_migration(self) -> str:
+        """Migración con los cambios propuestos. CONCURRENTLY no bloquea las
+        escrituras pero no puede ejecutarse dentro de una transacción, así que
+        el script no lleva BEGIN/COMMIT. Las eliminaciones de índices sin uso
+        quedan comentadas: las estadísticas son solo de este servidor."""
+        script = [
+            "-- ========================================",
+            "-- MIGRACIÓN DE ÍNDICES PROPUESTA",
+            f"-- Generado automáticamente: {datetime.now():%Y-%m-%d %H:%M:%S}",
+            "-- ========================================",
+            "",
+            "-- IMPORTANTE: CREATE/DROP INDEX CONCURRENTLY no puede ejecutarse dentro",
+            "-- de una transacción. Ejecutar con psql sin --single-transaction.",
+            "-- Si un CREATE INDEX CONCURRENTLY falla, deja un índice INVALID que hay",
+            "-- que borrar antes de reintentar (IF NOT EXISTS lo saltaría).",
+            ""
+        ]
+        
+        if self.missing_fk_indexes:
+            script.append("-- Índices para claves foráneas")
+            for item in self.missing_fk_indexes:
+                script.append(f"-- {item['constraint_name']} -> {item['foreign_table']} ({item['n_live_tup']} filas)")
+                script.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {item['indexname']} "
+                              f"ON {item['schemaname']}.{item['tablename']} ({', '.join(item['column_names'])});")
+            script.append("")
+        
+        if self.redundant_indexes:
+            script.append("-- Índices duplicados o solapados")
+            for index in self.redundant_indexes:
+                script.append(f"-- {index['reason']}, cubierto por {index['covered_by']}: {index['indexdef']}")
+                script.append(f"DROP INDEX CONCURRENTLY IF EXISTS {index['schemaname']}.{index['indexname']};")
+            script.append("")
+        
+        if self.unused_indexes:
+            script.append("-- Índices sin uso: revisar el uso en las réplicas antes de descomentar")
+            for index in self.unused_indexes:
+                script.append(f"-- {index['indexdef']}")
+                script.append(f"-- DROP INDEX CONCURRENTLY IF EXISTS {index['schemaname']}.{index['indexname']};")
+            script.append("")
+        
+        return "\n".join(script)
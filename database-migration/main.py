@@ -5,13 +5,29 @@ import argparse
 import logging
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from typing import Dict, List, Any
 from colorama import init, Fore, Style
-from database_manager import local_db, production_db
+from database_manager import local_db, production_db, load_fleet_config
 from schema_extractor import SchemaExtractor
 from schema_comparator import SchemaComparator
 from migration_generator import MigrationGenerator
 from migration_runner import MigrationRunner
-from config import OUTPUT_DIR, SCHEMA_EXTRACT_FILE, PRODUCTION_SCHEMA_FILE, MIGRATION_SCRIPT_FILE
+from schema_benchmark import SchemaBenchmark
+from snapshot_cache import SnapshotCache
+from definition_fingerprints import FingerprintStore
+from drift_matrix import DriftMatrix
+from diff_stream import DiffWriter, read_diff_header
+from index_advisor import IndexAdvisor
+from config import (OUTPUT_DIR, SCHEMA_EXTRACT_FILE, PRODUCTION_SCHEMA_FILE, MIGRATION_SCRIPT_FILE,
+                    LOCAL_SNAPSHOT_FILE, PRODUCTION_SNAPSHOT_FILE, EXTRACTION_MODE, EXTRACTION_MODES,
+                    HASH_FIRST_DEFINITIONS, MIGRATABLE_OBJECTS, INCLUDE_EXTENSION_FUNCTIONS,
+                    FLEET_CONFIG_FILE, FLEET_MAX_WORKERS, FLEET_SNAPSHOT_DIR, STREAM_COMPARISON,
+                    FLEET_DRIFT_FILE, FLEET_MATRIX_MAX_ROWS, BASELINE_SNAPSHOT_FILE, THREE_WAY_REPORT_FILE,
+                    DIFF_STREAM_FILE, INDEX_ADVICE_FILE, MAINTENANCE_SCRIPT_FILE,
+                    CONCURRENT_INDEX_SCRIPT_FILE, VALIDATE_CONSTRAINTS_SCRIPT_FILE)
 
 # Inicializar colorama para colores en consola
 init(autoreset=True)
@@ -31,9 +47,20 @@ logger = logging.getLogger(__name__)
 class MigrationManager:
     """Gestor principal del sistema de migración"""
     
-    def __init__(self):
-        self.extractor = SchemaExtractor()
-        self.comparator = SchemaComparator()
+    def __init__(self, extraction_mode: str = EXTRACTION_MODE, compress_snapshots: bool = False,
+                 refresh: bool = False, hash_first: bool = HASH_FIRST_DEFINITIONS,
+                 local_dump: str = None, production_dump: str = None, filters: dict = None,
+                 include_extension_functions: bool = INCLUDE_EXTENSION_FUNCTIONS,
+                 stream: bool = STREAM_COMPARISON, baseline: str = BASELINE_SNAPSHOT_FILE):
+        self.extractor = SchemaExtractor(extraction_mode, SnapshotCache(), filters, include_extension_functions)
+        self.stream = stream
+        self.compress_snapshots = compress_snapshots
+        self.refresh = refresh
+        self.hash_first = hash_first
+        self.local_dump = local_dump
+        self.production_dump = production_dump
+        self.baseline = baseline
+        self.comparator = SchemaComparator(FingerprintStore())
         self.generator = MigrationGenerator()
         self.runner = MigrationRunner()
     
@@ -41,15 +68,26 @@ class MigrationManager:
         """Probar conexiones a ambas bases de datos"""
         print(f"{Fore.CYAN}🔍 Probando conexiones...{Style.RESET_ALL}")
         
-        # Probar conexión local
-        if local_db.test_connection():
+        # Probar conexión local (o verificar el volcado que la reemplaza)
+        if self.local_dump:
+            if not os.path.exists(self.local_dump):
+                print(f"{Fore.RED}❌ Volcado local no encontrado: {self.local_dump}{Style.RESET_ALL}")
+                return False
+            print(f"{Fore.GREEN}📦 Esquema local desde volcado: {self.local_dump} (sin conexión){Style.RESET_ALL}")
+        elif local_db.test_connection():
             print(f"{Fore.GREEN}✅ Conexión local exitosa{Style.RESET_ALL}")
         else:
             print(f"{Fore.RED}❌ Error de conexión local{Style.RESET_ALL}")
             return False
         
-        # Probar conexión de producción
-        if production_db.test_connection():
+        # Probar conexión de producción (o verificar el volcado que la reemplaza)
+        if self.production_dump:
+            if not os.path.exists(self.production_dump):
+                print(f"{Fore.RED}❌ Volcado de producción no encontrado: {self.production_dump}{Style.RESET_ALL}")
+                return False
+            print(f"{Fore.GREEN}📦 Esquema de producción desde volcado: {self.production_dump} "
+                  f"(sin conexión){Style.RESET_ALL}")
+        elif production_db.test_connection():
             print(f"{Fore.GREEN}✅ Conexión de producción exitosa{Style.RESET_ALL}")
         else:
             print(f"{Fore.RED}❌ Error de conexión de producción{Style.RESET_ALL}")
@@ -62,15 +100,13 @@ class MigrationManager:
         print(f"{Fore.CYAN}📊 Extrayendo esquemas...{Style.RESET_ALL}")
         
         try:
-            # Extraer esquema local
-            print("Extrayendo esquema local...")
-            local_schema = self.extractor.extract_complete_schema(local_db, "local")
+            local_schema, production_schema = self._extract_both_schemas()
             self.extractor.save_schema_to_file(local_schema, SCHEMA_EXTRACT_FILE)
-            
-            # Extraer esquema de producción
-            print("Extrayendo esquema de producción...")
-            production_schema = self.extractor.extract_complete_schema(production_db, "production")
             self.extractor.save_schema_to_file(production_schema, PRODUCTION_SCHEMA_FILE)
+            self.extractor.save_schema_snapshot(local_schema, LOCAL_SNAPSHOT_FILE, self.compress_snapshots)
+            self.extractor.save_schema_snapshot(production_schema, PRODUCTION_SNAPSHOT_FILE, self.compress_snapshots)
+            
+            self._print_extraction_timings()
             
             print(f"{Fore.GREEN}✅ Esquemas extraídos exitosamente{Style.RESET_ALL}")
             return True
@@ -79,29 +115,397 @@ class MigrationManager:
             print(f"{Fore.RED}❌ Error extrayendo esquemas: {e}{Style.RESET_ALL}")
             return False
     
+    def extract_fleet(self, config_path: str = FLEET_CONFIG_FILE,
+                      max_workers: int = FLEET_MAX_WORKERS) -> bool:
+        """Extraer en paralelo los esquemas de todos los destinos del archivo de
+        flota, con un snapshot por destino"""
+        print(f"{Fore.CYAN}📊 Extrayendo esquemas de la flota ({config_path})...{Style.RESET_ALL}")
+        
+        try:
+            targets = load_fleet_config(config_path)
+            workers = min(max_workers, len(targets))
+            print(f"Destinos: {len(targets)} | Extracciones simultáneas: {workers}")
+            
+            start = time.perf_counter()
+            results = self.extractor.extract_fleet(targets, max_workers, self.refresh, self.compress_snapshots)
+            elapsed = time.perf_counter() - start
+            
+            print(self.extractor.get_fleet_table(results))
+            sequential = sum(result['seconds'] for result in results)
+            slowest = max(result['seconds'] for result in results)
+            print(f"⏱️  Total: {elapsed:.2f}s (más lento: {slowest:.2f}s, secuencial: {sequential:.2f}s, "
+                  f"aceleración: {sequential / elapsed if elapsed else 1:.2f}x)")
+            
+            failed = [result['name'] for result in results if result['status'] != 'ok']
+            if failed:
+                print(f"{Fore.RED}❌ Fallaron {len(failed)} de {len(results)} destinos: "
+                      f"{', '.join(failed)}{Style.RESET_ALL}")
+                return False
+            
+            print(f"{Fore.GREEN}✅ Snapshots de la flota guardados en "
+                  f"{os.path.join(OUTPUT_DIR, FLEET_SNAPSHOT_DIR)}{Style.RESET_ALL}")
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error extrayendo la flota: {e}{Style.RESET_ALL}")
+            return False
+    
+    def _load_reference_schema(self, reference: str, fleet_targets) -> Dict[str, List[Dict[str, Any]]]:
+        """Esquema de referencia de compare-fleet: 'local' o 'production' (en
+        vivo o desde su volcado), el snapshot de un destino de la flota o la
+        ruta de un snapshot JSON"""
+        if reference in ('local', 'production'):
+            db_manager = (self.local_dump or local_db) if reference == 'local' else (self.production_dump or production_db)
+            return self.extractor.extract_complete_schema(db_manager, reference, refresh=self.refresh)
+        if reference in fleet_targets:
+            filepath = self.extractor.get_fleet_snapshot_path(reference)
+            if filepath is None:
+                raise FileNotFoundError(f"No hay snapshot de {reference} (ejecutar extract-fleet)")
+            return self.extractor.load_schema_snapshot(filepath)
+        if os.path.exists(reference):
+            return self.extractor.load_schema_snapshot(reference)
+        raise ValueError(f"Referencia no válida: {reference} (local, production, un destino de la "
+                         f"flota o la ruta de un snapshot)")
+    
+    def compare_fleet(self, config_path: str = FLEET_CONFIG_FILE, reference: str = 'local',
+                      max_workers: int = FLEET_MAX_WORKERS, json_path: str = None) -> bool:
+        """Comparar un esquema de referencia contra los snapshots de todos los
+        destinos de la flota y mostrar la matriz de deriva objeto × base de datos"""
+        print(f"{Fore.CYAN}🧭 Comparando la flota contra {reference}...{Style.RESET_ALL}")
+        
+        try:
+            fleet_targets = load_fleet_config(config_path)
+            targets = [name for name in fleet_targets if name != reference]
+            if not targets:
+                raise ValueError(f"No hay destinos que comparar en {config_path}")
+            
+            # La referencia se indexa (y se normaliza) una sola vez para todos los destinos
+            start = time.perf_counter()
+            reference_index = self.comparator.build_reference_index(
+                self._load_reference_schema(reference, fleet_targets))
+            index_time = time.perf_counter() - start
+            
+            def run(name):
+                filepath = self.extractor.get_fleet_snapshot_path(name)
+                if filepath is None:
+                    raise FileNotFoundError("sin snapshot (ejecutar extract-fleet)")
+                return self.comparator.compare_with_reference(reference_index,
+                                                              self.extractor.load_schema_snapshot(filepath))
+            
+            matrix = DriftMatrix(reference, targets)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as executor:
+                futures = {executor.submit(run, name): name for name in targets}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        matrix.add_target(name, future.result())
+                    except Exception as e:
+                        logger.error(f"Error comparando {name}: {e}")
+                        matrix.add_error(name, str(e))
+            elapsed = time.perf_counter() - start
+            self.comparator.fingerprints.save()
+            
+            print(matrix.get_summary_table())
+            print(f"\n{Fore.YELLOW}📋 MATRIZ DE DERIVA (respecto a {reference}):{Style.RESET_ALL}")
+            print(matrix.get_matrix_table(FLEET_MATRIX_MAX_ROWS))
+            json_path = matrix.save_json(json_path or os.path.join(OUTPUT_DIR, FLEET_DRIFT_FILE))
+            print(f"⏱️  Índice de referencia: {index_time:.2f}s | {len(targets)} destinos: {elapsed:.2f}s")
+            print(f"📁 Matriz en JSON: {json_path}")
+            
+            return all(matrix.results[name]['status'] == 'ok' for name in targets)
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error comparando la flota: {e}{Style.RESET_ALL}")
+            return False
+    
+    def _get_baseline_path(self):
+        """Ruta del snapshot base (con o sin .gz, el más reciente), o None si no existe"""
+        filepath = os.path.join(OUTPUT_DIR, self.baseline)
+        candidates = [path for path in (filepath, f"{filepath}.gz") if os.path.exists(path)]
+        return max(candidates, key=os.path.getmtime) if candidates else None
+    
+    def _load_baseline_schema(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Cargar el snapshot base de la comparación a tres bandas"""
+        filepath = self._get_baseline_path()
+        if filepath is None:
+            raise FileNotFoundError(f"No hay snapshot base ({self.baseline}); ejecutar set-baseline "
+                                    f"con producción en el estado de la última migración")
+        print(f"📌 Snapshot base: {filepath}")
+        return self.extractor.load_schema_snapshot(filepath)
+    
+    def set_baseline(self, live: bool = False) -> bool:
+        """Guardar el esquema actual de producción como snapshot base. Con live
+        se extrae de la base de datos en vivo aunque se haya indicado un volcado
+        y sin usar la caché (tras aplicar una migración)"""
+        source = production_db if live or not self.production_dump else self.production_dump
+        source_label = f"volcado {source}" if isinstance(source, str) else "base de datos en vivo"
+        print(f"{Fore.CYAN}📌 Guardando snapshot base de producción ({source_label})...{Style.RESET_ALL}")
+        
+        try:
+            schema = self.extractor.extract_complete_schema(source, "production", refresh=self.refresh or live)
+            filepath = self.extractor.save_schema_snapshot(schema, self.baseline, self.compress_snapshots)
+            print(f"{Fore.GREEN}✅ Snapshot base guardado en {filepath}{Style.RESET_ALL}")
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error guardando el snapshot base: {e}{Style.RESET_ALL}")
+            return False
+    
+    def _load_cached_schemas(self):
+        """Esquemas local y de producción para la comparación a tres bandas: el
+        último snapshot en caché de cada lado, sin volver a extraerlo. Solo se
+        extrae el lado que no tenga snapshot en caché (o ambos con --refresh)."""
+        def load(schema_name, db_manager):
+            if not self.refresh and not isinstance(db_manager, str):
+                cached = self.extractor.load_cached_schema(db_manager, schema_name)
+                if cached is not None:
+                    schema, created_at = cached
+                    ages[schema_name] = time.time() - created_at
+                    return schema
+            return self.extractor.extract_complete_schema(db_manager, schema_name, refresh=self.refresh)
+        
+        ages = {}
+        schemas, durations, elapsed = self._run_on_both(load, "cargando esquema")
+        for schema_name, label in (("local", "Local"), ("production", "Producción")):
+            if schema_name in ages:
+                print(f"📦 {label}: snapshot en caché de hace {ages[schema_name] / 60:.0f} min "
+                      f"(--refresh para extraerlo de nuevo)")
+            else:
+                print(f"📊 {label}: extraído en {durations[schema_name]:.2f}s")
+        return schemas['local'], schemas['production']
+    
+    def _print_three_way_summary(self, three_way: Dict[str, Dict[str, List]]):
+        """Mostrar el resumen de la comparación a tres bandas y los conflictos"""
+        print(f"\n{Fore.YELLOW}📋 CAMBIOS RESPECTO AL SNAPSHOT BASE:{Style.RESET_ALL}")
+        print(self.comparator.get_three_way_summary_table(three_way))
+        
+        conflicts = [(object_type, entry) for object_type, changes in three_way.items()
+                     for entry in changes['conflict']]
+        if conflicts:
+            print(f"{Fore.RED}⚠️  {len(conflicts)} objetos cambiaron de forma distinta en local y en "
+                  f"producción:{Style.RESET_ALL}")
+            for object_type, entry in conflicts:
+                print(f"  ! {object_type}: {self.comparator.format_three_way_entry(entry, object_type)}")
+    
+    def compare_three_way(self) -> bool:
+        """Comparar local y producción contra el snapshot base, a partir de los
+        snapshots en caché, y clasificar cada cambio como local, de producción
+        (hotfix) o en conflicto"""
+        print(f"{Fore.CYAN}🔀 Comparando a tres bandas (base / local / producción)...{Style.RESET_ALL}")
+        
+        try:
+            baseline_schema = self._load_baseline_schema()
+            local_schema, production_schema = self._load_cached_schemas()
+            
+            start = time.perf_counter()
+            three_way = self.comparator.compare_three_way(baseline_schema, local_schema, production_schema)
+            elapsed = time.perf_counter() - start
+            self._print_definition_loads(local_schema, production_schema)
+            
+            report = self.comparator.generate_three_way_report(three_way)
+            self.comparator.save_diff_report(report, THREE_WAY_REPORT_FILE)
+            
+            self._print_three_way_summary(three_way)
+            print(f"⏱️  Comparación a tres bandas: {elapsed:.2f}s")
+            print(f"📁 Reporte: {THREE_WAY_REPORT_FILE}")
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error en la comparación a tres bandas: {e}{Style.RESET_ALL}")
+            return False
+    
+    def _run_on_both(self, task, action: str):
+        """Ejecutar task(schema_name, db_manager) en paralelo sobre las bases de
+        datos local y de producción (o la ruta del volcado que reemplaza a cada
+        una). Retorna los resultados por esquema, la duración de cada lado y el
+        tiempo total."""
+        targets = [("local", "local", self.local_dump or local_db),
+                   ("production", "producción", self.production_dump or production_db)]
+        durations = {}
+        
+        def run(schema_name, db_manager):
+            start = time.perf_counter()
+            try:
+                return task(schema_name, db_manager)
+            finally:
+                durations[schema_name] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = [(schema_name, label, executor.submit(run, schema_name, db_manager))
+                       for schema_name, label, db_manager in targets]
+        elapsed = time.perf_counter() - start
+        
+        # Reunir errores de ambos lados antes de fallar
+        errors = []
+        for schema_name, label, future in futures:
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Error {action} {label}: {error}")
+                errors.append(f"{label}: {error}")
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        
+        results = {schema_name: future.result() for schema_name, label, future in futures}
+        return results, durations, elapsed
+    
+    def _extract_both_schemas(self, hash_first: bool = False):
+        """Extraer en paralelo los esquemas local y de producción.
+        
+        Con hash_first las definiciones de funciones, triggers y vistas se
+        comparan primero por md5 y solo se descargan las que difieren."""
+        from_dump = bool(self.local_dump or self.production_dump)
+        if from_dump and hash_first:
+            # Un volcado ya trae las definiciones completas y no se puede consultar
+            print("🔑 --hash-first no aplica al comparar con un volcado; se usan definiciones completas")
+            hash_first = False
+        
+        print("Extrayendo esquemas local y de producción en paralelo...")
+        schemas, durations, elapsed = self._run_on_both(
+            lambda schema_name, db_manager: self.extractor.extract_complete_schema(
+                db_manager, schema_name, refresh=self.refresh, hash_definitions=hash_first),
+            "extrayendo esquema"
+        )
+        
+        sequential = sum(durations.values())
+        print(f"⏱️  Local: {durations['local']:.2f}s | Producción: {durations['production']:.2f}s | "
+              f"Total: {elapsed:.2f}s (secuencial: {sequential:.2f}s, "
+              f"aceleración: {sequential / elapsed if elapsed else 1:.2f}x)")
+        
+        if hash_first:
+            keys = self.extractor.get_differing_definition_keys(schemas['local'], schemas['production'])
+            pending = sum(len(object_keys) for object_keys in keys.values())
+            if pending:
+                fetched, durations, elapsed = self._run_on_both(
+                    lambda schema_name, db_manager: self.extractor.fetch_definitions(
+                        db_manager, schemas[schema_name], keys),
+                    "descargando definiciones"
+                )
+                total = sum(len(schemas['production'].get(object_type, [])) for object_type in keys)
+                print(f"🔑 Definiciones distintas: {pending} | Descargadas de producción: "
+                      f"{fetched['production']} de {total} en {durations['production']:.2f}s")
+            else:
+                print("🔑 Todas las definiciones coinciden por hash; no se descargó ninguna")
+        
+        if from_dump:
+            # pg_dump no describe las columnas de las vistas: se ignoran en ambos lados
+            for schema in schemas.values():
+                self.extractor.drop_view_columns(schema)
+        
+        return schemas['local'], schemas['production']
+    
+    def _get_source_fingerprints(self) -> Dict[str, str]:
+        """Huellas actuales de los catálogos local y de producción (o de sus volcados)"""
+        fingerprints, _, _ = self._run_on_both(
+            lambda schema_name, db_manager: self.extractor.get_source_fingerprint(db_manager),
+            "calculando la huella del catálogo"
+        )
+        return fingerprints
+    
+    def _compare_both_schemas(self, need_schemas: bool = False):
+        """Extraer y comparar los esquemas local y de producción. Las
+        diferencias se escriben además en DIFF_STREAM_FILE (NDJSON) junto con
+        las huellas de ambos catálogos. Retorna las diferencias y los esquemas
+        (None en la comparación en streaming o si se reutilizó un resultado
+        memorizado, salvo con need_schemas)."""
+        # Las huellas se toman antes de extraer: si el catálogo cambia durante
+        # la comparación, el archivo queda desactualizado y no se reutiliza
+        fingerprints = self._get_source_fingerprints()
+        key = None if self.refresh else (fingerprints['local'], fingerprints['production'])
+        with DiffWriter(os.path.join(OUTPUT_DIR, DIFF_STREAM_FILE), {'fingerprints': fingerprints}) as diff_writer:
+            differences = None if need_schemas else self.comparator.get_cached_result(key)
+            if differences is not None:
+                print("♻️  Ningún catálogo cambió desde la comparación anterior; se reutiliza su resultado")
+                self.comparator.write_result(diff_writer, differences)
+                return differences, None, None
+            
+            if self.stream and (self.local_dump or self.production_dump or need_schemas):
+                print("🌊 --stream no aplica al comparar con un volcado ni a --three-way; se compara en memoria")
+            elif self.stream:
+                return self._compare_streams(diff_writer, key), None, None
+            
+            local_schema, production_schema = self._extract_both_schemas(self.hash_first)
+            differences = self.comparator.compare_schemas(local_schema, production_schema, diff_writer, key)
+        return differences, local_schema, production_schema
+    
+    def _load_current_diff(self):
+        """Diferencias de la última comparación (DIFF_STREAM_FILE), si ninguno de
+        los dos catálogos cambió desde entonces. None si hay que comparar de nuevo."""
+        filepath = os.path.join(OUTPUT_DIR, DIFF_STREAM_FILE)
+        if self.refresh or not os.path.exists(filepath):
+            return None
+        try:
+            header = read_diff_header(filepath)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron leer las diferencias de {filepath}: {e}")
+            return None
+        
+        if header.get('fingerprints') != self._get_source_fingerprints():
+            print("📄 Los esquemas cambiaron desde la última comparación; se comparan de nuevo")
+            return None
+        print(f"📄 Usando las diferencias de la última comparación ({DIFF_STREAM_FILE}, hace "
+              f"{(time.time() - header['created_at']) / 60:.0f} min), sin extraer los esquemas")
+        return self.generator.load_diff_file(filepath)
+    
+    def _compare_streams(self, diff_writer: DiffWriter = None, key=None):
+        """Comparar los esquemas con un merge join sobre cursores del servidor
+        ordenados por clave, sin cargar ninguno de los dos en memoria"""
+        if self.hash_first:
+            print("🔑 --hash-first no aplica a la comparación en streaming")
+        print("Comparando esquemas local y de producción en streaming...")
+        
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            local_stream = stack.enter_context(self.extractor.open_schema_stream(local_db, "local"))
+            production_stream = stack.enter_context(
+                self.extractor.open_schema_stream(production_db, "production"))
+            differences = self.comparator.compare_streams(local_stream, production_stream, diff_writer, key)
+        print(f"⏱️  Comparación en streaming: {time.perf_counter() - start:.2f}s")
+        return differences
+    
+    def _print_definition_loads(self, local_schema=None, production_schema=None):
+        """Mostrar cuántas definiciones de funciones hubo que cargar bajo demanda"""
+        parts = []
+        for schema_name, label, schema in (("local", "local", local_schema),
+                                           ("production", "producción", production_schema)):
+            loader = self.extractor.definition_loaders.get(schema_name)
+            if loader is None:
+                continue
+            if schema is None:
+                parts.append(f"{label} {loader.loaded}")
+            else:
+                parts.append(f"{label} {loader.loaded} de {len(schema.get('functions', []))}")
+        if parts:
+            print(f"🧩 Definiciones de funciones cargadas: {', '.join(parts)}")
+    
+    def _print_extraction_timings(self):
+        """Mostrar la duración de cada consulta de la última extracción"""
+        for schema_name, label in (("local", "local"), ("production", "producción")):
+            print(f"\n{Fore.YELLOW}⏱️  TIEMPOS DE EXTRACCIÓN ({label}, modo {self.extractor.mode}):{Style.RESET_ALL}")
+            print(self.extractor.get_timings_table(schema_name))
+    
     def compare_schemas(self) -> bool:
         """Comparar esquemas y generar reporte de diferencias"""
         print(f"{Fore.CYAN}🔍 Comparando esquemas...{Style.RESET_ALL}")
         
         try:
-            # Cargar esquemas
-            local_schema = self.extractor.extract_complete_schema(local_db, "local")
-            production_schema = self.extractor.extract_complete_schema(production_db, "production")
-            
-            # Comparar
-            differences = self.comparator.compare_schemas(local_schema, production_schema)
+            # Extraer y comparar
+            differences, local_schema, production_schema = self._compare_both_schemas()
+            self._print_definition_loads(local_schema, production_schema)
             
             # Generar reporte
             report = self.comparator.generate_diff_report(differences)
             self.comparator.save_diff_report(report)
             
             # Mostrar resumen
-            summary = self.comparator.get_summary_table()
+            summary = self.comparator.get_summary_table(differences)
             print(f"\n{Fore.YELLOW}📋 RESUMEN DE CAMBIOS:{Style.RESET_ALL}")
             print(summary)
             
-            if self.comparator.has_changes():
+            if differences.has_changes():
                 print(f"{Fore.YELLOW}⚠️  Se encontraron diferencias. Revisar el reporte completo.{Style.RESET_ALL}")
+                print(f"📁 Diferencias para generate: {DIFF_STREAM_FILE}")
             else:
                 print(f"{Fore.GREEN}✅ No se encontraron diferencias entre los esquemas{Style.RESET_ALL}")
             
@@ -111,26 +515,55 @@ class MigrationManager:
             print(f"{Fore.RED}❌ Error comparando esquemas: {e}{Style.RESET_ALL}")
             return False
     
-    def generate_migration(self) -> bool:
-        """Generar script de migración"""
+    def generate_migration(self, three_way: bool = False) -> bool:
+        """Generar script de migración.
+        
+        Con three_way se omiten los cambios hechos solo en producción desde el
+        snapshot base (hotfixes) y los que están en conflicto con local."""
         print(f"{Fore.CYAN}📝 Generando script de migración...{Style.RESET_ALL}")
         
         try:
-            # Cargar esquemas
-            local_schema = self.extractor.extract_complete_schema(local_db, "local")
-            production_schema = self.extractor.extract_complete_schema(production_db, "production")
+            # Reutilizar las diferencias de compare si los esquemas no cambiaron
+            # (la comparación a tres bandas necesita los esquemas completos)
+            differences = None if three_way else self._load_current_diff()
             
-            # Comparar
-            differences = self.comparator.compare_schemas(local_schema, production_schema)
+            if differences is None:
+                # Extraer y comparar
+                differences, local_schema, production_schema = self._compare_both_schemas(three_way)
+                self._print_definition_loads(local_schema, production_schema)
+                
+                if three_way:
+                    changes = self.comparator.compare_three_way(self._load_baseline_schema(),
+                                                                local_schema, production_schema)
+                    differences, excluded = self.comparator.exclude_production_changes(differences, changes)
+                    self._print_three_way_summary(changes)
+                    print(f"🔀 Omitidas: {excluded['production']} diferencias por cambios solo en producción, "
+                          f"{excluded['conflict']} por conflictos")
             
-            if not self.comparator.has_changes():
+            if not differences.has_changes():
                 print(f"{Fore.GREEN}✅ No hay cambios para migrar{Style.RESET_ALL}")
                 return True
             
-            # Generar script de migración
-            migration_script = self.generator.generate_migration_script(differences)
+            # Generar script de migración, planificado con el tamaño de las
+            # tablas de producción (un volcado no trae estadísticas)
+            table_stats = None if self.production_dump else self.extractor.extract_tables(production_db)
+            migration_script = self.generator.generate_migration_script(differences, table_stats)
             self.generator.save_migration_script(migration_script)
             
+            for filename, script in ((CONCURRENT_INDEX_SCRIPT_FILE, self.generator.concurrent_script),
+                                     (VALIDATE_CONSTRAINTS_SCRIPT_FILE, self.generator.validate_script),
+                                     (MAINTENANCE_SCRIPT_FILE, self.generator.maintenance_script)):
+                if script:
+                    self.generator.save_migration_script(script, filename)
+                elif os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+                    # No dejar la fase de una generación anterior
+                    os.remove(os.path.join(OUTPUT_DIR, filename))
+            
+            print(f"\n{Fore.CYAN}🔒 PLAN POR BLOQUEOS:{Style.RESET_ALL}")
+            print(self.generator.planner.get_plan_table())
+            if self.generator.planner.coalesced:
+                print(f"🧩 ALTER TABLE combinados por tabla: {self.generator.planner.coalesced} sentencias menos")
+            
             # Generar script de rollback
             rollback_script = self.generator.generate_rollback_script(differences)
             rollback_file = os.path.join(OUTPUT_DIR, "rollback_script.sql")
@@ -140,6 +573,13 @@ class MigrationManager:
             print(f"{Fore.GREEN}✅ Scripts de migración generados exitosamente{Style.RESET_ALL}")
             print(f"📁 Script de migración: {MIGRATION_SCRIPT_FILE}")
             print(f"📁 Script de rollback: rollback_script.sql")
+            if self.generator.concurrent_script:
+                print(f"📁 Índices concurrentes: {CONCURRENT_INDEX_SCRIPT_FILE} (migrate los construye tras la fase en línea)")
+            if self.generator.validate_script:
+                print(f"📁 Validación de restricciones: {VALIDATE_CONSTRAINTS_SCRIPT_FILE} (migrate las valida tras la fase en línea)")
+            if self.generator.maintenance_script:
+                print(f"{Fore.YELLOW}🔧 Script para la ventana de mantenimiento: {MAINTENANCE_SCRIPT_FILE} "
+                      f"(ejecutar con migrate --maintenance){Style.RESET_ALL}")
             
             return True
             
@@ -147,9 +587,65 @@ class MigrationManager:
             print(f"{Fore.RED}❌ Error generando migración: {e}{Style.RESET_ALL}")
             return False
     
-    def execute_migration(self, dry_run: bool = False) -> bool:
-        """Ejecutar migración"""
-        script_path = os.path.join(OUTPUT_DIR, MIGRATION_SCRIPT_FILE)
+    def benchmark_extraction(self, target: str, repeat: int, suite: str = 'modes',
+                             tenants: int = 20) -> bool:
+        """Medir el rendimiento de la extracción sobre una base de datos
+        
+        - modes: extracción completa en cada modo (legacy, session, json)
+        - catalog: consultas de pg_catalog frente a las de information_schema
+        - model: memoria y comparación de diccionarios frente al modelo compacto
+        """
+        db_manager = local_db if target == 'local' else production_db
+        print(f"{Fore.CYAN}⏱️  Benchmark '{suite}' ({target}, {repeat} repeticiones)...{Style.RESET_ALL}")
+        
+        try:
+            benchmark = SchemaBenchmark(self.extractor)
+            if suite == 'catalog':
+                benchmark.benchmark_catalog_queries(db_manager, repeat=repeat)
+                print(benchmark.get_catalog_results_table())
+            elif suite == 'model':
+                schema = self.extractor.extract_complete_schema(db_manager, target, refresh=self.refresh)
+                benchmark.benchmark_object_model(schema, tenants=tenants)
+                print(benchmark.get_model_results_table())
+            else:
+                benchmark.benchmark_extraction_modes(db_manager, target, repeat=repeat)
+                print(benchmark.get_results_table())
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error en el benchmark: {e}{Style.RESET_ALL}")
+            return False
+    
+    def advise_indexes(self, target: str) -> bool:
+        """Proponer índices para claves foráneas y eliminar los duplicados,
+        solapados o sin uso de una base de datos"""
+        if (self.local_dump if target == 'local' else self.production_dump):
+            print(f"{Fore.RED}❌ advise-indexes necesita las estadísticas de uso de una conexión, no un volcado{Style.RESET_ALL}")
+            return False
+        
+        db_manager = local_db if target == 'local' else production_db
+        print(f"{Fore.CYAN}🔎 Analizando índices ({target})...{Style.RESET_ALL}")
+        
+        try:
+            advisor = IndexAdvisor(self.extractor)
+            advisor.analyze(db_manager)
+            print(advisor.get_report_tables())
+            
+            script_path = os.path.join(OUTPUT_DIR, INDEX_ADVICE_FILE)
+            with open(script_path, 'w', encoding='utf-8') as f:
+                f.write(advisor.generate_migration())
+            
+            print(f"\n{Fore.GREEN}✅ Migración de índices guardada en: {script_path}{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}⚠️  Ejecutar fuera de una transacción: psql -f {script_path}{Style.RESET_ALL}")
+            return True
+            
+        except Exception as e:
+            print(f"{Fore.RED}❌ Error analizando índices: {e}{Style.RESET_ALL}")
+            return False
+    
+    def execute_migration(self, dry_run: bool = False, maintenance: bool = False) -> bool:
+        """Ejecutar migración (con maintenance, la fase de la ventana de mantenimiento)"""
+        script_path = os.path.join(OUTPUT_DIR, MAINTENANCE_SCRIPT_FILE if maintenance else MIGRATION_SCRIPT_FILE)
         
         if not os.path.exists(script_path):
             print(f"{Fore.RED}❌ Script de migración no encontrado: {script_path}{Style.RESET_ALL}")
@@ -163,11 +659,27 @@ class MigrationManager:
         try:
             success = self.runner.execute_migration(script_path, dry_run)
             
+            # Índices sobre tablas grandes: fuera de la transacción, tras la fase en línea
+            concurrent_path = os.path.join(OUTPUT_DIR, CONCURRENT_INDEX_SCRIPT_FILE)
+            if success and not maintenance and os.path.exists(concurrent_path):
+                print(f"{Fore.CYAN}🏗️  Índices concurrentes ({CONCURRENT_INDEX_SCRIPT_FILE})...{Style.RESET_ALL}")
+                success = self.runner.execute_concurrent_indexes(concurrent_path, dry_run)
+            
+            # Restricciones añadidas con NOT VALID: validar sin bloquear escrituras
+            validate_path = os.path.join(OUTPUT_DIR, VALIDATE_CONSTRAINTS_SCRIPT_FILE)
+            if success and not maintenance and os.path.exists(validate_path):
+                print(f"{Fore.CYAN}🔎 Validación de restricciones ({VALIDATE_CONSTRAINTS_SCRIPT_FILE})...{Style.RESET_ALL}")
+                success = self.runner.execute_validations(validate_path, dry_run)
+            
             if success:
                 if dry_run:
                     print(f"{Fore.GREEN}✅ Script de migración válido{Style.RESET_ALL}")
                 else:
                     print(f"{Fore.GREEN}✅ Migración ejecutada exitosamente{Style.RESET_ALL}")
+                    # Producción queda como base de la próxima comparación a tres
+                    # bandas: el esquema ya migrado, no el volcado ni las
+                    # diferencias reutilizadas con las que se generó el script
+                    self.set_baseline(live=True)
                 return True
             else:
                 print(f"{Fore.RED}❌ Error en la migración{Style.RESET_ALL}")
@@ -194,7 +706,12 @@ class MigrationManager:
             (SCHEMA_EXTRACT_FILE, "Esquema local"),
             (PRODUCTION_SCHEMA_FILE, "Esquema producción"),
             (MIGRATION_SCRIPT_FILE, "Script migración"),
-            ("rollback_script.sql", "Script rollback")
+            (CONCURRENT_INDEX_SCRIPT_FILE, "Script índices concurrentes"),
+            (VALIDATE_CONSTRAINTS_SCRIPT_FILE, "Script validación de restricciones"),
+            (MAINTENANCE_SCRIPT_FILE, "Script ventana de mantenimiento"),
+            ("rollback_script.sql", "Script rollback"),
+            (os.path.relpath(self._get_baseline_path() or os.path.join(OUTPUT_DIR, self.baseline), OUTPUT_DIR),
+             "Snapshot base")
         ]
         
         print(f"\nArchivos generados:")
@@ -214,8 +731,64 @@ def main():
     """Función principal"""
     parser = argparse.ArgumentParser(description='Sistema de migración de base de datos PostgreSQL')
     parser.add_argument('action', choices=[
-        'test', 'extract', 'compare', 'generate', 'migrate', 'dry-run', 'status'
+        'test', 'extract', 'extract-fleet', 'compare', 'compare-fleet', 'compare-3way', 'set-baseline',
+        'generate', 'migrate', 'dry-run', 'status', 'benchmark', 'advise-indexes'
     ], help='Acción a ejecutar')
+    parser.add_argument('--mode', choices=EXTRACTION_MODES, default=EXTRACTION_MODE,
+                        help='Modo de extracción de esquemas')
+    parser.add_argument('--compress', action='store_true',
+                        help='Comprimir con gzip los snapshots JSON guardados')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignorar la caché de snapshots y extraer de nuevo')
+    parser.add_argument('--hash-first', action='store_true', default=HASH_FIRST_DEFINITIONS,
+                        help='Comparar definiciones por md5 y descargar solo las distintas (compare/generate)')
+    parser.add_argument('--target', choices=['local', 'production'], default='production',
+                        help='Base de datos a analizar (benchmark, advise-indexes)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Repeticiones por modo (benchmark)')
+    parser.add_argument('--suite', choices=['modes', 'catalog', 'model'], default='modes',
+                        help='Conjunto de mediciones a ejecutar (benchmark)')
+    parser.add_argument('--tenants', type=int, default=20,
+                        help='Copias del esquema a comparar (benchmark --suite model)')
+    parser.add_argument('--include-schema', action='append', metavar='GLOB',
+                        help='Extraer solo los esquemas que coincidan (repetible, admite * y ?)')
+    parser.add_argument('--exclude-schema', action='append', metavar='GLOB',
+                        help='Omitir los esquemas que coincidan (repetible)')
+    parser.add_argument('--include-table', action='append', metavar='GLOB',
+                        help='Extraer solo las tablas y vistas que coincidan, con sus columnas, '
+                             'índices, restricciones y triggers (repetible)')
+    parser.add_argument('--exclude-table', action='append', metavar='GLOB',
+                        help='Omitir las tablas y vistas que coincidan (repetible)')
+    parser.add_argument('--include-type', action='append', choices=MIGRATABLE_OBJECTS,
+                        help='Extraer solo estos tipos de objeto (repetible)')
+    parser.add_argument('--exclude-type', action='append', choices=MIGRATABLE_OBJECTS,
+                        help='Omitir estos tipos de objeto (repetible)')
+    parser.add_argument('--stream', action='store_true', default=STREAM_COMPARISON,
+                        help='Comparar con un merge join sobre cursores del servidor, sin cargar '
+                             'los esquemas en memoria (compare/generate)')
+    parser.add_argument('--include-extension-functions', action='store_true',
+                        default=INCLUDE_EXTENSION_FUNCTIONS,
+                        help='Extraer también las funciones instaladas por extensiones')
+    parser.add_argument('--fleet-config', metavar='RUTA', default=FLEET_CONFIG_FILE,
+                        help='Archivo JSON con los destinos de la flota (extract-fleet)')
+    parser.add_argument('--reference', default='local',
+                        help='Esquema de referencia de compare-fleet: local, production, un destino '
+                             'de la flota o la ruta de un snapshot')
+    parser.add_argument('--json', metavar='RUTA',
+                        help=f'Archivo JSON de la matriz de deriva (compare-fleet, por defecto {FLEET_DRIFT_FILE})')
+    parser.add_argument('--workers', type=int, default=FLEET_MAX_WORKERS,
+                        help='Extracciones simultáneas como máximo (extract-fleet)')
+    parser.add_argument('--baseline', metavar='ARCHIVO', default=BASELINE_SNAPSHOT_FILE,
+                        help='Snapshot base de la comparación a tres bandas (dentro de OUTPUT_DIR)')
+    parser.add_argument('--three-way', action='store_true',
+                        help='No revertir los cambios hechos solo en producción desde el snapshot '
+                             'base ni los que están en conflicto (generate)')
+    parser.add_argument('--maintenance', action='store_true',
+                        help='Ejecutar o validar el script de la ventana de mantenimiento (migrate, dry-run)')
+    parser.add_argument('--local-dump', metavar='RUTA',
+                        help='Leer el esquema local de un volcado de pg_dump en lugar de conectarse')
+    parser.add_argument('--production-dump', metavar='RUTA',
+                        help='Leer el esquema de producción de un volcado de pg_dump en lugar de conectarse')
     
     args = parser.parse_args()
     
@@ -223,7 +796,17 @@ def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
     # Inicializar gestor
-    manager = MigrationManager()
+    filters = {
+        'include_schemas': args.include_schema,
+        'exclude_schemas': args.exclude_schema,
+        'include_tables': args.include_table,
+        'exclude_tables': args.exclude_table,
+        'include_types': args.include_type,
+        'exclude_types': args.exclude_type
+    }
+    manager = MigrationManager(args.mode, args.compress, args.refresh, args.hash_first,
+                               args.local_dump, args.production_dump, filters,
+                               args.include_extension_functions, args.stream, args.baseline)
     
     print(f"{Fore.BLUE}🗄️  SISTEMA DE MIGRACIÓN DE BASE DE DATOS{Style.RESET_ALL}")
     print("=" * 60)
@@ -239,33 +822,61 @@ def main():
             success = manager.extract_schemas()
             sys.exit(0 if success else 1)
         
+        elif args.action == 'extract-fleet':
+            success = manager.extract_fleet(args.fleet_config, args.workers)
+            sys.exit(0 if success else 1)
+        
+        elif args.action == 'compare-fleet':
+            success = manager.compare_fleet(args.fleet_config, args.reference, args.workers, args.json)
+            sys.exit(0 if success else 1)
+        
         elif args.action == 'compare':
             if not manager.test_connections():
                 sys.exit(1)
             success = manager.compare_schemas()
             sys.exit(0 if success else 1)
         
+        elif args.action == 'compare-3way':
+            success = manager.compare_three_way()
+            sys.exit(0 if success else 1)
+        
+        elif args.action == 'set-baseline':
+            success = manager.set_baseline()
+            sys.exit(0 if success else 1)
+        
         elif args.action == 'generate':
             if not manager.test_connections():
                 sys.exit(1)
-            success = manager.generate_migration()
+            success = manager.generate_migration(args.three_way)
             sys.exit(0 if success else 1)
         
         elif args.action == 'migrate':
             if not manager.test_connections():
                 sys.exit(1)
-            success = manager.execute_migration(dry_run=False)
+            success = manager.execute_migration(dry_run=False, maintenance=args.maintenance)
             sys.exit(0 if success else 1)
         
         elif args.action == 'dry-run':
             if not manager.test_connections():
                 sys.exit(1)
-            success = manager.execute_migration(dry_run=True)
+            success = manager.execute_migration(dry_run=True, maintenance=args.maintenance)
             sys.exit(0 if success else 1)
         
         elif args.action == 'status':
             manager.show_status()
             sys.exit(0)
+        
+        elif args.action == 'benchmark':
+            if not manager.test_connections():
+                sys.exit(1)
+            success = manager.benchmark_extraction(args.target, args.repeat, args.suite, args.tenants)
+            sys.exit(0 if success else 1)
+        
+        elif args.action == 'advise-indexes':
+            if not manager.test_connections():
+                sys.exit(1)
+            success = manager.advise_indexes(args.target)
+            sys.exit(0 if success else 1)
     
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}⚠️  Operación cancelada por el usuario{Style.RESET_ALL}")
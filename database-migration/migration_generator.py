@@ -1,28 +1,72 @@
 """
 Generador de scripts de migración
 """
+import re
 import logging
-from typing import Dict, List, Any
-from config import OUTPUT_DIR, MIGRATION_SCRIPT_FILE
+from typing import Dict, List, Any, Optional, Tuple
+from config import OUTPUT_DIR, MIGRATION_SCRIPT_FILE, MIGRATION_LOCK_TIMEOUT, CONCURRENT_INDEX_SCRIPT_FILE
+from schema_model import LAZY_FIELDS, load_lazy_values
+from diff_stream import read_diff_file
+from diff_result import DiffResult
+from migration_planner import MigrationPlanner, PHASE_ONLINE, PHASE_CONCURRENT, PHASE_VALIDATE, PHASE_MAINTENANCE
 
 logger = logging.getLogger(__name__)
 
+_INDEX_PREFIX = re.compile(r'^CREATE (UNIQUE )?INDEX ')
+
+def concurrent_index_definition(indexdef: str) -> str:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS a partir de la definición de pg_indexes"""
+    return _INDEX_PREFIX.sub(lambda m: f"CREATE {m.group(1) or ''}INDEX CONCURRENTLY IF NOT EXISTS ", indexdef)
+
+def not_null_check_name(table_name: str, column_name: str) -> str:
+    """Nombre del CHECK (columna IS NOT NULL) con el que se valida un NOT NULL
+    sin bloquear escrituras (63 caracteres como máximo, como los de PostgreSQL)"""
+    return f"{table_name}_{column_name}"[:63 - len('_not_null')] + '_not_null'
+
 class MigrationGenerator:
     """Generador de scripts de migración SQL"""
     
-    def __init__(self):
+    def __init__(self, planner: Optional[MigrationPlanner] = None):
+        self.planner = planner or MigrationPlanner()
         self.migration_script = []
+        self.maintenance_script = None
+        self.concurrent_script = None
+        self.validate_script = None
+        self.statements = []
         self.safety_checks = []
+        self.created_tables = set()
+        self.inline_indexes = set()
     
-    def generate_migration_script(self, differences: Dict[str, Dict[str, List]]) -> str:
-        """Generar script de migración basado en las diferencias"""
+    def load_diff_file(self, filepath: str) -> DiffResult:
+        """Cargar las diferencias guardadas por la comparación (NDJSON), para
+        generar los scripts sin volver a extraer ni comparar los esquemas"""
+        header, differences = read_diff_file(filepath)
+        fingerprints = header.get('fingerprints') or {}
+        result = DiffResult(differences, (fingerprints.get('local'), fingerprints.get('production')))
+        logger.info(f"Diferencias cargadas de {filepath} ({result.count()} objetos)")
+        return result
+    
+    def generate_migration_script(self, differences: Dict[str, Dict[str, List]],
+                                  table_stats: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Generar script de migración basado en las diferencias.
+        
+        Las sentencias se planifican según el bloqueo que toman y el tamaño de
+        las tablas de producción (table_stats, ver MigrationPlanner): el script
+        retornado tiene las que pueden ejecutarse en línea, los índices de
+        tablas grandes quedan en self.concurrent_script (CONCURRENTLY, fuera
+        de una transacción), la validación de las restricciones añadidas con
+        NOT VALID en self.validate_script y las que necesitan una ventana de
+        mantenimiento en self.maintenance_script (None si no hay ninguna)."""
         logger.info("Generando script de migración...")
         
         self.migration_script = []
+        self.maintenance_script = None
+        self.concurrent_script = None
+        self.validate_script = None
+        self.statements = []
         self.safety_checks = []
-        
-        # Encabezado del script
-        self._add_header()
+        self.created_tables = set()
+        self.inline_indexes = set()
         
         # Verificaciones de seguridad
         self._add_safety_checks()
@@ -36,8 +80,9 @@ class MigrationGenerator:
         # Secuencias
         self._migrate_sequences(differences.get('sequences', {}))
         
-        # Tablas
-        self._migrate_tables(differences.get('tables', {}))
+        # Tablas, con sus columnas y restricciones propias
+        self._migrate_tables(differences.get('tables', {}), differences.get('columns', {}),
+                             differences.get('constraints', {}))
         
         # Columnas
         self._migrate_columns(differences.get('columns', {}))
@@ -57,26 +102,167 @@ class MigrationGenerator:
         # Vistas
         self._migrate_views(differences.get('views', {}))
         
-        # Finalización
-        self._add_footer()
+        # Separar las sentencias en línea de las de la ventana de mantenimiento
+        self.planner.plan(self.statements, table_stats)
+        self.statements = self.planner.coalesce(self._build_alter_table)
+        self.migration_script = self._build_phase_script(PHASE_ONLINE)
+        if self.planner.get_phase(PHASE_CONCURRENT):
+            self.concurrent_script = "\n".join(self._build_autocommit_script(PHASE_CONCURRENT, "ÍNDICES CONCURRENTES", [
+                f"-- Ejecutar después de {MIGRATION_SCRIPT_FILE} y fuera de una transacción",
+                "-- (psql sin --single-transaction). Si una construcción falla queda un",
+                "-- índice INVALID que IF NOT EXISTS saltaría: migrate lo elimina."
+            ]))
+        if self.planner.get_phase(PHASE_VALIDATE):
+            self.validate_script = "\n".join(self._build_autocommit_script(PHASE_VALIDATE, "VALIDACIÓN DE RESTRICCIONES", [
+                f"-- Ejecutar después de {MIGRATION_SCRIPT_FILE} (y {CONCURRENT_INDEX_SCRIPT_FILE}), cada",
+                "-- sentencia en su propia transacción: VALIDATE CONSTRAINT solo toma SHARE",
+                "-- UPDATE EXCLUSIVE. Mientras tanto las restricciones NOT VALID ya se",
+                "-- aplican a las filas nuevas. Si una validación falla, corregir las filas",
+                "-- existentes y volver a ejecutar este script."
+            ]))
+        if self.planner.get_phase(PHASE_MAINTENANCE):
+            self.maintenance_script = "\n".join(self._build_phase_script(PHASE_MAINTENANCE))
         
         script_content = "\n".join(self.migration_script)
         logger.info("Script de migración generado exitosamente")
         return script_content
     
-    def _add_header(self):
+    def _add_statement(self, section: str, action: str, sql: List[str], table: Optional[str] = None,
+                       comments: Optional[List[str]] = None, spaced: bool = False, **details):
+        """Registrar una sentencia de la migración para planificarla.
+        
+        section es el título bajo el que se agrupa en el script, action la
+        clave de su bloqueo en ACTION_LOCKS y table la tabla que bloquea
+        (schema.tabla). details admite foreign_table (tabla referenciada),
+        definition (texto donde buscar los objetos de los que depende),
+        relation (el nombre de la vista o función que crea), object
+        (el objeto del esquema que la origina), clause (el subcomando de
+        ALTER TABLE y la restricción cuya existencia lo condiciona, para
+        combinarlo con los de la misma tabla) y las alternativas que elige el
+        planificador: concurrent_sql (CREATE INDEX CONCURRENTLY), o
+        not_valid_sql, not_valid_clause y validate_sql (la restricción en dos
+        fases), con finish_sql para lo que se ejecuta tras validarla."""
+        self.statements.append(dict(details, section=section, action=action, sql=sql, table=table,
+                                    comments=comments or [], spaced=spaced))
+    
+    def _build_phase_script(self, phase: str) -> List[str]:
+        """Script de una fase del plan, con el bloqueo y la estimación de cada
+        sentencia que bloquea una tabla existente"""
+        script = []
+        self._add_header(script, phase)
+        
+        section = None
+        for statement in self.planner.get_phase(phase):
+            if statement['section'] != section:
+                if section is not None:
+                    script.append("")
+                section = statement['section']
+                script.append(f"-- {section}")
+            script.extend(statement['comments'])
+            if statement['lock'] is not None:
+                script.append(f"-- Bloqueo: {self.planner.describe(statement)}")
+            script.extend(statement['sql'])
+            if statement['spaced']:
+                script.append("")
+        if section is not None and not statement['spaced']:
+            script.append("")
+        
+        self._add_footer(script)
+        return script
+    
+    def _build_alter_table(self, table_key: str, clauses: List[Tuple[str, Optional[str]]]) -> List[str]:
+        """Un solo ALTER TABLE con varios subcomandos, en el orden en que se
+        registraron. Los que dependen de que una restricción no exista se
+        añaden en un bloque DO y el ALTER se ejecuta con EXECUTE."""
+        if not any(constraint_name for _, constraint_name in clauses):
+            return [f"ALTER TABLE {table_key}",
+                    *(f"    {clause}{',' if i < len(clauses) - 1 else ';'}" for i, (clause, _) in enumerate(clauses))]
+        
+        schema_name, table_name = table_key.split('.', 1)
+        sql = [
+            "DO $$",
+            "DECLARE",
+            "    clauses text[] := '{}';",
+            "BEGIN"
+        ]
+        for clause, constraint_name in clauses:
+            append = f"clauses := array_append(clauses, '{clause.replace(chr(39), chr(39) * 2)}');"
+            if constraint_name is None:
+                sql.append(f"    {append}")
+            else:
+                sql.extend([
+                    f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint_name}' AND table_name = '{table_name}' AND table_schema = '{schema_name}') THEN",
+                    f"        {append}",
+                    "    END IF;"
+                ])
+        sql.extend([
+            "    IF cardinality(clauses) > 0 THEN",
+            f"        EXECUTE 'ALTER TABLE {table_key} ' || array_to_string(clauses, ', ');",
+            "    END IF;",
+            "END $$;"
+        ])
+        return sql
+    
+    def _build_autocommit_script(self, phase: str, title: str, notes: List[str]) -> List[str]:
+        """Script de una fase que no bloquea escrituras: una sentencia por línea
+        y sin BEGIN/COMMIT, porque CREATE INDEX CONCURRENTLY no puede ejecutarse
+        dentro de una transacción y una validación no debe mantener sus bloqueos
+        hasta la siguiente (MigrationRunner ejecuta cada una aparte)"""
+        script = [
+            "-- ========================================",
+            f"-- {title}",
+            "-- Generado automáticamente",
+            "-- ========================================",
+            "",
+            "-- Plan de la migración por bloqueos:",
+            *self.planner.get_summary_lines(),
+            "",
+            *notes,
+            ""
+        ]
+        for statement in self.planner.get_phase(phase):
+            script.append(f"-- Bloqueo: {self.planner.describe(statement)}")
+            script.extend(statement['sql'])
+            script.append("")
+        return script
+    
+    def _add_header(self, script: List[str], phase: str = PHASE_ONLINE):
         """Añadir encabezado del script"""
-        self.migration_script.extend([
+        title = "SCRIPT DE MIGRACIÓN DE ESQUEMA"
+        if phase == PHASE_MAINTENANCE:
+            title += " - VENTANA DE MANTENIMIENTO"
+        script.extend([
             "-- ========================================",
-            "-- SCRIPT DE MIGRACIÓN DE ESQUEMA",
+            f"-- {title}",
             "-- Generado automáticamente",
             "-- ========================================",
             "",
             "-- IMPORTANTE: Este script contiene solo cambios estructurales",
             "-- No afecta los datos existentes en la base de datos",
             "",
+            "-- Plan de la migración por bloqueos:",
+            *self.planner.get_summary_lines(),
+            ""
+        ])
+        if phase == PHASE_MAINTENANCE:
+            script.extend([
+                f"-- Ejecutar después de {MIGRATION_SCRIPT_FILE}, con el servicio detenido o",
+                "-- en horario sin ventas: estas sentencias bloquean tablas grandes o",
+                "-- calientes durante un tiempo proporcional a su tamaño.",
+                ""
+            ])
+        script.extend([
             "BEGIN;",
-            "",
+            ""
+        ])
+        if phase == PHASE_ONLINE:
+            script.extend([
+                "-- No esperar detrás de transacciones largas: un ALTER TABLE en cola",
+                "-- bloquea todas las consultas que llegan después sobre la tabla",
+                f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}';",
+                ""
+            ])
+        script.extend([
             "-- Verificaciones de seguridad",
             "DO $$",
             "BEGIN",
@@ -98,9 +284,9 @@ class MigrationGenerator:
             ""
         ])
     
-    def _add_footer(self):
+    def _add_footer(self, script: List[str]):
         """Añadir pie del script"""
-        self.migration_script.extend([
+        script.extend([
             "",
             "-- ========================================",
             "-- FIN DE LA MIGRACIÓN",
@@ -117,65 +303,166 @@ class MigrationGenerator:
     
     def _migrate_extensions(self, extensions_diff: Dict[str, List]):
         """Migrar extensiones"""
-        if extensions_diff.get('added'):
-            self.migration_script.append("-- EXTENSIONES")
-            for ext in extensions_diff['added']:
-                self.migration_script.append(f"CREATE EXTENSION IF NOT EXISTS {ext['extname']};")
-            self.migration_script.append("")
+        for ext in extensions_diff.get('added', []):
+            self._add_statement("EXTENSIONES", 'create_extension', [f"CREATE EXTENSION IF NOT EXISTS {ext['extname']};"])
     
     def _migrate_types(self, types_diff: Dict[str, List]):
         """Migrar tipos personalizados"""
-        if types_diff.get('added'):
-            self.migration_script.append("-- TIPOS PERSONALIZADOS")
-            for type_obj in types_diff['added']:
-                self.migration_script.append(f"-- Tipo: {type_obj['type_name']}")
-                # Nota: Los tipos personalizados requieren definición completa
-                self.migration_script.append(f"-- Definición: {type_obj['type_definition']}")
-                self.migration_script.append("-- [REQUIERE DEFINICIÓN MANUAL]")
-            self.migration_script.append("")
+        for type_obj in types_diff.get('added', []):
+            # Nota: Los tipos personalizados requieren definición completa
+            self._add_statement("TIPOS PERSONALIZADOS", 'create_type', [
+                f"-- Tipo: {type_obj['type_name']}",
+                f"-- Definición: {type_obj['type_definition']}",
+                "-- [REQUIERE DEFINICIÓN MANUAL]"
+            ])
     
     def _migrate_sequences(self, sequences_diff: Dict[str, List]):
         """Migrar secuencias"""
-        if sequences_diff.get('added'):
-            self.migration_script.append("-- SECUENCIAS")
-            for seq in sequences_diff['added']:
-                self.migration_script.append(f"CREATE SEQUENCE IF NOT EXISTS {seq['sequence_schema']}.{seq['sequence_name']};")
-            self.migration_script.append("")
+        for seq in sequences_diff.get('added', []):
+            self._add_statement("SECUENCIAS", 'create_sequence',
+                                [f"CREATE SEQUENCE IF NOT EXISTS {seq['sequence_schema']}.{seq['sequence_name']};"])
     
-    def _migrate_tables(self, tables_diff: Dict[str, List]):
-        """Migrar tablas"""
-        if tables_diff.get('added'):
-            self.migration_script.append("-- TABLAS")
-            for table in tables_diff['added']:
-                self.migration_script.append(f"CREATE TABLE IF NOT EXISTS {table['schemaname']}.{table['tablename']} ();")
-                self.migration_script.append(f"COMMENT ON TABLE {table['schemaname']}.{table['tablename']} IS 'Tabla creada por migración automática';")
-            self.migration_script.append("")
+    def _migrate_tables(self, tables_diff: Dict[str, List], columns_diff: Dict[str, List],
+                        constraints_diff: Dict[str, List]):
+        """Migrar tablas: cada tabla nueva en un solo CREATE TABLE con sus
+        columnas y sus PRIMARY KEY, UNIQUE y CHECK. Sus claves foráneas (la
+        tabla referenciada puede crearse después) y sus índices se añaden con
+        el resto; _migrate_columns, _migrate_constraints y _migrate_indexes
+        omiten lo que ya crea el CREATE TABLE (self.created_tables y
+        self.inline_indexes)."""
+        added = tables_diff.get('added', [])
+        self.created_tables = {f"{table['schemaname']}.{table['tablename']}" for table in added}
+        
+        columns_by_table = {}
+        for col in columns_diff.get('added', []):
+            columns_by_table.setdefault(f"{col['table_schema']}.{col['table_name']}", []).append(col)
+        constraints_by_table = {}
+        for constraint in constraints_diff.get('added', []):
+            if constraint['constraint_type'] in ('PRIMARY KEY', 'UNIQUE', 'CHECK'):
+                constraints_by_table.setdefault(f"{constraint['table_schema']}.{constraint['table_name']}", []).append(constraint)
+        
+        for table in added:
+            table_key = f"{table['schemaname']}.{table['tablename']}"
+            elements = [f"{col['column_name']} {self._build_column_definition(col)}"
+                        for col in sorted(columns_by_table.get(table_key, []),
+                                          key=lambda col: col.get('ordinal_position') or 0)]
+            for constraint in constraints_by_table.get(table_key, []):
+                definition = self._constraint_definition(constraint)
+                if definition:
+                    elements.append(f"CONSTRAINT {self._constraint_name(constraint)} {definition}")
+                    if constraint['constraint_type'] != 'CHECK':
+                        # Su índice lo crea la propia restricción
+                        self.inline_indexes.add((constraint['table_schema'], constraint['constraint_name']))
+            
+            create = [f"CREATE TABLE IF NOT EXISTS {table_key} ("]
+            create.extend(f"    {element}{',' if i < len(elements) - 1 else ''}" for i, element in enumerate(elements))
+            create.append(");")
+            self._add_statement("TABLAS", 'create_table', [
+                *create,
+                f"COMMENT ON TABLE {table_key} IS 'Tabla creada por migración automática';"
+            ], table=table_key, spaced=True)
     
     def _migrate_columns(self, columns_diff: Dict[str, List]):
         """Migrar columnas"""
         if columns_diff.get('added'):
-            self.migration_script.append("-- COLUMNAS")
-            
             # Agrupar columnas por tabla
             columns_by_table = {}
             for col in columns_diff['added']:
                 table_key = f"{col['table_schema']}.{col['table_name']}"
+                if table_key in self.created_tables:
+                    continue
                 if table_key not in columns_by_table:
                     columns_by_table[table_key] = []
                 columns_by_table[table_key].append(col)
             
             for table_key, columns in columns_by_table.items():
-                self.migration_script.append(f"-- Columnas para {table_key}")
+                comments = [f"-- Columnas para {table_key}"]
                 for col in columns:
-                    col_def = self._build_column_definition(col)
-                    self.migration_script.append(f"ALTER TABLE {table_key} ADD COLUMN IF NOT EXISTS {col['column_name']} {col_def};")
-                self.migration_script.append("")
+                    clause = f"ADD COLUMN IF NOT EXISTS {col['column_name']} {self._build_column_definition(col)}"
+                    self._add_statement("COLUMNAS", 'add_column', [f"ALTER TABLE {table_key} {clause};"],
+                                        table=table_key, comments=comments, object=col, clause=(clause, None))
+                    comments = None
+        
+        # Columnas que pasan a NOT NULL
+        for change in columns_diff.get('modified', []):
+            col = change['local']
+            if col.get('is_nullable') == 'NO' and change['production'].get('is_nullable') == 'YES':
+                self._add_not_null_statement(col)
+    
+    def _add_not_null_statement(self, col: Dict[str, Any]):
+        """Registrar un SET NOT NULL. Su alternativa en dos fases es un CHECK
+        (columna IS NOT NULL) NOT VALID que, una vez validado, permite a SET
+        NOT NULL no recorrer la tabla (PostgreSQL 12+); después se elimina."""
+        table_key = f"{col['table_schema']}.{col['table_name']}"
+        check_name = not_null_check_name(col['table_name'], col['column_name'])
+        clause = f"ALTER COLUMN {col['column_name']} SET NOT NULL"
+        set_not_null = f"ALTER TABLE {table_key} {clause};"
+        check = f"CHECK ({col['column_name']} IS NOT NULL) NOT VALID"
+        self._add_statement("COLUMNAS", 'set_not_null', [set_not_null], table=table_key, object=col,
+                            clause=(clause, None),
+                            not_valid_sql=self._constraint_block(col, check_name, check),
+                            not_valid_clause=(f"ADD CONSTRAINT {check_name} {check}", check_name),
+                            validate_sql=[f"ALTER TABLE {table_key} VALIDATE CONSTRAINT {check_name};"],
+                            finish_sql=[
+                                set_not_null,
+                                f"ALTER TABLE {table_key} DROP CONSTRAINT IF EXISTS {check_name};"
+                            ])
+    
+    def _constraint_block(self, table: Dict[str, Any], constraint_name: str, definition: str) -> List[str]:
+        """ADD CONSTRAINT que solo se aplica si la restricción no existe"""
+        quoted_name = f'"{constraint_name}"' if constraint_name[0].isdigit() else constraint_name
+        return [
+            f"DO $$",
+            f"BEGIN",
+            f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint_name}' AND table_name = '{table['table_name']}' AND table_schema = '{table['table_schema']}') THEN",
+            f"        ALTER TABLE {table['table_schema']}.{table['table_name']} ADD CONSTRAINT {quoted_name} {definition};",
+            f"    END IF;",
+            f"END $$;"
+        ]
+    
+    def _add_constraint_statement(self, action: str, constraint: Dict[str, Any], definition: str):
+        """Registrar un ADD CONSTRAINT. Las claves foráneas y los CHECK admiten
+        dos fases: ADD CONSTRAINT ... NOT VALID y después VALIDATE CONSTRAINT."""
+        constraint_name = self._constraint_name(constraint)
+        table_key = f"{constraint['table_schema']}.{constraint['table_name']}"
+        foreign_table = (f"{constraint['foreign_table_schema']}.{constraint['foreign_table_name']}"
+                         if action == 'add_foreign_key' else None)
+        two_phase = {}
+        if action in ('add_foreign_key', 'add_check'):
+            two_phase = dict(
+                not_valid_sql=self._constraint_block(constraint, constraint['constraint_name'], f"{definition} NOT VALID"),
+                not_valid_clause=(f"ADD CONSTRAINT {constraint_name} {definition} NOT VALID", constraint['constraint_name']),
+                validate_sql=[f"ALTER TABLE {table_key} VALIDATE CONSTRAINT {constraint_name};"])
+        self._add_statement("RESTRICCIONES", action, self._constraint_block(constraint, constraint['constraint_name'], definition),
+                            table=table_key, foreign_table=foreign_table, object=constraint,
+                            clause=(f"ADD CONSTRAINT {constraint_name} {definition}", constraint['constraint_name']),
+                            **two_phase)
+    
+    def _constraint_name(self, constraint: Dict[str, Any]) -> str:
+        """Nombre de la restricción, entre comillas si empieza por un dígito"""
+        return f'"{constraint["constraint_name"]}"' if constraint['constraint_name'][0].isdigit() else constraint['constraint_name']
+    
+    def _constraint_definition(self, constraint: Dict[str, Any]) -> Optional[str]:
+        """Definición de una restricción para ADD CONSTRAINT o CREATE TABLE
+        (None para los CHECK sin condición válida y otros tipos)"""
+        if constraint['constraint_type'] in ('PRIMARY KEY', 'UNIQUE', 'CHECK', 'FOREIGN KEY') and constraint.get('definition'):
+            # pg_get_constraintdef conserva ON DELETE/ON UPDATE, MATCH, INCLUDE,
+            # DEFERRABLE...; NOT VALID lo decide esta migración
+            return re.sub(r'\s+NOT VALID$', '', constraint['definition'].strip())
+        if constraint['constraint_type'] == 'PRIMARY KEY':
+            return f"PRIMARY KEY ({constraint['column_name']})"
+        if constraint['constraint_type'] == 'UNIQUE':
+            return f"UNIQUE ({constraint['column_name']})"
+        if constraint['constraint_type'] == 'CHECK':
+            return f"CHECK ({constraint['check_clause']})" if constraint.get('check_clause') else None
+        if constraint['constraint_type'] == 'FOREIGN KEY':
+            return f"FOREIGN KEY ({constraint['column_name']}) REFERENCES {constraint['foreign_table_schema']}.{constraint['foreign_table_name']}({constraint['foreign_column_name']})"
+        return None
     
     def _migrate_constraints(self, constraints_diff: Dict[str, List]):
-        """Migrar restricciones"""
+        """Migrar restricciones (las de las tablas nuevas, salvo las claves
+        foráneas, ya van en su CREATE TABLE)"""
         if constraints_diff.get('added'):
-            self.migration_script.append("-- RESTRICCIONES")
-            
             # Agrupar por tipo de restricción
             pk_constraints = []
             fk_constraints = []
@@ -183,6 +470,9 @@ class MigrationGenerator:
             check_constraints = []
             
             for constraint in constraints_diff['added']:
+                if (constraint['constraint_type'] != 'FOREIGN KEY' and
+                        f"{constraint['table_schema']}.{constraint['table_name']}" in self.created_tables):
+                    continue
                 if constraint['constraint_type'] == 'PRIMARY KEY':
                     pk_constraints.append(constraint)
                 elif constraint['constraint_type'] == 'FOREIGN KEY':
@@ -194,104 +484,83 @@ class MigrationGenerator:
             
             # Claves primarias
             for constraint in pk_constraints:
-                constraint_name = f'"{constraint["constraint_name"]}"' if constraint['constraint_name'][0].isdigit() else constraint['constraint_name']
-                self.migration_script.append(f"DO $$")
-                self.migration_script.append(f"BEGIN")
-                self.migration_script.append(f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint['constraint_name']}' AND table_name = '{constraint['table_name']}' AND table_schema = '{constraint['table_schema']}') THEN")
-                self.migration_script.append(f"        ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint_name} PRIMARY KEY ({constraint['column_name']});")
-                self.migration_script.append(f"    END IF;")
-                self.migration_script.append(f"END $$;")
-            
-            # Claves foráneas
-            for constraint in fk_constraints:
-                constraint_name = f'"{constraint["constraint_name"]}"' if constraint['constraint_name'][0].isdigit() else constraint['constraint_name']
-                self.migration_script.append(f"DO $$")
-                self.migration_script.append(f"BEGIN")
-                self.migration_script.append(f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint['constraint_name']}' AND table_name = '{constraint['table_name']}' AND table_schema = '{constraint['table_schema']}') THEN")
-                self.migration_script.append(f"        ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint_name} FOREIGN KEY ({constraint['column_name']}) REFERENCES {constraint['foreign_table_schema']}.{constraint['foreign_table_name']}({constraint['foreign_column_name']});")
-                self.migration_script.append(f"    END IF;")
-                self.migration_script.append(f"END $$;")
+                self._add_constraint_statement('add_primary_key', constraint, self._constraint_definition(constraint))
             
             # Restricciones únicas
             for constraint in unique_constraints:
-                constraint_name = f'"{constraint["constraint_name"]}"' if constraint['constraint_name'][0].isdigit() else constraint['constraint_name']
-                self.migration_script.append(f"DO $$")
-                self.migration_script.append(f"BEGIN")
-                self.migration_script.append(f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint['constraint_name']}' AND table_name = '{constraint['table_name']}' AND table_schema = '{constraint['table_schema']}') THEN")
-                self.migration_script.append(f"        ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint_name} UNIQUE ({constraint['column_name']});")
-                self.migration_script.append(f"    END IF;")
-                self.migration_script.append(f"END $$;")
+                self._add_constraint_statement('add_unique', constraint, self._constraint_definition(constraint))
             
             # Restricciones de verificación
             for constraint in check_constraints:
-                constraint_name = f'"{constraint["constraint_name"]}"' if constraint['constraint_name'][0].isdigit() else constraint['constraint_name']
                 # Saltar restricciones CCHECK sin definición válida
-                if constraint.get('check_clause'):
-                    self.migration_script.append(f"DO $$")
-                    self.migration_script.append(f"BEGIN")
-                    self.migration_script.append(f"    IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = '{constraint['constraint_name']}' AND table_name = '{constraint['table_name']}' AND table_schema = '{constraint['table_schema']}') THEN")
-                    self.migration_script.append(f"        ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint_name} CHECK ({constraint['check_clause']});")
-                    self.migration_script.append(f"    END IF;")
-                    self.migration_script.append(f"END $$;")
+                if self._constraint_definition(constraint):
+                    self._add_constraint_statement('add_check', constraint, self._constraint_definition(constraint))
                 else:
-                    self.migration_script.append(f"-- SKIP: Constraint CHECK {constraint_name} sin condición válida")
+                    self._add_statement("RESTRICCIONES", 'skip',
+                                        [f"-- SKIP: Constraint CHECK {self._constraint_name(constraint)} sin condición válida"])
             
-            self.migration_script.append("")
+            # Claves foráneas, al final: pueden referenciar claves únicas de
+            # esta misma migración
+            for constraint in fk_constraints:
+                self._add_constraint_statement('add_foreign_key', constraint, self._constraint_definition(constraint))
     
     def _migrate_indexes(self, indexes_diff: Dict[str, List]):
         """Migrar índices"""
-        if indexes_diff.get('added'):
-            self.migration_script.append("-- ÍNDICES")
-            for index in indexes_diff['added']:
-                index_name = f'"{index["indexname"]}"' if index['indexname'][0].isdigit() else index['indexname']
-                
-                self.migration_script.append(f"DO $$")
-                self.migration_script.append(f"BEGIN")
-                self.migration_script.append(f"    IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = '{index['indexname']}' AND schemaname = '{index['schemaname']}') THEN")
-                self.migration_script.append(f"        {index['indexdef']};")
-                self.migration_script.append(f"    END IF;")
-                self.migration_script.append(f"END $$;")
-            self.migration_script.append("")
+        for index in indexes_diff.get('added', []):
+            if (index['schemaname'], index['indexname']) in self.inline_indexes:
+                continue
+            self._add_statement("ÍNDICES", 'create_index', [
+                f"DO $$",
+                f"BEGIN",
+                f"    IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = '{index['indexname']}' AND schemaname = '{index['schemaname']}') THEN",
+                f"        {index['indexdef']};",
+                f"    END IF;",
+                f"END $$;"
+            ], table=f"{index['schemaname']}.{index['tablename']}", object=index,
+               concurrent_sql=f"{concurrent_index_definition(index['indexdef'])};")
     
     def _migrate_functions(self, functions_diff: Dict[str, List]):
         """Migrar funciones"""
         if functions_diff.get('added'):
-            self.migration_script.append("-- FUNCIONES")
+            # Cargar en lote las definiciones diferidas de las funciones nuevas
+            load_lazy_values(functions_diff['added'], LAZY_FIELDS['functions'])
             for func in functions_diff['added']:
-                self.migration_script.append(f"-- Función: {func['function_name']}")
                 # Usar CREATE OR REPLACE para funciones
                 func_def = func['definition'].replace('CREATE FUNCTION', 'CREATE OR REPLACE FUNCTION')
-                self.migration_script.append(f"{func_def};")
-                self.migration_script.append("")
+                self._add_statement("FUNCIONES", 'create_function', [f"{func_def};"],
+                                    comments=[f"-- Función: {func['function_name']}"], spaced=True,
+                                    definition=func['definition'], relation=func['function_name'])
     
     def _migrate_triggers(self, triggers_diff: Dict[str, List]):
         """Migrar triggers"""
-        if triggers_diff.get('added'):
-            self.migration_script.append("-- TRIGGERS")
-            for trigger in triggers_diff['added']:
-                self.migration_script.append(f"-- Trigger: {trigger['trigger_name']}")
-                self.migration_script.append(f"CREATE TRIGGER {trigger['trigger_name']}")
-                self.migration_script.append(f"    {trigger['action_timing']} {trigger['event_manipulation']}")
-                self.migration_script.append(f"    ON {trigger['event_object_table']}")
-                self.migration_script.append(f"    FOR EACH {trigger['action_orientation']}")
-                self.migration_script.append(f"    {trigger['action_statement']};")
-                self.migration_script.append("")
+        for trigger in triggers_diff.get('added', []):
+            self._add_statement("TRIGGERS", 'create_trigger', [
+                f"CREATE TRIGGER {trigger['trigger_name']}",
+                f"    {trigger['action_timing']} {trigger['event_manipulation']}",
+                f"    ON {trigger['event_object_table']}",
+                f"    FOR EACH {trigger['action_orientation']}",
+                f"    {trigger['action_statement']};"
+            ], table=f"{trigger['trigger_schema']}.{trigger['event_object_table']}",
+               comments=[f"-- Trigger: {trigger['trigger_name']}"], spaced=True,
+               definition=trigger['action_statement'])
     
     def _migrate_views(self, views_diff: Dict[str, List]):
         """Migrar vistas"""
-        if views_diff.get('added'):
-            self.migration_script.append("-- VISTAS")
-            for view in views_diff['added']:
-                self.migration_script.append(f"-- Vista: {view['table_name']}")
-                self.migration_script.append(f"CREATE OR REPLACE VIEW {view['table_schema']}.{view['table_name']} AS {view['view_definition']};")
-                self.migration_script.append("")
+        for view in views_diff.get('added', []):
+            self._add_statement("VISTAS", 'create_view', [
+                f"CREATE OR REPLACE VIEW {view['table_schema']}.{view['table_name']} AS {view['view_definition']};"
+            ], comments=[f"-- Vista: {view['table_name']}"], spaced=True, definition=view['view_definition'],
+               relation=view['table_name'])
     
     def _build_column_definition(self, col: Dict[str, Any]) -> str:
         """Construir definición de columna"""
         col_def = col['data_type']
         
+        # format_type da el tipo real de los arrays y tipos de usuario
+        if col.get('formatted_type'):
+            col_def = col['formatted_type']
         # Solo agregar precisión/escala para tipos específicos
-        if col['data_type'] in ['character varying', 'varchar', 'char'] and col.get('character_maximum_length'):
+        elif col['data_type'] in ['character varying', 'varchar', 'char'] and col.get('character_maximum_length'):
             col_def += f"({col['character_maximum_length']})"
         elif col['data_type'] in ['numeric', 'decimal'] and col.get('numeric_precision'):
             if col.get('numeric_scale'):
@@ -309,9 +578,9 @@ class MigrationGenerator:
         
         return col_def
     
-    def save_migration_script(self, script_content: str):
+    def save_migration_script(self, script_content: str, filename: str = MIGRATION_SCRIPT_FILE):
         """Guardar script de migración"""
-        filepath = f"{OUTPUT_DIR}/{MIGRATION_SCRIPT_FILE}"
+        filepath = f"{OUTPUT_DIR}/{filename}"
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(script_content)
         logger.info(f"Script de migración guardado en {filepath}")
@@ -361,6 +630,16 @@ class MigrationGenerator:
                 rollback_script.append(f"ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} DROP CONSTRAINT IF EXISTS {constraint['constraint_name']};")
             rollback_script.append("")
         
+        not_null_columns = [change['local'] for change in differences.get('columns', {}).get('modified', [])
+                            if change['local'].get('is_nullable') == 'NO' and change['production'].get('is_nullable') == 'YES']
+        if not_null_columns:
+            rollback_script.append("-- RESTAURAR COLUMNAS NULABLES")
+            for col in not_null_columns:
+                table_key = f"{col['table_schema']}.{col['table_name']}"
+                rollback_script.append(f"ALTER TABLE {table_key} DROP CONSTRAINT IF EXISTS {not_null_check_name(col['table_name'], col['column_name'])};")
+                rollback_script.append(f"ALTER TABLE {table_key} ALTER COLUMN {col['column_name']} DROP NOT NULL;")
+            rollback_script.append("")
+        
         if differences.get('columns', {}).get('added'):
             rollback_script.append("-- ELIMINAR COLUMNAS")
             columns_by_table = {}
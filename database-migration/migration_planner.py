@@ -0,0 +1,484 @@
+"""
+Planificador de migraciones según los bloqueos de cada sentencia
+"""
+import re
+import logging
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from tabulate import tabulate
+from config import (MIGRATION_HOT_TABLES, MIGRATION_ONLINE_MAX_SECONDS, MIGRATION_HOT_ONLINE_MAX_SECONDS,
+                    MIGRATION_SCAN_BYTES_PER_SECOND, MIGRATION_INDEX_BYTES_PER_SECOND,
+                    MIGRATION_REWRITE_BYTES_PER_SECOND, MIGRATION_TWO_PHASE_CONSTRAINTS)
+
+logger = logging.getLogger(__name__)
+
+# Fases del plan: las sentencias en línea se ejecutan con migrate, seguidas
+# de los índices sobre tablas grandes, que se construyen con CONCURRENTLY
+# fuera de la transacción, y de la validación de las restricciones añadidas
+# con NOT VALID; las que bloquean una tabla durante un tiempo
+# proporcional a su tamaño esperan a una ventana de mantenimiento
+# (migrate --maintenance)
+PHASE_ONLINE = 'online'
+PHASE_CONCURRENT = 'concurrent'
+PHASE_VALIDATE = 'validate'
+PHASE_MAINTENANCE = 'maintenance'
+
+PHASE_LABELS = {
+    PHASE_ONLINE: 'En línea',
+    PHASE_CONCURRENT: 'Índices concurrentes',
+    PHASE_VALIDATE: 'Validación de restricciones',
+    PHASE_MAINTENANCE: 'Ventana de mantenimiento'
+}
+
+# Fases que no bloquean las escrituras (se estima su duración, no la del bloqueo)
+NON_BLOCKING_PHASES = (PHASE_CONCURRENT, PHASE_VALIDATE)
+
+# Fases que se ejecutan en una transacción, donde se combinan los ALTER TABLE
+TRANSACTIONAL_PHASES = (PHASE_ONLINE, PHASE_MAINTENANCE)
+
+# Bloqueo que toma cada acción sobre la tabla afectada y trabajo que hace
+# mientras lo mantiene:
+# - none: no bloquea tablas existentes (objetos nuevos, funciones)
+# - metadata: solo cambia el catálogo; el bloqueo es breve
+# - not_valid: añade la restricción sin comprobar las filas existentes
+# - scan: lee la tabla completa para validar
+# - index: lee la tabla y ordena para construir un índice
+# - rewrite: reescribe la tabla y sus índices
+# - concurrent_index: construye un índice sin bloquear escrituras
+# - validate: valida una restricción NOT VALID sin bloquear escrituras
+ACTION_LOCKS = {
+    'create_extension': (None, 'none'),
+    'create_type': (None, 'none'),
+    'create_sequence': (None, 'none'),
+    'create_table': (None, 'none'),
+    'create_function': (None, 'none'),
+    'create_view': (None, 'none'),
+    'add_column': ('ACCESS EXCLUSIVE', 'metadata'),
+    'add_primary_key': ('ACCESS EXCLUSIVE', 'index'),
+    'add_unique': ('ACCESS EXCLUSIVE', 'index'),
+    'add_foreign_key': ('SHARE ROW EXCLUSIVE', 'scan'),
+    'add_check': ('ACCESS EXCLUSIVE', 'scan'),
+    'set_not_null': ('ACCESS EXCLUSIVE', 'scan'),
+    'create_index': ('SHARE', 'index'),
+    'create_trigger': ('SHARE ROW EXCLUSIVE', 'metadata')
+}
+
+# CREATE INDEX CONCURRENTLY: solo impide otros DDL y VACUUM sobre la tabla
+CONCURRENT_INDEX_LOCK = ('SHARE UPDATE EXCLUSIVE', 'concurrent_index')
+
+# VALIDATE CONSTRAINT: lee la tabla completa, pero sin impedir escrituras
+VALIDATE_CONSTRAINT_LOCK = ('SHARE UPDATE EXCLUSIVE', 'validate')
+
+# SET NOT NULL tras validar el CHECK (columna IS NOT NULL): no recorre la
+# tabla, pero toma ACCESS EXCLUSIVE (al igual que eliminar el CHECK)
+PROVEN_NOT_NULL_LOCK = ('ACCESS EXCLUSIVE', 'metadata')
+
+# Trabajos que no leen la tabla: el bloqueo dura lo que el cambio de catálogo
+CATALOG_WORK = ('none', 'metadata', 'not_valid')
+
+# Niveles de bloqueo de menor a mayor: un ALTER TABLE combinado toma el mayor
+LOCK_ORDER = ['SHARE UPDATE EXCLUSIVE', 'SHARE', 'SHARE ROW EXCLUSIVE', 'ACCESS EXCLUSIVE']
+
+# Trabajo de un ALTER TABLE combinado, del que más pesa al que menos
+WORK_ORDER = ['rewrite', 'index', 'scan', 'not_valid', 'metadata', 'none']
+
+# Qué impide cada nivel de bloqueo mientras se mantiene
+LOCK_EFFECTS = {
+    'ACCESS EXCLUSIVE': 'bloquea lecturas y escrituras',
+    'SHARE ROW EXCLUSIVE': 'bloquea escrituras',
+    'SHARE': 'bloquea escrituras',
+    'SHARE UPDATE EXCLUSIVE': 'no bloquea lecturas ni escrituras'
+}
+
+WORK_RATES = {
+    'scan': MIGRATION_SCAN_BYTES_PER_SECOND,
+    'index': MIGRATION_INDEX_BYTES_PER_SECOND,
+    'rewrite': MIGRATION_REWRITE_BYTES_PER_SECOND,
+    # Dos pasadas sobre la tabla, más la espera a las transacciones abiertas
+    'concurrent_index': MIGRATION_INDEX_BYTES_PER_SECOND / 2,
+    'validate': MIGRATION_SCAN_BYTES_PER_SECOND
+}
+
+WORK_LABELS = {
+    'none': 'sin bloqueo',
+    'metadata': 'solo catálogo',
+    'not_valid': 'solo catálogo (NOT VALID)',
+    'scan': 'validación completa',
+    'index': 'construcción de índice',
+    'rewrite': 'reescritura de la tabla',
+    'concurrent_index': 'construcción concurrente de índice',
+    'validate': 'validación concurrente'
+}
+
+# Un DEFAULT volátil obliga a reescribir la tabla al añadir la columna (los
+# no volátiles se guardan en el catálogo desde PostgreSQL 11)
+VOLATILE_DEFAULT = re.compile(
+    r'\b(nextval|random|clock_timestamp|timeofday|gen_random_uuid|uuid_generate_v[14])\s*\(', re.IGNORECASE)
+
+# Columnas (o expresiones) de la definición de un índice de pg_indexes
+INDEX_COLUMNS = re.compile(r'\sUSING\s+\w+\s+\((?P<columns>.*)\)')
+
+# Tamaño de página de PostgreSQL, para pasar relpages a bytes
+BLOCK_SIZE = 8192
+
+def _constraint_columns(obj: Dict[str, Any], list_field: str, text_field: str) -> set:
+    """Columnas de una restricción: la lista del catálogo o, si no está, el
+    texto separado por comas (consultas de information_schema, volcados)"""
+    columns = obj.get(list_field)
+    if columns:
+        return set(columns)
+    return {column.strip() for column in (obj.get(text_field) or '').split(',') if column.strip()}
+
+def _format_rows(rows: Optional[float]) -> str:
+    """Número de filas abreviado"""
+    if rows is None:
+        return "?"
+    if rows >= 1_000_000:
+        return f"{rows / 1_000_000:.1f}M"
+    if rows >= 1_000:
+        return f"{rows / 1_000:.1f}k"
+    return f"{rows:.0f}"
+
+def _format_size(size: Optional[int]) -> str:
+    """Tamaño en bytes legible"""
+    if size is None:
+        return "?"
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    """Duración estimada legible"""
+    if seconds is None:
+        return "?"
+    if seconds < 1:
+        return "< 1 s"
+    if seconds < 120:
+        return f"~{seconds:.0f} s"
+    return f"~{seconds / 60:.0f} min"
+
+class MigrationPlanner:
+    """Clasifica las sentencias de una migración por el bloqueo que toman y
+    estima su duración a partir del tamaño de las tablas de producción
+    (ver TABLE_STATS_FIELDS), para separar las que pueden ejecutarse en
+    línea de las que necesitan una ventana de mantenimiento. Los índices que
+    bloquearían demasiado se construyen con CONCURRENTLY y, con
+    two_phase_constraints, las restricciones se añaden con NOT VALID y se
+    validan aparte."""
+    
+    def __init__(self, hot_tables=MIGRATION_HOT_TABLES, online_max_seconds: float = MIGRATION_ONLINE_MAX_SECONDS,
+                 hot_online_max_seconds: float = MIGRATION_HOT_ONLINE_MAX_SECONDS,
+                 two_phase_constraints: bool = MIGRATION_TWO_PHASE_CONSTRAINTS):
+        self.hot_tables = set(hot_tables)
+        self.online_max_seconds = online_max_seconds
+        self.hot_online_max_seconds = hot_online_max_seconds
+        self.two_phase_constraints = two_phase_constraints
+        self.statements = []
+        self.coalesced = 0
+    
+    def plan(self, statements: List[Dict[str, Any]],
+             table_stats: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Añadir a cada sentencia (en el orden de la migración) su bloqueo,
+        su estimación y su fase. table_stats son las tablas de producción
+        extraídas con sus estadísticas (None si no se conocen, p. ej. con un
+        volcado). Retorna las sentencias planificadas, que incluyen las de
+        validación de las restricciones divididas en dos fases."""
+        stats = {f"{table['schemaname']}.{table['tablename']}": table for table in table_stats or []}
+        new_tables = {statement['table'] for statement in statements if statement['action'] == 'create_table'}
+        # Lo que crean las sentencias diferidas: columnas y claves (PRIMARY
+        # KEY/UNIQUE) por tabla, vistas y funciones, y las tablas afectadas
+        deferred = {'columns': {}, 'keys': {}, 'relations': set(), 'tables': set()}
+        planned = []
+        
+        for statement in statements:
+            planned.append(statement)
+            lock, work = ACTION_LOCKS.get(statement['action'], (None, 'none'))
+            if statement['action'] == 'add_column' and VOLATILE_DEFAULT.search(
+                    str(statement['object'].get('column_default') or '')):
+                work = 'rewrite'
+            
+            table = statement.get('table')
+            rows, size = self._table_size(table, stats, new_tables, table_stats is not None)
+            estimate = self._estimate(work, size)
+            # Las tablas que crea la migración todavía no las usa nadie
+            if table is None or table in new_tables:
+                lock = None
+            statement.update(lock=lock, work=work, rows=rows, size=size, estimate=estimate)
+            
+            # Lo que usa un objeto creado por una sentencia diferida también se
+            # difiere; el resto de cambios sobre la misma tabla no
+            if self._depends_on(statement, deferred):
+                statement['phase'] = PHASE_MAINTENANCE
+                self._defer(statement, deferred)
+            elif self._needs_maintenance(statement):
+                if statement['action'] == 'create_index':
+                    # Un índice no se necesita dentro de la transacción: se
+                    # construye después sin bloquear las escrituras
+                    lock, work = CONCURRENT_INDEX_LOCK
+                    statement.update(sql=[statement['concurrent_sql']], lock=lock, work=work,
+                                     estimate=self._estimate(work, size), phase=PHASE_CONCURRENT)
+                elif self.two_phase_constraints and statement.get('validate_sql'):
+                    # NOT VALID solo toca el catálogo y ya se aplica a las
+                    # filas nuevas; las existentes se validan después
+                    planned.extend(self._split_validation(statement))
+                else:
+                    statement['phase'] = PHASE_MAINTENANCE
+                    self._defer(statement, deferred)
+            else:
+                statement['phase'] = PHASE_ONLINE
+        
+        self.statements = planned
+        counts = {phase: len(self.get_phase(phase)) for phase in PHASE_LABELS}
+        logger.info(f"Plan de migración: {counts[PHASE_ONLINE]} sentencias en línea, "
+                    f"{counts[PHASE_VALIDATE]} validaciones aparte, "
+                    f"{counts[PHASE_MAINTENANCE]} para la ventana de mantenimiento")
+        return planned
+    
+    def _split_validation(self, statement: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Dejar en línea la sentencia con NOT VALID (not_valid_sql) y retornar
+        la de su validación (validate_sql), que toma SHARE UPDATE EXCLUSIVE,
+        seguida de la de finish_sql si la hay (SET NOT NULL), con su propio
+        bloqueo"""
+        lock, work = VALIDATE_CONSTRAINT_LOCK
+        validation = dict(statement, action='validate_constraint', sql=statement['validate_sql'], comments=[], clause=None,
+                          spaced=False, lock=lock, work=work, estimate=self._estimate(work, statement['size']),
+                          phase=PHASE_VALIDATE)
+        split = [validation]
+        if statement.get('finish_sql'):
+            lock, work = PROVEN_NOT_NULL_LOCK
+            split.append(dict(validation, action=statement['action'], sql=statement['finish_sql'], lock=lock,
+                              work=work, estimate=self._estimate(work, statement['size'])))
+        statement.update(sql=statement['not_valid_sql'], clause=statement.get('not_valid_clause'), work='not_valid',
+                         estimate=0.0, phase=PHASE_ONLINE)
+        return split
+    
+    def coalesce(self, render: Callable[[str, List[Tuple[str, Optional[str]]]], List[str]]) -> List[Dict[str, Any]]:
+        """Combinar en un solo ALTER TABLE las sentencias planificadas de una
+        misma tabla y fase transaccional que tienen clause (subcomando y
+        restricción cuya existencia lo condiciona, ver MigrationGenerator):
+        una para columnas, NOT NULL, PRIMARY KEY, UNIQUE y CHECK, y otra para
+        las claves foráneas. Cada combinada ocupa el lugar de la primera de
+        sus sentencias; como las claves foráneas se registran después del
+        resto, encuentran creadas las columnas y restricciones que usan. En la
+        fase en línea el grupo se parte para que ninguna combinada bloquee la
+        tabla más tiempo del permitido (ver _needs_maintenance).
+        render(tabla, cláusulas) construye el SQL de la sentencia combinada."""
+        groups = {}
+        for statement in self.statements:
+            if statement.get('clause') and statement['phase'] in TRANSACTIONAL_PHASES:
+                key = (statement['phase'], statement['table'], statement['action'] == 'add_foreign_key')
+                groups.setdefault(key, []).append(statement)
+        
+        # Cada sentencia apunta al grupo (ya partido) con el que se combina
+        chunk_of = {}
+        for (phase, _, _), group in groups.items():
+            for chunk in (self._split_by_budget(group) if phase == PHASE_ONLINE else [group]):
+                if len(chunk) > 1:
+                    chunk_of.update((id(member), chunk) for member in chunk)
+        
+        coalesced = []
+        merged = 0
+        for statement in self.statements:
+            chunk = chunk_of.get(id(statement))
+            if chunk is None:
+                coalesced.append(statement)
+            elif statement is chunk[0]:
+                coalesced.append(self._combine(chunk, render(statement['table'],
+                                                              [member['clause'] for member in chunk])))
+                merged += 1
+        
+        self.coalesced = len(self.statements) - len(coalesced)
+        self.statements = coalesced
+        if self.coalesced:
+            logger.info(f"ALTER TABLE combinados: {self.coalesced + merged} sentencias en {merged}")
+        return coalesced
+    
+    def _split_by_budget(self, group: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Partir un grupo de sentencias en línea, en su orden, en tramos cuya
+        combinación no supera el tiempo de bloqueo permitido en la tabla"""
+        chunks = [[group[0]]]
+        for statement in group[1:]:
+            candidate = chunks[-1] + [statement]
+            if self._needs_maintenance(self._combine(candidate, [])):
+                chunks.append([statement])
+            else:
+                chunks[-1] = candidate
+        return chunks
+    
+    def _combine(self, group: List[Dict[str, Any]], sql: List[str]) -> Dict[str, Any]:
+        """Sentencia combinada: el mayor bloqueo y trabajo del grupo. PostgreSQL
+        comprueba los CHECK y reescribe la tabla en una sola pasada; los
+        índices y las claves foráneas se construyen y validan cada uno aparte."""
+        first = group[0]
+        locks = [member['lock'] for member in group if member['lock'] is not None]
+        estimates = [member['estimate'] for member in group]
+        if None in estimates:
+            estimate = None
+        else:
+            separate = [member['estimate'] for member in group
+                        if member['work'] == 'index' or member['action'] == 'add_foreign_key']
+            single_pass = [member['estimate'] for member in group
+                           if member['work'] in ('scan', 'rewrite') and member['action'] != 'add_foreign_key']
+            estimate = sum(separate) + max(single_pass, default=0.0)
+        return dict(first, action='alter_table', sql=sql, object=None, spaced=False,
+                    comments=first['comments'] + [f"-- {len(group)} cambios en un solo ALTER TABLE"],
+                    lock=max(locks, key=LOCK_ORDER.index) if locks else None,
+                    work=min((member['work'] for member in group), key=WORK_ORDER.index),
+                    estimate=estimate)
+    
+    def _table_size(self, table: Optional[str], stats: Dict[str, Dict[str, Any]], new_tables: set,
+                    has_stats: bool):
+        """Filas y bytes de la tabla (None si no se conocen). Las tablas que
+        crea la propia migración están vacías."""
+        if table is None or table in new_tables:
+            return 0, 0
+        table_stats = stats.get(table)
+        if table_stats is None or not has_stats:
+            return None, None
+        # reltuples es -1 en tablas nunca analizadas (PostgreSQL 14+)
+        rows = max(float(table_stats.get('reltuples') or 0), 0)
+        size = (table_stats.get('relpages') or 0) * BLOCK_SIZE or table_stats.get('total_size') or 0
+        return rows, size
+    
+    def _estimate(self, work: str, size: Optional[int]) -> Optional[float]:
+        """Segundos estimados durante los que se mantiene el bloqueo"""
+        if work in CATALOG_WORK:
+            return 0.0
+        if size is None:
+            return None
+        return size / WORK_RATES[work]
+    
+    def _needs_maintenance(self, statement: Dict[str, Any]) -> bool:
+        """Verificar si la sentencia bloquea la tabla demasiado tiempo (sin
+        estimación, por no conocer la tabla, se asume que sí). Las tablas
+        calientes del punto de venta toleran mucho menos tiempo de bloqueo."""
+        if statement['work'] in CATALOG_WORK or statement['lock'] is None:
+            return False
+        if statement['estimate'] is None:
+            return True
+        if statement['table'].split('.', 1)[-1] in self.hot_tables:
+            return statement['estimate'] > self.hot_online_max_seconds
+        return statement['estimate'] > self.online_max_seconds
+    
+    def _columns(self, statement: Dict[str, Any]) -> Optional[set]:
+        """Columnas de su tabla que usa la sentencia (None si no se conocen)"""
+        obj = statement.get('object') or {}
+        if statement['action'] in ('add_column', 'set_not_null'):
+            return {obj['column_name']}
+        if statement['action'].startswith('add_'):
+            return _constraint_columns(obj, 'column_names', 'column_name') or None
+        if statement['action'] == 'create_index':
+            # Los identificadores de la lista de columnas (y de sus expresiones)
+            match = INDEX_COLUMNS.search(obj.get('indexdef') or '')
+            return set(re.findall(r'\w+', match.group('columns'))) if match else None
+        return None
+    
+    def _defer(self, statement: Dict[str, Any], deferred: Dict[str, Any]):
+        """Registrar lo que crea una sentencia que pasa a la ventana de
+        mantenimiento, para diferir también lo que lo usa"""
+        table = statement.get('table')
+        if table:
+            deferred['tables'].add(table)
+        if statement['action'] == 'add_column':
+            deferred['columns'].setdefault(table, set()).update(self._columns(statement))
+        elif statement['action'] in ('add_primary_key', 'add_unique') and self._columns(statement):
+            deferred['keys'].setdefault(table, set()).add(frozenset(self._columns(statement)))
+        if statement.get('relation'):
+            deferred['relations'].add(statement['relation'])
+    
+    def _depends_on(self, statement: Dict[str, Any], deferred: Dict[str, Any]) -> bool:
+        """Verificar si la sentencia usa algo creado por una sentencia diferida:
+        una columna nueva de su tabla, la columna o clave referenciada por una
+        clave foránea o, en vistas, funciones y triggers, una vista o función
+        diferida o una columna nueva de una tabla que aparece en su definición.
+        Si no se conocen las columnas que usa, basta con un cambio diferido en
+        su tabla."""
+        table = statement.get('table')
+        if table in deferred['tables'] and statement['action'] != 'create_table':
+            columns = self._columns(statement)
+            if columns is None and not statement.get('definition'):
+                return True
+            if columns and columns & deferred['columns'].get(table, set()):
+                return True
+        
+        foreign_table = statement.get('foreign_table')
+        if foreign_table in deferred['tables']:
+            foreign_columns = _constraint_columns(statement['object'], 'foreign_column_names', 'foreign_column_name')
+            if (foreign_columns & deferred['columns'].get(foreign_table, set()) or
+                    frozenset(foreign_columns) in deferred['keys'].get(foreign_table, set())):
+                return True
+        
+        definition = statement.get('definition')
+        if definition:
+            words = set(re.findall(r'\w+', definition))
+            if words & deferred['relations']:
+                return True
+            return any(name.split('.', 1)[-1] in words and words & deferred['columns'].get(name, set())
+                       for name in deferred['tables'])
+        return False
+    
+    def get_phase(self, phase: str) -> List[Dict[str, Any]]:
+        """Sentencias planificadas de una fase, en el orden de la migración"""
+        return [statement for statement in self.statements if statement['phase'] == phase]
+    
+    def describe(self, statement: Dict[str, Any]) -> str:
+        """Bloqueo y estimación de una sentencia, para comentarla en el script"""
+        if statement['lock'] is None:
+            return "sin bloqueo de tablas existentes"
+        description = (f"{statement['lock']} en {statement['table']} ({LOCK_EFFECTS[statement['lock']]}), "
+                       f"{WORK_LABELS[statement['work']]}")
+        if statement['work'] in CATALOG_WORK:
+            return description
+        if statement['estimate'] is None:
+            return f"{description}: sin estadísticas de la tabla"
+        return (f"{description}: {_format_rows(statement['rows'])} filas, {_format_size(statement['size'])}, "
+                f"{_format_seconds(statement['estimate'])}")
+    
+    def get_phase_estimate(self, phase: str) -> Optional[float]:
+        """Tiempo estimado de una fase: el de bloqueo, o el de ejecución en las
+        fases que no bloquean escrituras (None si alguna sentencia no tiene
+        estimación)"""
+        estimates = [statement['estimate'] for statement in self.get_phase(phase)]
+        return None if None in estimates else sum(estimates)
+    
+    def get_summary_lines(self) -> List[str]:
+        """Resumen del plan para el encabezado de los scripts"""
+        lines = []
+        if self.coalesced:
+            lines.append(f"-- ALTER TABLE combinados por tabla: {self.coalesced} sentencias menos")
+        for phase, label in PHASE_LABELS.items():
+            statements = self.get_phase(phase)
+            if statements:
+                estimate = _format_seconds(self.get_phase_estimate(phase))
+                description = (f"sin bloquear escrituras, duración estimada {estimate}" if phase in NON_BLOCKING_PHASES
+                               else f"bloqueos estimados en {estimate}")
+                if phase in NON_BLOCKING_PHASES:
+                    # Los SET NOT NULL tras validar no recorren la tabla, pero la bloquean
+                    blocking = [statement for statement in statements
+                                if statement['lock'] not in (None, 'SHARE UPDATE EXCLUSIVE')]
+                    if blocking:
+                        description += (f" (salvo {len(blocking)} bloqueo{'s' if len(blocking) != 1 else ''} "
+                                        f"breve{'s' if len(blocking) != 1 else ''} ACCESS EXCLUSIVE)")
+                lines.append(f"-- {label}: {len(statements)} sentencia{'s' if len(statements) != 1 else ''}, {description}")
+        return lines
+    
+    def get_plan_table(self) -> str:
+        """Tabla con las sentencias que bloquean tablas existentes"""
+        rows = []
+        for statement in self.statements:
+            if statement['lock'] is None:
+                continue
+            rows.append([
+                PHASE_LABELS[statement['phase']],
+                statement['action'],
+                statement['table'],
+                statement['lock'],
+                WORK_LABELS[statement['work']],
+                _format_rows(statement['rows']),
+                _format_size(statement['size']),
+                _format_seconds(statement['estimate'])
+            ])
+        if not rows:
+            return "Ninguna sentencia bloquea tablas existentes."
+        return tabulate(rows, headers=["Fase", "Acción", "Tabla", "Bloqueo", "Trabajo", "Filas", "Tamaño",
+                                       "Estimación"], tablefmt="grid")
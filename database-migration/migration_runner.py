@@ -3,12 +3,48 @@ Ejecutor de migraciones de base de datos
 """
 import logging
 import os
-from typing import Optional
+import re
+from typing import List, Optional, Tuple
+import psycopg2
 from database_manager import production_db
-from config import OUTPUT_DIR, MIGRATION_SCRIPT_FILE
+from config import OUTPUT_DIR, MIGRATION_SCRIPT_FILE, MIGRATION_LOCK_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
+# Única sentencia admitida en el script de índices concurrentes
+CONCURRENT_INDEX_STATEMENT = re.compile(
+    r'^CREATE (UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (?P<index>"[^"]+"|\S+) ON (ONLY )?'
+    r'((?P<schema>"[^"]+"|[^\s.]+)\.)?\S+ .*;$')
+
+# Sentencias admitidas en el script de validación de restricciones
+VALIDATION_STATEMENT = re.compile(
+    r'^ALTER TABLE (?P<table>\S+) (VALIDATE CONSTRAINT (?P<constraint>\S+)|ALTER COLUMN \S+ SET NOT NULL|'
+    r'DROP CONSTRAINT IF EXISTS \S+);$')
+
+# Índice INVALID que deja un CREATE INDEX CONCURRENTLY fallido (o cancelado).
+# Un índice que otra sesión todavía está construyendo también es INVALID:
+# pg_stat_progress_create_index lo distingue
+INVALID_INDEX_QUERY = """
+SELECT format('%%I.%%I', n.nspname, c.relname) AS index_name
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE NOT i.indisvalid
+AND c.relname = %s
+AND n.nspname = COALESCE(%s, current_schema())
+AND NOT EXISTS (SELECT 1 FROM pg_stat_progress_create_index p WHERE p.index_relid = i.indexrelid)
+"""
+
+# Bloqueo consultivo de la fase de índices concurrentes: dos migrate sobre la
+# misma base no construyen (ni limpian) índices a la vez
+CONCURRENT_INDEX_LOCK_KEY = 'database-migration:concurrent-indexes'
+
+def _unquote(identifier: Optional[str]) -> Optional[str]:
+    """Nombre sin comillas dobles (None se mantiene)"""
+    if identifier and identifier.startswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
 class MigrationRunner:
     """Ejecutor de migraciones de base de datos"""
     
@@ -135,6 +171,109 @@ class MigrationRunner:
             logger.error(f"Error ejecutando migración: {e}")
             return False
     
+    def _read_statements(self, script_path: str, pattern: re.Pattern) -> List[re.Match]:
+        """Leer un script de una sentencia por línea (sin contar comentarios).
+        Cualquier sentencia que no cumpla pattern es un error."""
+        matches = []
+        with open(script_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('--'):
+                    continue
+                match = pattern.match(line)
+                if not match:
+                    raise ValueError(f"Sentencia no admitida en {script_path}: {line}")
+                matches.append(match)
+        return matches
+    
+    def read_concurrent_indexes(self, script_path: str) -> List[Tuple[str, Optional[str], str]]:
+        """Leer el script de índices concurrentes: (esquema, índice, sentencia)"""
+        return [(_unquote(match.group('schema')), _unquote(match.group('index')), match.group(0))
+                for match in self._read_statements(script_path, CONCURRENT_INDEX_STATEMENT)]
+    
+    def _drop_invalid_index(self, conn, schema: Optional[str], index: str) -> bool:
+        """Eliminar el índice si quedó INVALID. Retorna True si había uno."""
+        with conn.cursor() as cursor:
+            cursor.execute(INVALID_INDEX_QUERY, (index, schema))
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            logger.warning(f"Eliminando índice INVALID {row[0]} de una construcción concurrente fallida")
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {row[0]}")
+            return True
+    
+    def execute_concurrent_indexes(self, script_path: str, dry_run: bool = False) -> bool:
+        """Construir los índices concurrentes, cada uno en su propia sentencia
+        fuera de una transacción. Antes de cada uno se elimina el INVALID que
+        haya dejado un intento anterior (IF NOT EXISTS lo daría por creado), y
+        si la construcción falla se elimina el que deja, para poder reintentar.
+        La fase se ejecuta con un bloqueo consultivo: si otro migrate la está
+        ejecutando sobre la misma base, no se toca ningún índice."""
+        try:
+            statements = self.read_concurrent_indexes(script_path)
+            logger.info(f"Script de índices concurrentes validado ({len(statements)} índices)")
+            if dry_run:
+                return True
+            
+            with production_db.autocommit_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (CONCURRENT_INDEX_LOCK_KEY,))
+                    if not cursor.fetchone()[0]:
+                        logger.error("Otra ejecución está construyendo los índices concurrentes en esta base")
+                        return False
+                # El bloqueo consultivo se libera al cerrar la conexión
+                for schema, index, statement in statements:
+                    self._drop_invalid_index(conn, schema, index)
+                    logger.info(f"Construyendo índice {index} (CONCURRENTLY)...")
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(statement)
+                    except psycopg2.Error as e:
+                        logger.error(f"Error construyendo el índice {index}: {e}")
+                        self._drop_invalid_index(conn, schema, index)
+                        return False
+            
+            logger.info("Índices concurrentes construidos exitosamente")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error ejecutando índices concurrentes: {e}")
+            return False
+    
+    def execute_validations(self, script_path: str, dry_run: bool = False) -> bool:
+        """Validar las restricciones añadidas con NOT VALID, cada sentencia en
+        su propia transacción para no mantener los bloqueos de una mientras se
+        valida la siguiente. Con lock_timeout, los ALTER que toman un bloqueo
+        breve no se quedan en cola detrás de transacciones largas. Si una
+        validación falla la restricción queda NOT VALID (se sigue aplicando a
+        las filas nuevas) y el script puede volver a ejecutarse."""
+        try:
+            statements = self._read_statements(script_path, VALIDATION_STATEMENT)
+            logger.info(f"Script de validación de restricciones validado ({len(statements)} sentencias)")
+            if dry_run:
+                return True
+            
+            with production_db.autocommit_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET lock_timeout = %s", (MIGRATION_LOCK_TIMEOUT,))
+                for match in statements:
+                    if match.group('constraint'):
+                        logger.info(f"Validando restricción {match.group('constraint')} en {match.group('table')}...")
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(match.group(0))
+                    except psycopg2.Error as e:
+                        logger.error(f"Error ejecutando {match.group(0)[:-1]}: {e}")
+                        logger.error(f"Corregir las filas existentes y volver a ejecutar {script_path}")
+                        return False
+            
+            logger.info("Restricciones validadas exitosamente")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error validando restricciones: {e}")
+            return False
+    
     def rollback_migration(self, rollback_script_path: str) -> bool:
         """Ejecutar rollback de la migración"""
         try:
@@ -0,0 +1,190 @@
+"""
+Mediciones de rendimiento de la extracción de esquemas
+"""
+import gzip
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List, Any, Optional
+from tabulate import tabulate
+from config import EXTRACTION_MODES
+from schema_extractor import CATALOG_QUERIES, LEGACY_CATALOG_QUERIES
+from schema_comparator import SchemaComparator
+from diff_result import empty_differences
+from schema_model import build_schema_objects, schema_to_dicts
+
+logger = logging.getLogger(__name__)
+
+class SchemaBenchmark:
+    """Comparador de rendimiento entre modos de extracción"""
+    
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.results = []
+        self.catalog_results = []
+        self.model_results = []
+    
+    def benchmark_extraction_modes(self, db_manager, schema_name: str,
+                                   modes: Optional[List[str]] = None,
+                                   repeat: int = 3) -> List[Dict[str, Any]]:
+        """Medir la extracción completa del esquema en cada modo"""
+        modes = modes or EXTRACTION_MODES
+        self.results = []
+        
+        for mode in modes:
+            samples = []
+            schema = None
+            for i in range(repeat):
+                run_name = f"{schema_name}:{mode}:{i}"
+                schema = self.extractor.extract_complete_schema(db_manager, run_name, mode=mode, use_cache=False)
+                samples.append(sum(t['seconds'] for t in self.extractor.timings.pop(run_name)))
+            
+            payload = json.dumps(schema, ensure_ascii=False, default=str).encode('utf-8')
+            self.results.append({
+                'mode': mode,
+                'min': min(samples),
+                'median': statistics.median(samples),
+                'objects': sum(len(objects) for objects in schema.values()),
+                'bytes': len(payload),
+                'gzip_bytes': len(gzip.compress(payload))
+            })
+            logger.info(f"Benchmark {schema_name} modo {mode}: {min(samples):.3f}s")
+        
+        return self.results
+    
+    def benchmark_catalog_queries(self, db_manager, repeat: int = 3) -> List[Dict[str, Any]]:
+        """Medir las consultas de pg_catalog frente a las originales de
+        information_schema (columnas y restricciones)"""
+        self.catalog_results = []
+        params = self.extractor._catalog_params()
+        
+        with db_manager.snapshot_session() as session:
+            for object_type, legacy_query in LEGACY_CATALOG_QUERIES.items():
+                for source, query in (('information_schema', legacy_query),
+                                      ('pg_catalog', CATALOG_QUERIES[object_type])):
+                    samples = []
+                    rows = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        rows = session.execute_query(query, params)
+                        samples.append(time.perf_counter() - start)
+                    
+                    self.catalog_results.append({
+                        'object_type': object_type,
+                        'source': source,
+                        'min': min(samples),
+                        'median': statistics.median(samples),
+                        'rows': len(rows)
+                    })
+                    logger.info(f"Benchmark {object_type} ({source}): {min(samples):.3f}s, {len(rows)} filas")
+        
+        return self.catalog_results
+    
+    def get_catalog_results_table(self) -> str:
+        """Obtener tabla con los resultados de la medición de consultas del catálogo"""
+        if not self.catalog_results:
+            return "No hay resultados de benchmark."
+        
+        headers = ["Objeto", "Consulta", "Filas", "Mínimo (ms)", "Mediana (ms)", "Relativo"]
+        rows = []
+        baselines = {}
+        for result in self.catalog_results:
+            baseline = baselines.setdefault(result['object_type'], result['median'])
+            rows.append([
+                result['object_type'],
+                result['source'],
+                result['rows'],
+                f"{result['min'] * 1000:.1f}",
+                f"{result['median'] * 1000:.1f}",
+                f"{baseline / result['median']:.2f}x" if result['median'] else "-"
+            ])
+        return tabulate(rows, headers=headers, tablefmt="grid")
+    
+    def benchmark_object_model(self, schema: Dict[str, List[Dict[str, Any]]],
+                               tenants: int = 20) -> List[Dict[str, Any]]:
+        """Comparar memoria y tiempo de comparación entre las filas como
+        diccionarios y el modelo compacto, diferenciando un esquema de
+        referencia contra varias copias (como al comparar muchos tenants)"""
+        payload = json.dumps(schema_to_dicts(schema), ensure_ascii=False, default=str)
+        objects = sum(len(rows) for rows in json.loads(payload).values())
+        self.model_results = []
+        
+        # Memoria retenida por las copias de cada representación
+        tracemalloc.start()
+        dict_copies = [json.loads(payload) for _ in range(tenants)]
+        dict_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        
+        tracemalloc.start()
+        model_copies = [build_schema_objects(json.loads(payload)) for _ in range(tenants)]
+        model_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        
+        # Comparación de la referencia contra cada copia
+        reference = json.loads(payload)
+        start = time.perf_counter()
+        for copy in dict_copies:
+            comparator = SchemaComparator()
+            for object_type, changes in empty_differences().items():
+                comparator._compare_objects(object_type, reference.get(object_type, []),
+                                            copy.get(object_type, []), changes)
+        dict_time = time.perf_counter() - start
+        
+        reference_model = build_schema_objects(reference)
+        start = time.perf_counter()
+        for copy in model_copies:
+            SchemaComparator().compare_schemas(reference_model, copy)
+        model_time = time.perf_counter() - start
+        
+        for representation, memory, elapsed in (('dict', dict_memory, dict_time),
+                                                 ('modelo compacto', model_memory, model_time)):
+            self.model_results.append({
+                'representation': representation,
+                'objects': objects * tenants,
+                'memory': memory,
+                'seconds': elapsed
+            })
+            logger.info(f"Benchmark modelo {representation}: {memory} bytes, {elapsed:.3f}s")
+        
+        return self.model_results
+    
+    def get_model_results_table(self) -> str:
+        """Obtener tabla con los resultados de la medición del modelo de objetos"""
+        if not self.model_results:
+            return "No hay resultados de benchmark."
+        
+        baseline = self.model_results[0]
+        headers = ["Representación", "Objetos", "Memoria (MB)", "Bytes/objeto", "Comparación (ms)", "Relativo"]
+        rows = []
+        for result in self.model_results:
+            rows.append([
+                result['representation'],
+                result['objects'],
+                f"{result['memory'] / 1024 / 1024:.1f}",
+                result['memory'] // max(result['objects'], 1),
+                f"{result['seconds'] * 1000:.1f}",
+                f"{baseline['seconds'] / result['seconds']:.2f}x" if result['seconds'] else "-"
+            ])
+        return tabulate(rows, headers=headers, tablefmt="grid")
+    
+    def get_results_table(self) -> str:
+        """Obtener tabla con los resultados de la última medición"""
+        if not self.results:
+            return "No hay resultados de benchmark."
+        
+        baseline = self.results[0]['median']
+        headers = ["Modo", "Mínimo (ms)", "Mediana (ms)", "Relativo", "Objetos", "JSON (KB)", "gzip (KB)"]
+        rows = []
+        for result in self.results:
+            rows.append([
+                result['mode'],
+                f"{result['min'] * 1000:.1f}",
+                f"{result['median'] * 1000:.1f}",
+                f"{baseline / result['median']:.2f}x" if result['median'] else "-",
+                result['objects'],
+                f"{result['bytes'] / 1024:.1f}",
+                f"{result['gzip_bytes'] / 1024:.1f}"
+            ])
+        return tabulate(rows, headers=headers, tablefmt="grid")
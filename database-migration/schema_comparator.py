@@ -2,55 +2,122 @@
 Comparador de esquemas de base de datos
 """
 import logging
-from typing import Dict, List, Any, Tuple
+import threading
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
 from tabulate import tabulate
-from config import OUTPUT_DIR, DIFF_REPORT_FILE
+from config import OUTPUT_DIR, DIFF_REPORT_FILE, STREAM_LAZY_BATCH, MIGRATABLE_OBJECTS, DIFF_RESULT_CACHE_SIZE
+from schema_model import (SchemaObject, COMPARED_FIELDS, LAZY_FIELDS, NORMALIZED_FIELDS, build_schema_objects,
+                          get_object_key, get_sort_key, load_lazy_values, make_schema_object, compared_fields)
+from definition_fingerprints import FingerprintStore
+from diff_stream import DiffWriter
+from diff_result import DiffResult, empty_differences
 
 logger = logging.getLogger(__name__)
 
+# Estados de la comparación a tres bandas respecto al snapshot base
+THREE_WAY_STATES = {
+    'local': 'Cambiado en local',
+    'production': 'Cambiado en producción',
+    'conflict': 'En conflicto',
+    'converged': 'Mismo cambio en ambos'
+}
+
 class SchemaComparator:
-    """Comparador de esquemas de PostgreSQL"""
-    
-    def __init__(self):
-        self.differences = {
-            'tables': {'added': [], 'removed': [], 'modified': []},
-            'columns': {'added': [], 'removed': [], 'modified': []},
-            'indexes': {'added': [], 'removed': [], 'modified': []},
-            'constraints': {'added': [], 'removed': [], 'modified': []},
-            'functions': {'added': [], 'removed': [], 'modified': []},
-            'triggers': {'added': [], 'removed': [], 'modified': []},
-            'views': {'added': [], 'removed': [], 'modified': []},
-            'sequences': {'added': [], 'removed': [], 'modified': []},
-            'types': {'added': [], 'removed': [], 'modified': []},
-            'extensions': {'added': [], 'removed': [], 'modified': []}
-        }
+    """Comparador de esquemas de PostgreSQL.
+    
+    Cada comparación devuelve un DiffResult nuevo e inmutable; el comparador
+    no acumula diferencias entre comparaciones. Los resultados con clave (el
+    par de huellas de los catálogos) se memorizan en un LRU de
+    max_results entradas."""
+    
+    def __init__(self, fingerprint_store: Optional[FingerprintStore] = None,
+                 max_results: int = DIFF_RESULT_CACHE_SIZE):
+        # Sin almacén, las huellas normalizadas solo se recuerdan en memoria
+        self.fingerprints = fingerprint_store if fingerprint_store is not None else FingerprintStore(None)
+        self.max_results = max_results
+        self.results = {}
+        self.lock = threading.Lock()
+    
+    def get_cached_result(self, key: Optional[Tuple[str, str]]) -> Optional[DiffResult]:
+        """Resultado memorizado de una comparación, si existe"""
+        if key is None:
+            return None
+        with self.lock:
+            result = self.results.pop(key, None)
+            if result is not None:
+                # Reinsertar para que el recorte descarte primero los menos usados
+                self.results[key] = result
+            return result
+    
+    def _remember_result(self, result: DiffResult) -> DiffResult:
+        """Memorizar un resultado con clave, descartando los menos usados"""
+        if result.key is not None and self.max_results > 0:
+            with self.lock:
+                self.results.pop(result.key, None)
+                self.results[result.key] = result
+                while len(self.results) > self.max_results:
+                    del self.results[next(iter(self.results))]
+        return result
     
     def compare_schemas(self, local_schema: Dict[str, List[Dict[str, Any]]], 
-                       production_schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, List]]:
-        """Comparar dos esquemas y encontrar diferencias"""
+                       production_schema: Dict[str, List[Dict[str, Any]]],
+                       diff_writer: Optional[DiffWriter] = None,
+                       key: Optional[Tuple[str, str]] = None) -> DiffResult:
+        """Comparar dos esquemas y encontrar diferencias.
+        
+        Con diff_writer las diferencias de cada tipo se escriben en NDJSON
+        apenas se clasifican (ver diff_stream). key identifica a los dos
+        esquemas (p. ej. las huellas de sus catálogos): si ya se compararon,
+        se devuelve el resultado memorizado sin volver a compararlos."""
+        result = self.get_cached_result(key)
+        if result is not None:
+            logger.info("Usando el resultado memorizado de la comparación")
+            if diff_writer is not None:
+                self.write_result(diff_writer, result)
+            return result
+        
         logger.info("Iniciando comparación de esquemas...")
         
-        for object_type in self.differences.keys():
+        # Trabajar sobre el modelo compacto (no copia los objetos ya convertidos)
+        local_schema = build_schema_objects(local_schema)
+        production_schema = build_schema_objects(production_schema)
+        
+        differences = empty_differences()
+        for object_type, changes in differences.items():
             self._compare_objects(object_type, local_schema.get(object_type, []), 
-                                production_schema.get(object_type, []))
+                                production_schema.get(object_type, []), changes)
+            if diff_writer is not None:
+                self._write_differences(diff_writer, object_type, changes)
+        self.fingerprints.save()
         
         logger.info("Comparación de esquemas completada")
-        return self.differences
+        return self._remember_result(DiffResult(differences, key))
     
     def _compare_objects(self, object_type: str, local_objects: List[Dict[str, Any]], 
-                        production_objects: List[Dict[str, Any]]):
+                        production_objects: List[Dict[str, Any]], changes: Dict[str, List]):
         """Comparar objetos específicos entre esquemas"""
-        local_dict = self._create_object_dict(local_objects, object_type)
-        production_dict = self._create_object_dict(production_objects, object_type)
+        self._compare_object_dicts(object_type, self._create_object_dict(local_objects, object_type),
+                                   self._create_object_dict(production_objects, object_type), changes)
+    
+    def _compare_object_dicts(self, object_type: str, local_dict: Dict[str, Any],
+                              production_dict: Dict[str, Any], changes: Dict[str, List]):
+        """Clasificar en changes los objetos de dos diccionarios indexados por clave"""
+        if object_type in LAZY_FIELDS:
+            # Cargar de una vez (una consulta por lado) los campos diferidos de
+            # los objetos comunes que no se pueden comparar sin su texto
+            self._load_lazy_fields(object_type, [
+                (obj, production_dict[key]) for key, obj in local_dict.items()
+                if key in production_dict and isinstance(obj, SchemaObject)
+            ])
         
         # Objetos añadidos (en local pero no en producción)
         for key, obj in local_dict.items():
             if key not in production_dict:
-                self.differences[object_type]['added'].append(obj)
+                changes['added'].append(obj)
             else:
                 # Verificar si el objeto fue modificado
                 if self._objects_differ(obj, production_dict[key], object_type):
-                    self.differences[object_type]['modified'].append({
+                    changes['modified'].append({
                         'local': obj,
                         'production': production_dict[key]
                     })
@@ -58,7 +125,275 @@ class SchemaComparator:
         # Objetos removidos (en producción pero no en local)
         for key, obj in production_dict.items():
             if key not in local_dict:
-                self.differences[object_type]['removed'].append(obj)
+                changes['removed'].append(obj)
+    
+    def build_reference_index(self, schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, SchemaObject]]:
+        """Indexar una sola vez un esquema de referencia para compararlo contra
+        muchos destinos (compare_with_reference): objetos compactos por clave,
+        con las definiciones cargadas en lote y sus huellas normalizadas ya
+        calculadas, de modo que el índice se puede compartir entre hilos"""
+        schema = build_schema_objects(schema)
+        index = {}
+        for object_type in MIGRATABLE_OBJECTS:
+            objects = self._create_object_dict(schema.get(object_type, []), object_type)
+            for name in NORMALIZED_FIELDS.get(object_type, ()):
+                if object_type in LAZY_FIELDS:
+                    load_lazy_values([obj for obj in objects.values()
+                                      if self._known_fingerprint(obj, name) is None], LAZY_FIELDS[object_type])
+                for obj in objects.values():
+                    self._definition_fingerprint(obj, name)
+            index[object_type] = objects
+        return index
+    
+    def compare_with_reference(self, reference_index: Dict[str, Dict[str, SchemaObject]],
+                               target_schema: Dict[str, List[Dict[str, Any]]]) -> DiffResult:
+        """Comparar un índice de build_reference_index (lado local) contra el
+        esquema de un destino (lado producción), sin volver a procesar la referencia"""
+        target_schema = build_schema_objects(target_schema)
+        differences = empty_differences()
+        for object_type, reference_dict in reference_index.items():
+            self._compare_object_dicts(object_type, reference_dict,
+                                       self._create_object_dict(target_schema.get(object_type, []), object_type),
+                                       differences[object_type])
+        return DiffResult(differences)
+    
+    def compare_three_way(self, baseline_schema: Dict[str, List[Dict[str, Any]]],
+                          local_schema: Dict[str, List[Dict[str, Any]]],
+                          production_schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, List]]:
+        """Clasificar los cambios de local y de producción respecto al snapshot
+        base (el esquema de la última migración aplicada).
+        
+        Cada objeto que cambió (se creó, se borró o se modificó) respecto a la
+        base queda en uno de los estados de THREE_WAY_STATES: solo en local,
+        solo en producción (p. ej. un hotfix), en ambos de forma distinta
+        (conflicto) o en ambos de la misma forma. Cada entrada lleva la clave
+        del objeto y sus versiones base, local y de producción (None si no existe)."""
+        logger.info("Iniciando comparación a tres bandas...")
+        
+        baseline_schema = build_schema_objects(baseline_schema)
+        local_schema = build_schema_objects(local_schema)
+        production_schema = build_schema_objects(production_schema)
+        
+        three_way = {}
+        for object_type in MIGRATABLE_OBJECTS:
+            baseline_dict, local_dict, production_dict = (
+                self._create_object_dict(schema.get(object_type, []), object_type)
+                for schema in (baseline_schema, local_schema, production_schema))
+            
+            if object_type in LAZY_FIELDS:
+                self._load_lazy_fields(object_type, [
+                    (obj, other[key]) for obj_dict, other in ((local_dict, baseline_dict),
+                                                              (production_dict, baseline_dict),
+                                                              (local_dict, production_dict))
+                    for key, obj in obj_dict.items()
+                    if key in other and isinstance(obj, SchemaObject) and isinstance(other[key], SchemaObject)
+                ])
+            
+            changes = {state: [] for state in THREE_WAY_STATES}
+            for key in sorted(baseline_dict.keys() | local_dict.keys() | production_dict.keys()):
+                baseline_obj = baseline_dict.get(key)
+                local_obj = local_dict.get(key)
+                production_obj = production_dict.get(key)
+                local_changed = self._object_changed(baseline_obj, local_obj, object_type)
+                production_changed = self._object_changed(baseline_obj, production_obj, object_type)
+                
+                if local_changed and production_changed:
+                    state = ('conflict' if self._object_changed(local_obj, production_obj, object_type)
+                             else 'converged')
+                elif local_changed:
+                    state = 'local'
+                elif production_changed:
+                    state = 'production'
+                else:
+                    continue
+                changes[state].append({'key': key, 'baseline': baseline_obj,
+                                       'local': local_obj, 'production': production_obj})
+            three_way[object_type] = changes
+        self.fingerprints.save()
+        
+        logger.info("Comparación a tres bandas completada")
+        return three_way
+    
+    def _object_changed(self, old_obj: Optional[Dict[str, Any]], new_obj: Optional[Dict[str, Any]],
+                        object_type: str) -> bool:
+        """Verificar si un objeto cambió entre dos versiones (None si no existe)"""
+        if old_obj is None or new_obj is None:
+            return (old_obj is None) != (new_obj is None)
+        return self._objects_differ(old_obj, new_obj, object_type)
+    
+    def exclude_production_changes(self, differences: DiffResult,
+                                   three_way: Dict[str, Dict[str, List]]) -> Tuple[DiffResult, Dict[str, int]]:
+        """Quitar de las diferencias (local frente a producción) los objetos que
+        solo cambiaron en producción, para no revertirlos, y los que están en
+        conflicto, que hay que resolver a mano. Retorna las diferencias
+        restantes y cuántas se quitaron por cada uno de los dos estados."""
+        excluded = {'production': 0, 'conflict': 0}
+        kept = {}
+        for object_type, changes in differences.items():
+            states = {entry['key']: state for state in excluded
+                      for entry in three_way.get(object_type, {}).get(state, [])}
+            kept[object_type] = {}
+            for change_type, objects in changes.items():
+                kept[object_type][change_type] = []
+                for obj in objects:
+                    key = self._get_object_key(obj['local'] if change_type == 'modified' else obj, object_type)
+                    if key in states:
+                        excluded[states[key]] += 1
+                    else:
+                        kept[object_type][change_type].append(obj)
+        return DiffResult(kept), excluded
+    
+    def compare_streams(self, local_stream: Callable[[str], Iterable[Dict[str, Any]]],
+                        production_stream: Callable[[str], Iterable[Dict[str, Any]]],
+                        diff_writer: Optional[DiffWriter] = None,
+                        key: Optional[Tuple[str, str]] = None) -> DiffResult:
+        """Comparar dos esquemas a partir de iteradores ordenados por clave.
+        
+        local_stream(object_type) y production_stream(object_type) devuelven las
+        filas de cada tipo en el orden de get_sort_key (p. ej. desde
+        SchemaExtractor.open_schema_stream). Cada tipo se clasifica en una sola
+        pasada (merge join), sin construir diccionarios de ningún lado. Con
+        key se memoriza el resultado igual que en compare_schemas."""
+        result = self.get_cached_result(key)
+        if result is not None:
+            logger.info("Usando el resultado memorizado de la comparación")
+            if diff_writer is not None:
+                self.write_result(diff_writer, result)
+            return result
+        
+        logger.info("Iniciando comparación de esquemas en streaming...")
+        
+        differences = empty_differences()
+        for object_type, changes in differences.items():
+            self._merge_objects(object_type, local_stream(object_type), production_stream(object_type), changes)
+            if diff_writer is not None:
+                self._write_differences(diff_writer, object_type, changes)
+        self.fingerprints.save()
+        
+        logger.info("Comparación de esquemas completada")
+        return self._remember_result(DiffResult(differences, key))
+    
+    def write_result(self, diff_writer: DiffWriter, differences: DiffResult):
+        """Escribir en NDJSON todas las diferencias de un resultado"""
+        for object_type, changes in differences.items():
+            self._write_differences(diff_writer, object_type, changes)
+    
+    def _write_differences(self, diff_writer: DiffWriter, object_type: str, changes: Dict[str, List]):
+        """Escribir las diferencias de un tipo, cargando antes en lote los
+        campos diferidos que todavía no se leyeron"""
+        if object_type in LAZY_FIELDS:
+            load_lazy_values([*changes['added'], *changes['removed'],
+                              *(change[side] for change in changes['modified'] for side in ('local', 'production'))],
+                             LAZY_FIELDS[object_type])
+        for change_type, objects in changes.items():
+            for obj in objects:
+                diff_writer.write(object_type, change_type, obj)
+    
+    def _merge_objects(self, object_type: str, local_objects: Iterable[Dict[str, Any]],
+                       production_objects: Iterable[Dict[str, Any]], changes: Dict[str, List]):
+        """Clasificar en una sola pasada los objetos de dos iteradores ordenados por clave"""
+        local_iter = self._ordered_objects(local_objects, object_type)
+        production_iter = self._ordered_objects(production_objects, object_type)
+        local_item = next(local_iter, None)
+        production_item = next(production_iter, None)
+        common = []
+        
+        while local_item is not None or production_item is not None:
+            if production_item is None or (local_item is not None and local_item[0] < production_item[0]):
+                # En local pero no en producción
+                changes['added'].append(local_item[1])
+                local_item = next(local_iter, None)
+            elif local_item is None or production_item[0] < local_item[0]:
+                # En producción pero no en local
+                changes['removed'].append(production_item[1])
+                production_item = next(production_iter, None)
+            else:
+                common.append((local_item[1], production_item[1]))
+                if len(common) >= STREAM_LAZY_BATCH:
+                    self._classify_common(object_type, common, changes)
+                    common = []
+                local_item = next(local_iter, None)
+                production_item = next(production_iter, None)
+        
+        self._classify_common(object_type, common, changes)
+    
+    def _ordered_objects(self, objects: Iterable[Dict[str, Any]],
+                         object_type: str) -> Iterator[Tuple[Tuple[str, ...], SchemaObject]]:
+        """Convertir las filas al modelo compacto y entregar (clave, objeto),
+        verificando que lleguen ordenadas. Con claves repetidas (sobrecargas de
+        funciones) se conserva la última, igual que _create_object_dict."""
+        previous = None
+        for row in objects:
+            obj = make_schema_object(object_type, row)
+            key = get_sort_key(obj, object_type)
+            if previous is not None:
+                if key < previous[0]:
+                    raise ValueError(f"Los objetos de {object_type} no están ordenados por clave: "
+                                     f"{key} después de {previous[0]}")
+                if key != previous[0]:
+                    yield previous
+            previous = (key, obj)
+        if previous is not None:
+            yield previous
+    
+    def _classify_common(self, object_type: str, pairs: List[Tuple[SchemaObject, SchemaObject]],
+                         changes: Dict[str, List]):
+        """Registrar como modificados los pares (local, producción) que difieren,
+        cargando antes en lote sus campos diferidos"""
+        if object_type in LAZY_FIELDS:
+            self._load_lazy_fields(object_type, pairs)
+        for local_obj, production_obj in pairs:
+            if self._objects_differ(local_obj, production_obj, object_type):
+                changes['modified'].append({
+                    'local': local_obj,
+                    'production': production_obj
+                })
+    
+    def _load_lazy_fields(self, object_type: str, pairs: List[Tuple[SchemaObject, SchemaObject]]):
+        """Cargar en lote los campos diferidos de los pares (local, producción)
+        cuya huella de origen no coincide y cuya huella normalizada no se conoce"""
+        fields = LAZY_FIELDS[object_type]
+        pending = []
+        for local_obj, production_obj in pairs:
+            if local_obj.same_source(production_obj):
+                continue
+            for obj in (local_obj, production_obj):
+                if any(self._known_fingerprint(obj, name) is None for name in fields):
+                    pending.append(obj)
+        load_lazy_values(pending, fields)
+    
+    def _raw_fingerprint_key(self, obj: SchemaObject, name: str) -> Optional[str]:
+        """Clave del almacén de huellas que no requiere el texto del campo: el
+        source_md5 de una función o el md5 de una extracción hash-first"""
+        source = obj.get('source_md5')
+        if source:
+            return f"source:{source}"
+        return obj.get(f"{name}_md5")
+    
+    def _known_fingerprint(self, obj: SchemaObject, name: str) -> Optional[str]:
+        """Huella normalizada de un campo sin cargar ni normalizar su texto"""
+        fingerprint = obj.get_fingerprint(name)
+        if fingerprint is None:
+            raw_key = self._raw_fingerprint_key(obj, name)
+            fingerprint = self.fingerprints.get(raw_key) if raw_key else None
+            if fingerprint is not None:
+                obj.set_fingerprint(name, fingerprint)
+        return fingerprint
+    
+    def _definition_fingerprint(self, obj: SchemaObject, name: str) -> Optional[str]:
+        """Huella normalizada de un campo, normalizando el texto solo si no se
+        conoce todavía (None si el objeto no tiene el texto)"""
+        fingerprint = self._known_fingerprint(obj, name)
+        if fingerprint is None and name in obj:
+            value = obj[name]
+            if value is None:
+                return None
+            fingerprint = self.fingerprints.fingerprint(str(value))
+            obj.set_fingerprint(name, fingerprint)
+            source = obj.get('source_md5')
+            if source:
+                self.fingerprints.put(f"source:{source}", fingerprint)
+        return fingerprint
     
     def _create_object_dict(self, objects: List[Dict[str, Any]], object_type: str) -> Dict[str, Dict[str, Any]]:
         """Crear diccionario de objetos para comparación rápida"""
@@ -72,32 +407,38 @@ class SchemaComparator:
     
     def _get_object_key(self, obj: Dict[str, Any], object_type: str) -> str:
         """Obtener clave única para el objeto"""
-        if object_type == 'tables':
-            return f"{obj['schemaname']}.{obj['tablename']}"
-        elif object_type == 'columns':
-            return f"{obj['table_schema']}.{obj['table_name']}.{obj['column_name']}"
-        elif object_type == 'indexes':
-            return f"{obj['schemaname']}.{obj['indexname']}"
-        elif object_type == 'constraints':
-            return f"{obj['table_schema']}.{obj['table_name']}.{obj['constraint_name']}"
-        elif object_type == 'functions':
-            return f"{obj['schema_name']}.{obj['function_name']}"
-        elif object_type == 'triggers':
-            return f"{obj['trigger_schema']}.{obj['trigger_name']}"
-        elif object_type == 'views':
-            return f"{obj['table_schema']}.{obj['table_name']}"
-        elif object_type == 'sequences':
-            return f"{obj['sequence_schema']}.{obj['sequence_name']}"
-        elif object_type == 'types':
-            return f"{obj['schema_name']}.{obj['type_name']}"
-        elif object_type == 'extensions':
-            return obj['extname']
-        
-        return str(obj)
+        return get_object_key(obj, object_type)
     
     def _objects_differ(self, local_obj: Dict[str, Any], production_obj: Dict[str, Any], 
                        object_type: str) -> bool:
         """Verificar si dos objetos son diferentes"""
+        # Definiciones SQL: se comparan sus huellas normalizadas, de modo que
+        # los comentarios y el formato no cuentan como cambios
+        if (object_type in NORMALIZED_FIELDS and isinstance(local_obj, SchemaObject) and
+                isinstance(production_obj, SchemaObject)):
+            if local_obj.same_source(production_obj):
+                return False
+            normalized = NORMALIZED_FIELDS[object_type]
+            for name in normalized:
+                # El mismo texto no necesita normalizarse
+                if (local_obj.is_loaded(name) and production_obj.is_loaded(name) and
+                        local_obj[name] == production_obj[name]):
+                    continue
+                local_fingerprint = self._definition_fingerprint(local_obj, name)
+                production_fingerprint = self._definition_fingerprint(production_obj, name)
+                if local_fingerprint is None or production_fingerprint is None:
+                    break
+                if local_fingerprint != production_fingerprint:
+                    return True
+            else:
+                return any(local_obj.get(name) != production_obj.get(name)
+                           for name in COMPARED_FIELDS[object_type] if name not in normalized)
+        
+        # Con el modelo compacto se comparan los campos relevantes (o sus huellas)
+        if (isinstance(local_obj, SchemaObject) and isinstance(production_obj, SchemaObject) and
+                (object_type in COMPARED_FIELDS or local_obj.keys() == production_obj.keys())):
+            return local_obj.differs(production_obj)
+        
         # Para columnas, comparar tipo de datos, nullable, default
         if object_type == 'columns':
             return (local_obj.get('data_type') != production_obj.get('data_type') or
@@ -119,7 +460,7 @@ class SchemaComparator:
         
         # Para otros objetos, comparar todos los campos relevantes
         else:
-            for key in local_obj.keys():
+            for key in compared_fields(object_type, local_obj.keys()):
                 if key in production_obj and local_obj[key] != production_obj[key]:
                     return True
         
@@ -188,32 +529,76 @@ class SchemaComparator:
         elif object_type == 'types':
             return f"{obj['schema_name']}.{obj['type_name']}"
         elif object_type == 'extensions':
+            # Los volcados de pg_dump no guardan la versión de la extensión
+            if obj.get('extversion') is None:
+                return obj['extname']
             return f"{obj['extname']} (v{obj['extversion']})"
         
         return str(obj)
     
-    def save_diff_report(self, report: str):
+    def generate_three_way_report(self, three_way: Dict[str, Dict[str, List]]) -> str:
+        """Generar reporte de la comparación a tres bandas"""
+        report = []
+        report.append("=" * 80)
+        report.append("REPORTE DE DIFERENCIAS A TRES BANDAS (BASE / LOCAL / PRODUCCIÓN)")
+        report.append("=" * 80)
+        report.append("")
+        
+        for object_type, changes in three_way.items():
+            if not any(changes.values()):
+                continue
+            report.append(f"\n{object_type.upper()}:")
+            report.append("-" * 40)
+            for state, label in THREE_WAY_STATES.items():
+                if changes[state]:
+                    report.append(f"  {label.upper()} ({len(changes[state])}):")
+                    for entry in changes[state]:
+                        report.append(f"    {self.format_three_way_entry(entry, object_type)}")
+        
+        total = sum(len(entries) for changes in three_way.values() for entries in changes.values())
+        report.append(f"\n{'=' * 80}")
+        report.append(f"TOTAL DE OBJETOS CAMBIADOS: {total}")
+        report.append(f"{'=' * 80}")
+        
+        return "\n".join(report)
+    
+    def format_three_way_entry(self, entry: Dict[str, Any], object_type: str) -> str:
+        """Formatear una entrada de compare_three_way indicando qué hizo cada lado"""
+        obj = next(entry[side] for side in ('local', 'production', 'baseline') if entry[side] is not None)
+        actions = []
+        for side, label in (('local', 'local'), ('production', 'producción')):
+            if entry['baseline'] is None and entry[side] is not None:
+                actions.append(f"{label}: creado")
+            elif entry['baseline'] is not None and entry[side] is None:
+                actions.append(f"{label}: borrado")
+            elif self._object_changed(entry['baseline'], entry[side], object_type):
+                actions.append(f"{label}: modificado")
+        return f"{self._format_object(obj, object_type)} [{', '.join(actions)}]"
+    
+    def get_three_way_summary_table(self, three_way: Dict[str, Dict[str, List]]) -> str:
+        """Obtener tabla resumen de la comparación a tres bandas"""
+        headers = ["Tipo de Objeto"] + list(THREE_WAY_STATES.values())
+        rows = [[object_type.title()] + [len(changes[state]) for state in THREE_WAY_STATES]
+                for object_type, changes in three_way.items() if any(changes.values())]
+        
+        if rows:
+            return tabulate(rows, headers=headers, tablefmt="grid")
+        else:
+            return "Ni local ni producción cambiaron respecto al snapshot base."
+    
+    def save_diff_report(self, report: str, filename: str = DIFF_REPORT_FILE):
         """Guardar reporte de diferencias"""
-        filepath = f"{OUTPUT_DIR}/{DIFF_REPORT_FILE}"
+        filepath = f"{OUTPUT_DIR}/{filename}"
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(report)
         logger.info(f"Reporte de diferencias guardado en {filepath}")
     
-    def has_changes(self) -> bool:
-        """Verificar si hay cambios pendientes"""
-        for object_type, changes in self.differences.items():
-            if (len(changes['added']) > 0 or 
-                len(changes['removed']) > 0 or 
-                len(changes['modified']) > 0):
-                return True
-        return False
-    
-    def get_summary_table(self) -> str:
+    def get_summary_table(self, differences: DiffResult) -> str:
         """Obtener tabla resumen de cambios"""
         headers = ["Tipo de Objeto", "Añadidos", "Removidos", "Modificados", "Total"]
         rows = []
         
-        for object_type, changes in self.differences.items():
+        for object_type, changes in differences.items():
             added = len(changes['added'])
             removed = len(changes['removed'])
             modified = len(changes['modified'])
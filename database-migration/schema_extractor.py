@@ -2,17 +2,421 @@
 Extractor de esquemas de base de datos PostgreSQL
 """
 import os
+import gzip
+import json
+import hashlib
+import time
 import logging
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Dict, List, Any, Optional, Tuple
+from tabulate import tabulate
 from database_manager import local_db, production_db
-from config import EXCLUDED_SCHEMAS, OUTPUT_DIR
+from config import (EXCLUDED_SCHEMAS, OUTPUT_DIR, EXTRACTION_MODE, EXTRACTION_MODES, DUMP_SEARCH_PATH,
+                    INCLUDE_EXTENSION_FUNCTIONS, FLEET_MAX_WORKERS, FLEET_SNAPSHOT_DIR)
+from dump_parser import DumpParser
+from definition_loader import DefinitionLoader
+from schema_model import LazyValue, LAZY_FIELDS, OBJECT_KEY_FIELDS, TABLE_STATS_FIELDS, load_lazy_values
 
 logger = logging.getLogger(__name__)
 
+# Filtros de inclusión/exclusión (--include-schema, --exclude-table, ...).
+# Los patrones glob se convierten a LIKE y se aplican en el WHERE de cada
+# consulta, de modo que el servidor no lee los objetos descartados.
+FILTER_KINDS = ('schemas', 'tables')
+
+def glob_to_like(pattern: str) -> str:
+    """Convertir un patrón glob (* y ?) en un patrón LIKE"""
+    like = ""
+    for char in pattern:
+        if char == '*':
+            like += '%'
+        elif char == '?':
+            like += '_'
+        elif char in '%_\\':
+            like += '\\' + char
+        else:
+            like += char
+    return like
+
+def _name_filter(column: str, kind: str) -> str:
+    """Condición SQL de los filtros de un tipo sobre una columna de nombre"""
+    return (f"(cardinality(%(include_{kind})s::text[]) = 0 OR {column} LIKE ANY(%(include_{kind})s::text[]))\n"
+            f"    AND NOT {column} LIKE ANY(%(exclude_{kind})s::text[])")
+
+# Consultas del catálogo por tipo de objeto. Se comparten entre los modos
+# de extracción: en 'legacy' y 'session' se ejecuta cada una por separado y
+# en 'json' se anidan todas en un único documento construido en el servidor.
+CATALOG_QUERIES = {
+    'tables': f"""
+    SELECT 
+        n.nspname AS schemaname,
+        c.relname AS tablename,
+        pg_get_userbyid(c.relowner) AS tableowner,
+        c.relhasindex AS hasindexes,
+        c.relhasrules AS hasrules,
+        c.relhastriggers AS hastriggers,
+        c.relrowsecurity AS rowsecurity,
+        -- Tamaño y actividad (TABLE_STATS_FIELDS): informativos, no se comparan
+        c.reltuples,
+        c.relpages,
+        pg_total_relation_size(c.oid) AS total_size,
+        s.seq_scan,
+        s.idx_scan,
+        s.n_dead_tup,
+        s.last_vacuum,
+        s.last_autovacuum,
+        s.last_analyze,
+        s.last_autoanalyze
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE c.relkind IN ('r', 'p')
+    AND n.nspname NOT IN %(excluded_schemas)s
+    AND {_name_filter('n.nspname', 'schemas')}
+    AND {_name_filter('c.relname', 'tables')}
+    ORDER BY n.nspname, c.relname
+    """,
+    'columns': f"""
+    SELECT 
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        a.attnum AS ordinal_position,
+        CASE WHEN a.attgenerated = '' THEN pg_get_expr(ad.adbin, ad.adrelid) END AS column_default,
+        CASE WHEN a.attnotnull OR (t.typtype = 'd' AND t.typnotnull) THEN 'NO' ELSE 'YES' END AS is_nullable,
+        CASE WHEN t.typtype = 'd' THEN
+            CASE WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                 WHEN nbt.nspname = 'pg_catalog' THEN format_type(t.typbasetype, NULL)
+                 ELSE 'USER-DEFINED' END
+        ELSE
+            CASE WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                 WHEN nt.nspname = 'pg_catalog' THEN format_type(a.atttypid, NULL)
+                 ELSE 'USER-DEFINED' END
+        END AS data_type,
+        -- Mismos cálculos que information_schema.columns (_pg_char_max_length,
+        -- _pg_numeric_precision, ...) pero en línea, sobre el tipo base real
+        CASE WHEN tt.typmod = -1 THEN NULL
+             WHEN tt.typid IN (1042, 1043) THEN tt.typmod - 4
+             WHEN tt.typid IN (1560, 1562) THEN tt.typmod
+        END AS character_maximum_length,
+        CASE tt.typid
+            WHEN 21 THEN 16 WHEN 23 THEN 32 WHEN 20 THEN 64
+            WHEN 1700 THEN CASE WHEN tt.typmod = -1 THEN NULL ELSE ((tt.typmod - 4) >> 16) & 65535 END
+            WHEN 700 THEN 24 WHEN 701 THEN 53
+        END AS numeric_precision,
+        CASE WHEN tt.typid IN (21, 23, 20) THEN 0
+             WHEN tt.typid = 1700 THEN CASE WHEN tt.typmod = -1 THEN NULL ELSE (tt.typmod - 4) & 65535 END
+        END AS numeric_scale,
+        CASE WHEN tt.typid = 1082 THEN 0
+             WHEN tt.typid IN (1083, 1114, 1184, 1266) THEN CASE WHEN tt.typmod < 0 THEN 6 ELSE tt.typmod END
+             WHEN tt.typid = 1186 THEN
+                 CASE WHEN tt.typmod < 0 OR tt.typmod & 65535 = 65535 THEN 6 ELSE tt.typmod & 65535 END
+        END AS datetime_precision,
+        COALESCE(bt.typname, t.typname) AS udt_name,
+        format_type(a.atttypid, a.atttypmod) AS formatted_type
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_type t ON t.oid = a.atttypid
+    JOIN pg_namespace nt ON nt.oid = t.typnamespace
+    LEFT JOIN pg_attrdef ad ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+    LEFT JOIN pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    LEFT JOIN pg_namespace nbt ON nbt.oid = bt.typnamespace
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN t.typtype = 'd' THEN t.typbasetype ELSE a.atttypid END AS typid,
+               CASE WHEN t.typtype = 'd' THEN t.typtypmod ELSE a.atttypmod END AS typmod
+    ) tt
+    WHERE n.nspname NOT IN %(excluded_schemas)s
+    AND {_name_filter('n.nspname', 'schemas')}
+    AND {_name_filter('c.relname', 'tables')}
+    AND c.relkind IN ('r', 'v', 'f', 'p')
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    ORDER BY n.nspname, c.relname, a.attnum
+    """,
+    'indexes': f"""
+    SELECT 
+        schemaname,
+        tablename,
+        indexname,
+        indexdef
+    FROM pg_indexes 
+    WHERE schemaname NOT IN %(excluded_schemas)s
+    AND {_name_filter('schemaname', 'schemas')}
+    AND {_name_filter('tablename', 'tables')}
+    ORDER BY schemaname, tablename, indexname
+    """,
+    'constraints': f"""
+    SELECT 
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        con.conname AS constraint_name,
+        CASE con.contype
+            WHEN 'p' THEN 'PRIMARY KEY'
+            WHEN 'f' THEN 'FOREIGN KEY'
+            WHEN 'u' THEN 'UNIQUE'
+            WHEN 'c' THEN 'CHECK'
+            WHEN 'x' THEN 'EXCLUDE'
+            WHEN 't' THEN 'TRIGGER'
+        END AS constraint_type,
+        cols.column_names,
+        array_to_string(cols.column_names, ', ') AS column_name,
+        fn.nspname AS foreign_table_schema,
+        fc.relname AS foreign_table_name,
+        fcols.column_names AS foreign_column_names,
+        array_to_string(fcols.column_names, ', ') AS foreign_column_name,
+        CASE con.confdeltype
+            WHEN 'a' THEN 'NO ACTION' WHEN 'r' THEN 'RESTRICT' WHEN 'c' THEN 'CASCADE'
+            WHEN 'n' THEN 'SET NULL' WHEN 'd' THEN 'SET DEFAULT'
+        END AS delete_rule,
+        CASE con.confupdtype
+            WHEN 'a' THEN 'NO ACTION' WHEN 'r' THEN 'RESTRICT' WHEN 'c' THEN 'CASCADE'
+            WHEN 'n' THEN 'SET NULL' WHEN 'd' THEN 'SET DEFAULT'
+        END AS update_rule,
+        CASE WHEN con.contype = 'c' THEN pg_get_expr(con.conbin, con.conrelid) END AS check_clause,
+        pg_get_constraintdef(con.oid) AS definition
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    LEFT JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+    -- Columnas en el orden de la restricción (claves compuestas)
+    LEFT JOIN LATERAL (
+        SELECT array_agg(a.attname::text ORDER BY k.ord) AS column_names
+        FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+    ) cols ON true
+    LEFT JOIN LATERAL (
+        SELECT array_agg(a.attname::text ORDER BY k.ord) AS column_names
+        FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+    ) fcols ON true
+    WHERE n.nspname NOT IN %(excluded_schemas)s
+    AND {_name_filter('n.nspname', 'schemas')}
+    AND {_name_filter('c.relname', 'tables')}
+    ORDER BY n.nspname, c.relname, con.conname
+    """,
+    'functions': f"""
+    SELECT 
+        n.nspname as schema_name,
+        p.proname as function_name,
+        f.return_type,
+        f.arguments,
+        -- pg_get_functiondef se carga bajo demanda (FUNCTION_DEFINITION_QUERY)
+        NULL::text as definition,
+        p.prokind as function_kind,
+        p.oid::bigint as function_oid,
+        -- Huella de las columnas de pg_proc de las que sale la definición: si
+        -- coincide en ambos lados la función no cambió. Los cuerpos SQL estándar
+        -- (prosrc vacío) guardan OIDs y siempre se comparan por su definición.
+        CASE WHEN p.prosrc <> '' THEN md5(concat_ws(E'\\n',
+            p.prokind, l.lanname, p.prosrc, COALESCE(p.probin, ''),
+            f.arguments, f.return_type,
+            p.provolatile, p.proparallel, p.proisstrict, p.prosecdef, p.proleakproof,
+            p.procost, p.prorows, p.prosupport::regproc, COALESCE(p.proconfig::text, ''),
+            (SELECT string_agg(format_type(tt, NULL), ',') FROM unnest(p.protrftypes) tt)
+        )) END as source_md5
+    FROM pg_proc p
+    LEFT JOIN pg_namespace n ON p.pronamespace = n.oid
+    JOIN pg_language l ON l.oid = p.prolang
+    -- OFFSET 0 evita que se calculen dos veces (columna y huella)
+    CROSS JOIN LATERAL (
+        SELECT pg_get_function_result(p.oid) AS return_type,
+               pg_get_function_arguments(p.oid) AS arguments
+        OFFSET 0
+    ) f
+    WHERE n.nspname NOT IN %(excluded_schemas)s
+    AND {_name_filter('n.nspname', 'schemas')}
+    -- pg_get_functiondef no admite agregados
+    AND p.prokind <> 'a'
+    -- Funciones instaladas por extensiones (vector, postgis...)
+    AND (%(include_extension_functions)s OR NOT EXISTS (
+        SELECT 1 FROM pg_depend d
+        WHERE d.classid = 'pg_proc'::regclass AND d.objid = p.oid AND d.deptype = 'e'
+    ))
+    ORDER BY n.nspname, p.proname
+    """,
+    'triggers': f"""
+    SELECT 
+        trigger_schema,
+        trigger_name,
+        event_manipulation,
+        event_object_table,
+        action_statement,
+        action_timing,
+        action_orientation
+    FROM information_schema.triggers 
+    WHERE trigger_schema NOT IN %(excluded_schemas)s
+    AND {_name_filter('trigger_schema', 'schemas')}
+    AND {_name_filter('event_object_table', 'tables')}
+    ORDER BY trigger_schema, event_object_table, trigger_name
+    """,
+    'views': f"""
+    SELECT 
+        table_schema,
+        table_name,
+        view_definition
+    FROM information_schema.views 
+    WHERE table_schema NOT IN %(excluded_schemas)s
+    AND {_name_filter('table_schema', 'schemas')}
+    AND {_name_filter('table_name', 'tables')}
+    ORDER BY table_schema, table_name
+    """,
+    'sequences': f"""
+    SELECT 
+        sequence_schema,
+        sequence_name,
+        data_type,
+        start_value,
+        minimum_value,
+        maximum_value,
+        increment,
+        cycle_option
+    FROM information_schema.sequences 
+    WHERE sequence_schema NOT IN %(excluded_schemas)s
+    AND {_name_filter('sequence_schema', 'schemas')}
+    ORDER BY sequence_schema, sequence_name
+    """,
+    'types': f"""
+    SELECT 
+        n.nspname as schema_name,
+        t.typname as type_name,
+        t.typtype as type_type,
+        t.typcategory as type_category,
+        pg_catalog.format_type(t.oid, NULL) as type_definition
+    FROM pg_type t
+    LEFT JOIN pg_namespace n ON t.typnamespace = n.oid
+    WHERE n.nspname NOT IN %(excluded_schemas)s
+    AND {_name_filter('n.nspname', 'schemas')}
+    AND t.typtype IN ('c', 'e', 'd')  -- composite, enum, domain
+    ORDER BY n.nspname, t.typname
+    """,
+    'extensions': """
+    SELECT 
+        extname,
+        extversion,
+        extrelocatable,
+        extnamespace::regnamespace as schema_name
+    FROM pg_extension
+    ORDER BY extname
+    """
+}
+
+# Definiciones completas de funciones, pedidas solo para las que el comparador
+# o el generador necesitan (ver DefinitionLoader)
+FUNCTION_DEFINITION_QUERY = """
+SELECT p.oid::bigint AS key, pg_get_functiondef(p.oid) AS value
+FROM pg_proc p
+WHERE p.oid = ANY(%(keys)s::oid[])
+"""
+
+# Consultas originales sobre information_schema, conservadas solo para medir
+# las consultas de pg_catalog frente a ellas (main.py benchmark --suite catalog)
+LEGACY_CATALOG_QUERIES = {
+    'columns': """
+    SELECT 
+        table_schema,
+        table_name,
+        column_name,
+        ordinal_position,
+        column_default,
+        is_nullable,
+        data_type,
+        character_maximum_length,
+        numeric_precision,
+        numeric_scale,
+        datetime_precision,
+        udt_name
+    FROM information_schema.columns 
+    WHERE table_schema NOT IN %(excluded_schemas)s
+    ORDER BY table_schema, table_name, ordinal_position
+    """,
+    'constraints': """
+    SELECT 
+        tc.table_schema,
+        tc.table_name,
+        tc.constraint_name,
+        tc.constraint_type,
+        kcu.column_name,
+        ccu.table_schema AS foreign_table_schema,
+        ccu.table_name AS foreign_table_name,
+        ccu.column_name AS foreign_column_name,
+        rc.delete_rule,
+        rc.update_rule,
+        cc.check_clause
+    FROM information_schema.table_constraints tc
+    LEFT JOIN information_schema.key_column_usage kcu 
+        ON tc.constraint_name = kcu.constraint_name
+    LEFT JOIN information_schema.constraint_column_usage ccu 
+        ON ccu.constraint_name = tc.constraint_name
+    LEFT JOIN information_schema.check_constraints cc
+        ON tc.constraint_name = cc.constraint_name
+    LEFT JOIN information_schema.referential_constraints rc 
+        ON tc.constraint_name = rc.constraint_name
+    WHERE tc.table_schema NOT IN %(excluded_schemas)s
+    ORDER BY tc.table_schema, tc.table_name, tc.constraint_name
+    """
+}
+
+# Columnas con definiciones extensas y la expresión SQL de la clave con la que
+# el comparador identifica cada objeto. En modo hash-first se transfiere solo
+# el md5 de la definición y el texto completo se pide únicamente para las
+# claves cuyo hash difiere entre ambas bases de datos. Las funciones no se
+# incluyen: su definición ya se carga bajo demanda.
+DEFINITION_COLUMNS = {
+    'triggers': ('action_statement', "q.trigger_schema || '.' || q.trigger_name"),
+    'views': ('view_definition', "q.table_schema || '.' || q.table_name")
+}
+
+# Restricciones que save_schema_to_file escribe dentro del CREATE TABLE
+INLINE_CONSTRAINT_TYPES = ('PRIMARY KEY', 'UNIQUE')
+
+# Búfer de escritura de los archivos SQL (una llamada al sistema por MiB)
+SQL_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Versión del formato de los snapshots; cambiarla invalida la caché existente
+SNAPSHOT_FORMAT_VERSION = 3
+
+# Huella barata del catálogo: número de filas y xmin máximo de los catálogos
+# que cambian con cualquier DDL. Si coincide, el esquema no ha cambiado.
+FINGERPRINT_CATALOGS = [
+    'pg_namespace', 'pg_class', 'pg_attribute', 'pg_attrdef', 'pg_constraint',
+    'pg_index', 'pg_proc', 'pg_trigger', 'pg_rewrite', 'pg_type',
+    'pg_sequence', 'pg_extension'
+]
+
+FINGERPRINT_QUERY = "SELECT jsonb_build_object(\n    'database', current_database(),\n    'server_version', current_setting('server_version_num'),\n" + ",\n".join(
+    f"    '{catalog}', (SELECT jsonb_build_array(count(*), max(xmin::text::bigint)) FROM pg_catalog.{catalog})"
+    for catalog in FINGERPRINT_CATALOGS
+) + "\n)::text AS fingerprint"
+
 class SchemaExtractor:
     """Extractor de esquemas de PostgreSQL"""
     
-    def __init__(self):
+    def __init__(self, mode: str = EXTRACTION_MODE, cache=None,
+                 filters: Optional[Dict[str, List[str]]] = None,
+                 include_extension_functions: bool = INCLUDE_EXTENSION_FUNCTIONS):
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Modo de extracción no válido: {mode}")
+        self.mode = mode
+        self.cache = cache
+        self.include_extension_functions = include_extension_functions
+        self.definition_loaders = {}
+        # Patrones glob por filtro: include_schemas, exclude_tables, include_types...
+        filters = filters or {}
+        self.filters = {f"{action}_{kind}": list(filters.get(f"{action}_{kind}") or [])
+                        for kind in FILTER_KINDS + ('types',) for action in ('include', 'exclude')}
+        for object_type in self.filters['include_types'] + self.filters['exclude_types']:
+            if object_type not in CATALOG_QUERIES:
+                raise ValueError(f"Tipo de objeto no válido: {object_type}")
+        self.object_types = [
+            object_type for object_type in CATALOG_QUERIES
+            if (not self.filters['include_types'] or object_type in self.filters['include_types'])
+            and object_type not in self.filters['exclude_types']
+        ]
+        self.timings = {}
         self.ensure_output_dir()
     
     def ensure_output_dir(self):
@@ -21,208 +425,544 @@ class SchemaExtractor:
             os.makedirs(OUTPUT_DIR)
             logger.info(f"Directorio {OUTPUT_DIR} creado")
     
+    def _catalog_params(self) -> Dict[str, Any]:
+        """Parámetros compartidos por las consultas del catálogo"""
+        params = {
+            'excluded_schemas': tuple(EXCLUDED_SCHEMAS),
+            'include_extension_functions': self.include_extension_functions
+        }
+        for kind in FILTER_KINDS:
+            for action in ('include', 'exclude'):
+                params[f"{action}_{kind}"] = [glob_to_like(pattern) for pattern in self.filters[f"{action}_{kind}"]]
+        return params
+    
+    def _extraction_options(self) -> Dict[str, Any]:
+        """Opciones que cambian el resultado de la extracción (forman parte de
+        la huella de la caché)"""
+        return dict(self._catalog_params(), object_types=self.object_types)
+    
+    def _cache_options(self, hash_definitions: bool = False) -> Dict[str, Any]:
+        """Opciones con las que se guarda en la caché un snapshot del catálogo"""
+        return dict(self._extraction_options(), hash_definitions=hash_definitions)
+    
+    def _dump_options(self) -> Dict[str, Any]:
+        """Opciones con las que se guarda en la caché un snapshot de un volcado"""
+        return dict(self._extraction_options(), search_path=DUMP_SEARCH_PATH)
+    
+    def _catalog_row_expression(self, object_type: str, hash_definitions: bool = False) -> str:
+        """Expresión jsonb de cada fila de la consulta del catálogo (alias q)"""
+        if hash_definitions and object_type in DEFINITION_COLUMNS:
+            column = DEFINITION_COLUMNS[object_type][0]
+            return f"(to_jsonb(q) - '{column}') || jsonb_build_object('{column}_md5', md5(q.{column}))"
+        return "to_jsonb(q)"
+    
+    def _run_catalog_query(self, db_manager, object_type: str,
+                           hash_definitions: bool = False) -> List[Dict[str, Any]]:
+        """Ejecutar la consulta del catálogo de un tipo de objeto"""
+        if hash_definitions and object_type in DEFINITION_COLUMNS:
+            query = (f"SELECT {self._catalog_row_expression(object_type, True)} AS obj "
+                     f"FROM ({CATALOG_QUERIES[object_type]}) q")
+            return [row['obj'] for row in db_manager.execute_query(query, self._catalog_params())]
+        return db_manager.execute_query(CATALOG_QUERIES[object_type], self._catalog_params())
+    
     def extract_tables(self, db_manager) -> List[Dict[str, Any]]:
-        """Extraer información de tablas"""
-        query = """
-        SELECT 
-            schemaname,
-            tablename,
-            tableowner,
-            hasindexes,
-            hasrules,
-            hastriggers,
-            rowsecurity
-        FROM pg_tables 
-        WHERE schemaname NOT IN %s
-        ORDER BY schemaname, tablename;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        """Extraer información de tablas, con su tamaño y actividad"""
+        return self._run_catalog_query(db_manager, 'tables')
     
     def extract_columns(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de columnas"""
-        query = """
-        SELECT 
-            table_schema,
-            table_name,
-            column_name,
-            ordinal_position,
-            column_default,
-            is_nullable,
-            data_type,
-            character_maximum_length,
-            numeric_precision,
-            numeric_scale,
-            datetime_precision,
-            udt_name
-        FROM information_schema.columns 
-        WHERE table_schema NOT IN %s
-        ORDER BY table_schema, table_name, ordinal_position;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'columns')
     
     def extract_indexes(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de índices"""
-        query = """
-        SELECT 
-            schemaname,
-            tablename,
-            indexname,
-            indexdef
-        FROM pg_indexes 
-        WHERE schemaname NOT IN %s
-        ORDER BY schemaname, tablename, indexname;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'indexes')
     
     def extract_constraints(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de restricciones"""
-        query = """
-        SELECT 
-            tc.table_schema,
-            tc.table_name,
-            tc.constraint_name,
-            tc.constraint_type,
-            kcu.column_name,
-            ccu.table_schema AS foreign_table_schema,
-            ccu.table_name AS foreign_table_name,
-            ccu.column_name AS foreign_column_name,
-            rc.delete_rule,
-            rc.update_rule,
-            cc.check_clause
-        FROM information_schema.table_constraints tc
-        LEFT JOIN information_schema.key_column_usage kcu 
-            ON tc.constraint_name = kcu.constraint_name
-        LEFT JOIN information_schema.constraint_column_usage ccu 
-            ON ccu.constraint_name = tc.constraint_name
-        LEFT JOIN information_schema.check_constraints cc
-            ON tc.constraint_name = cc.constraint_name
-        LEFT JOIN information_schema.referential_constraints rc 
-            ON tc.constraint_name = rc.constraint_name
-        WHERE tc.table_schema NOT IN %s
-        ORDER BY tc.table_schema, tc.table_name, tc.constraint_name;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'constraints')
     
     def extract_functions(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de funciones"""
-        query = """
-        SELECT 
-            n.nspname as schema_name,
-            p.proname as function_name,
-            pg_get_function_result(p.oid) as return_type,
-            pg_get_function_arguments(p.oid) as arguments,
-            pg_get_functiondef(p.oid) as definition,
-            p.prokind as function_kind
-        FROM pg_proc p
-        LEFT JOIN pg_namespace n ON p.pronamespace = n.oid
-        WHERE n.nspname NOT IN %s
-        ORDER BY n.nspname, p.proname;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'functions')
     
     def extract_triggers(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de triggers"""
-        query = """
-        SELECT 
-            trigger_schema,
-            trigger_name,
-            event_manipulation,
-            event_object_table,
-            action_statement,
-            action_timing,
-            action_orientation
-        FROM information_schema.triggers 
-        WHERE trigger_schema NOT IN %s
-        ORDER BY trigger_schema, event_object_table, trigger_name;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'triggers')
     
     def extract_views(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de vistas"""
-        query = """
-        SELECT 
-            table_schema,
-            table_name,
-            view_definition
-        FROM information_schema.views 
-        WHERE table_schema NOT IN %s
-        ORDER BY table_schema, table_name;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'views')
     
     def extract_sequences(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de secuencias"""
-        query = """
-        SELECT 
-            sequence_schema,
-            sequence_name,
-            data_type,
-            start_value,
-            minimum_value,
-            maximum_value,
-            increment,
-            cycle_option
-        FROM information_schema.sequences 
-        WHERE sequence_schema NOT IN %s
-        ORDER BY sequence_schema, sequence_name;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'sequences')
     
     def extract_types(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de tipos personalizados"""
-        query = """
-        SELECT 
-            n.nspname as schema_name,
-            t.typname as type_name,
-            t.typtype as type_type,
-            t.typcategory as type_category,
-            pg_catalog.format_type(t.oid, NULL) as type_definition
-        FROM pg_type t
-        LEFT JOIN pg_namespace n ON t.typnamespace = n.oid
-        WHERE n.nspname NOT IN %s
-        AND t.typtype IN ('c', 'e', 'd')  -- composite, enum, domain
-        ORDER BY n.nspname, t.typname;
-        """
-        return db_manager.execute_query(query, (tuple(EXCLUDED_SCHEMAS),))
+        return self._run_catalog_query(db_manager, 'types')
     
     def extract_extensions(self, db_manager) -> List[Dict[str, Any]]:
         """Extraer información de extensiones"""
-        query = """
-        SELECT 
-            extname,
-            extversion,
-            extrelocatable,
-            extnamespace::regnamespace as schema_name
-        FROM pg_extension
-        ORDER BY extname;
-        """
-        return db_manager.execute_query(query)
-    
-    def extract_complete_schema(self, db_manager, schema_name: str = "local") -> Dict[str, List[Dict[str, Any]]]:
-        """Extraer esquema completo"""
-        logger.info(f"Extrayendo esquema {schema_name}...")
-        
-        schema = {
-            'tables': self.extract_tables(db_manager),
-            'columns': self.extract_columns(db_manager),
-            'indexes': self.extract_indexes(db_manager),
-            'constraints': self.extract_constraints(db_manager),
-            'functions': self.extract_functions(db_manager),
-            'triggers': self.extract_triggers(db_manager),
-            'views': self.extract_views(db_manager),
-            'sequences': self.extract_sequences(db_manager),
-            'types': self.extract_types(db_manager),
-            'extensions': self.extract_extensions(db_manager)
-        }
+        return self._run_catalog_query(db_manager, 'extensions')
+    
+    def get_catalog_fingerprint(self, db_manager, hash_definitions: bool = False) -> str:
+        """Calcular la huella del catálogo junto con las opciones de extracción"""
+        rows = db_manager.execute_query(FINGERPRINT_QUERY)
+        payload = json.dumps({
+            'catalog': json.loads(rows[0]['fingerprint']),
+            'options': self._cache_options(hash_definitions),
+            'format': SNAPSHOT_FORMAT_VERSION
+        }, sort_keys=True, default=list)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get_source_fingerprint(self, db_manager) -> str:
+        """Huella del catálogo de una base de datos, o del volcado que la reemplaza"""
+        if isinstance(db_manager, str):
+            return self.get_dump_fingerprint(db_manager)
+        return self.get_catalog_fingerprint(db_manager)
+    
+    def extract_complete_schema(self, db_manager, schema_name: str = "local",
+                                mode: Optional[str] = None, use_cache: bool = True,
+                                refresh: bool = False,
+                                hash_definitions: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Extraer esquema completo, reutilizando la caché si el catálogo no cambió.
+        
+        Con hash_definitions las funciones, triggers y vistas traen solo el md5
+        de su definición (ver fetch_definitions). db_manager puede ser también
+        la ruta de un volcado de pg_dump (ver extract_dump_schema)."""
+        if isinstance(db_manager, str):
+            return self.extract_dump_schema(db_manager, schema_name, use_cache, refresh)
+        
+        if self.cache is None or not use_cache:
+            schema = self._extract_complete_schema(db_manager, schema_name, mode, hash_definitions)
+            return self._attach_definition_loader(db_manager, schema_name, schema)
         
-        logger.info(f"Esquema {schema_name} extraído exitosamente")
+        start = time.perf_counter()
+        fingerprint = self.get_catalog_fingerprint(db_manager, hash_definitions)
+        fingerprint_time = time.perf_counter() - start
+        cache_name = f"{schema_name}.hashed" if hash_definitions else schema_name
+        
+        if not refresh:
+            start = time.perf_counter()
+            schema = self.cache.get(cache_name, fingerprint, self._cache_options(hash_definitions))
+            if schema is not None:
+                self.timings[schema_name] = [
+                    {'step': 'fingerprint', 'seconds': fingerprint_time, 'rows': None},
+                    {'step': 'cache', 'seconds': time.perf_counter() - start,
+                     'rows': sum(len(objects) for objects in schema.values())}
+                ]
+                if 'tables' in self.object_types:
+                    start = time.perf_counter()
+                    self._attach_table_stats(db_manager, schema)
+                    self.timings[schema_name].append({'step': 'table stats', 'seconds': time.perf_counter() - start,
+                                                      'rows': len(schema['tables'])})
+                return self._attach_definition_loader(db_manager, schema_name, schema)
+        
+        schema = self._extract_complete_schema(db_manager, schema_name, mode, hash_definitions)
+        self.timings[schema_name].insert(0, {'step': 'fingerprint', 'seconds': fingerprint_time, 'rows': None})
+        self.cache.put(cache_name, fingerprint, self._without_table_stats(schema), self._cache_options(hash_definitions))
+        return self._attach_definition_loader(db_manager, schema_name, schema)
+    
+    def _without_table_stats(self, schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Copia del esquema sin el tamaño ni la actividad de las tablas
+        (TABLE_STATS_FIELDS): ANALYZE, autovacuum y los scans los cambian sin
+        cambiar la huella del catálogo, así que no se guardan en la caché"""
+        if 'tables' not in schema:
+            return schema
+        return dict(schema, tables=[{name: value for name, value in row.items() if name not in TABLE_STATS_FIELDS}
+                                    for row in schema['tables']])
+    
+    def _attach_table_stats(self, db_manager, schema: Dict[str, List[Dict[str, Any]]]):
+        """Completar las tablas de un snapshot en caché con su tamaño y
+        actividad actuales"""
+        current = {(row['schemaname'], row['tablename']): row for row in self.extract_tables(db_manager)}
+        for row in schema.get('tables', []):
+            stats = current.get((row['schemaname'], row['tablename']), {})
+            row.update((name, stats.get(name)) for name in TABLE_STATS_FIELDS)
+    
+    def load_cached_schema(self, db_manager, schema_name: str = "local") -> Optional[Tuple[Dict[str, List[Dict[str, Any]]], float]]:
+        """Último esquema en caché de schema_name extraído con las opciones
+        actuales y la fecha en que se extrajo, sin consultar el catálogo (None
+        si no hay ninguno). Las tablas vienen sin su tamaño ni actividad. Las
+        definiciones de funciones que hagan falta se siguen pidiendo a db_manager."""
+        if self.cache is None:
+            return None
+        entry = self.cache.get_latest(schema_name, self._cache_options())
+        if entry is None:
+            return None
+        return self._attach_definition_loader(db_manager, schema_name, entry['schema']), entry['created_at']
+    
+    def _attach_definition_loader(self, db_manager, schema_name: str,
+                                  schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Reemplazar las definiciones de funciones sin cargar por valores
+        diferidos, que se piden al servidor (y se memorizan) al primer acceso.
+        Se hace después de guardar en la caché, que conserva solo los metadatos."""
+        loader = self._create_definition_loader(db_manager, schema_name)
+        for row in schema.get('functions', []):
+            self._defer_definition(row, loader)
         return schema
     
+    def _create_definition_loader(self, db_manager, schema_name: str) -> DefinitionLoader:
+        """Crear el cargador de definiciones de funciones de un esquema"""
+        loader = DefinitionLoader(db_manager, FUNCTION_DEFINITION_QUERY, "definiciones de funciones")
+        self.definition_loaders[schema_name] = loader
+        return loader
+    
+    def _defer_definition(self, row: Dict[str, Any], loader: DefinitionLoader) -> Dict[str, Any]:
+        """Reemplazar la definición sin cargar de una función por un valor diferido"""
+        if row.get('definition') is None and row.get('function_oid') is not None:
+            row['definition'] = LazyValue(loader, row['function_oid'])
+        return row
+    
+    def build_ordered_query(self, object_type: str) -> str:
+        """Consulta del catálogo ordenada por la clave del objeto con COLLATE "C"
+        (orden por bytes, el mismo con el que Python compara las cadenas)"""
+        order = ", ".join(f'q.{name} COLLATE "C"' for name in OBJECT_KEY_FIELDS[object_type])
+        return f"SELECT * FROM ({CATALOG_QUERIES[object_type]}) q ORDER BY {order}"
+    
+    @contextmanager
+    def open_schema_stream(self, db_manager, schema_name: str = "local"):
+        """Abrir una sesión de snapshot y entregar una función que, para cada
+        tipo de objeto, devuelve un iterador de filas ordenadas por clave
+        leídas con un cursor del servidor (ver SchemaComparator.compare_streams).
+        
+        No usa la caché de snapshots ni admite volcados de pg_dump."""
+        if isinstance(db_manager, str):
+            raise ValueError("La comparación en streaming no admite volcados de pg_dump")
+        loader = self._create_definition_loader(db_manager, schema_name)
+        params = self._catalog_params()
+        
+        with db_manager.snapshot_session() as session:
+            def stream(object_type: str):
+                if object_type not in self.object_types:
+                    return
+                for row in session.iter_query(self.build_ordered_query(object_type), params):
+                    yield self._defer_definition(row, loader) if object_type == 'functions' else row
+            
+            yield stream
+    
+    def load_definitions(self, schema: Dict[str, List[Dict[str, Any]]]):
+        """Cargar todas las definiciones diferidas del esquema (una consulta por lado)"""
+        for object_type, fields in LAZY_FIELDS.items():
+            load_lazy_values(schema.get(object_type, []), fields)
+    
+    def get_dump_fingerprint(self, dump_path: str) -> str:
+        """Calcular la huella de un volcado (sha256 de su contenido) junto con
+        las opciones de extracción"""
+        if os.path.isdir(dump_path):
+            paths = sorted(os.path.join(dump_path, name) for name in os.listdir(dump_path))
+        else:
+            paths = [dump_path]
+        
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        
+        payload = json.dumps({
+            'dump': digest.hexdigest(),
+            'options': self._dump_options(),
+            'format': SNAPSHOT_FORMAT_VERSION
+        }, sort_keys=True, default=list)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def extract_dump_schema(self, dump_path: str, schema_name: str = "local",
+                            use_cache: bool = True, refresh: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Extraer el esquema de un volcado de pg_dump (texto plano, custom,
+        tar o directory) sin conectarse a la base de datos.
+        
+        El resultado tiene la misma forma que la extracción del catálogo, salvo
+        las columnas de las vistas, que el volcado no describe."""
+        logger.info(f"Extrayendo esquema {schema_name} del volcado {dump_path}...")
+        timings = []
+        fingerprint = None
+        cache_name = f"dump.{os.path.basename(os.path.normpath(dump_path))}"
+        
+        if self.cache is not None and use_cache:
+            start = time.perf_counter()
+            fingerprint = self.get_dump_fingerprint(dump_path)
+            timings.append({'step': 'fingerprint', 'seconds': time.perf_counter() - start, 'rows': None})
+            
+            if not refresh:
+                start = time.perf_counter()
+                schema = self.cache.get(cache_name, fingerprint, self._dump_options())
+                if schema is not None:
+                    timings.append({'step': 'cache', 'seconds': time.perf_counter() - start,
+                                    'rows': sum(len(objects) for objects in schema.values())})
+                    self.timings[schema_name] = timings
+                    return schema
+        
+        params = self._catalog_params()
+        # pg_dump no escribe las funciones de las extensiones ni sus agregados
+        params.pop('include_extension_functions')
+        parser = DumpParser(excluded_schemas=list(params.pop('excluded_schemas')),
+                            filters=params, object_types=self.object_types)
+        start = time.perf_counter()
+        sql = parser.read_archive(dump_path)
+        timings.append({'step': 'dump (read)', 'seconds': time.perf_counter() - start, 'rows': None})
+        
+        start = time.perf_counter()
+        schema = parser.parse(sql)
+        timings.append({'step': 'dump (parse)', 'seconds': time.perf_counter() - start,
+                        'rows': sum(len(objects) for objects in schema.values())})
+        self.timings[schema_name] = timings
+        
+        if fingerprint is not None:
+            self.cache.put(cache_name, fingerprint, schema, self._dump_options())
+        logger.info(f"Esquema {schema_name} extraído del volcado en {sum(t['seconds'] for t in timings):.3f}s")
+        return schema
+    
+    def drop_view_columns(self, schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Quitar las columnas de las vistas, para comparar contra un volcado
+        (pg_dump solo guarda la consulta de la vista, no sus columnas)"""
+        views = {(view['table_schema'], view['table_name']) for view in schema.get('views', [])}
+        schema['columns'] = [column for column in schema.get('columns', [])
+                             if (column['table_schema'], column['table_name']) not in views]
+        return schema
+    
+    def _extract_complete_schema(self, db_manager, schema_name: str, mode: Optional[str] = None,
+                                 hash_definitions: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Extraer esquema completo desde la base de datos"""
+        mode = mode or self.mode
+        logger.info(f"Extrayendo esquema {schema_name} (modo {mode})...")
+        
+        if mode == 'json':
+            with db_manager.snapshot_session() as session:
+                timings = [{'step': 'connection', 'seconds': session.connect_time, 'rows': None}]
+                schema = self.extract_json_snapshot(session, timings, hash_definitions)
+        elif mode == 'session':
+            with db_manager.snapshot_session() as session:
+                timings = [{'step': 'connection', 'seconds': session.connect_time, 'rows': None}]
+                schema = self._run_extractors(session, timings, hash_definitions)
+        else:
+            timings = []
+            schema = self._run_extractors(db_manager, timings, hash_definitions)
+        
+        self.timings[schema_name] = timings
+        total = sum(t['seconds'] for t in timings)
+        logger.info(f"Esquema {schema_name} extraído exitosamente en {total:.3f}s")
+        return schema
+    
+    def _run_extractors(self, db_manager, timings: List[Dict[str, Any]],
+                        hash_definitions: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Ejecutar las consultas por tipo de objeto registrando su duración"""
+        schema = {}
+        for object_type in CATALOG_QUERIES:
+            if object_type not in self.object_types:
+                schema[object_type] = []
+                continue
+            start = time.perf_counter()
+            schema[object_type] = self._run_catalog_query(db_manager, object_type, hash_definitions)
+            timings.append({
+                'step': object_type,
+                'seconds': time.perf_counter() - start,
+                'rows': len(schema[object_type])
+            })
+        
+        return schema
+    
+    def build_json_snapshot_query(self, hash_definitions: bool = False) -> str:
+        """Construir la consulta que arma el esquema completo como un único
+        documento JSON en el servidor"""
+        parts = []
+        for object_type in self.object_types:
+            query = CATALOG_QUERIES[object_type]
+            row = self._catalog_row_expression(object_type, hash_definitions)
+            parts.append(
+                f"    '{object_type}', (SELECT COALESCE(jsonb_agg({row}), '[]'::jsonb) FROM ({query}) q)"
+            )
+        return "SELECT jsonb_build_object(\n" + ",\n".join(parts) + "\n)::text AS snapshot"
+    
+    def extract_json_snapshot(self, db_manager, timings: Optional[List[Dict[str, Any]]] = None,
+                              hash_definitions: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Extraer el esquema completo en un solo viaje de ida y vuelta"""
+        start = time.perf_counter()
+        rows = db_manager.execute_query(self.build_json_snapshot_query(hash_definitions), self._catalog_params())
+        document = rows[0]['snapshot']
+        query_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        schema = json.loads(document)
+        for object_type in CATALOG_QUERIES:
+            schema.setdefault(object_type, [])
+        parse_time = time.perf_counter() - start
+        
+        logger.info(f"Snapshot JSON recibido: {len(document.encode('utf-8'))} bytes")
+        if timings is not None:
+            timings.append({
+                'step': 'snapshot (json)',
+                'seconds': query_time,
+                'rows': sum(len(objects) for objects in schema.values())
+            })
+            timings.append({'step': 'parse (json)', 'seconds': parse_time, 'rows': None})
+        return schema
+    
+    def _definition_key(self, obj: Dict[str, Any], object_type: str) -> str:
+        """Clave del objeto, igual a la usada por el comparador"""
+        if object_type == 'functions':
+            return f"{obj['schema_name']}.{obj['function_name']}"
+        elif object_type == 'triggers':
+            return f"{obj['trigger_schema']}.{obj['trigger_name']}"
+        return f"{obj['table_schema']}.{obj['table_name']}"
+    
+    def _definition_digests(self, objects: List[Dict[str, Any]], object_type: str) -> Dict[str, tuple]:
+        """Agrupar los md5 de las definiciones por clave (una clave puede tener
+        varias filas: sobrecargas de funciones o triggers con varios eventos)"""
+        column = DEFINITION_COLUMNS[object_type][0]
+        digests = {}
+        for obj in objects:
+            key = self._definition_key(obj, object_type)
+            digests.setdefault(key, []).append(obj.get(f"{column}_md5") or '')
+        return {key: tuple(sorted(values)) for key, values in digests.items()}
+    
+    def get_differing_definition_keys(self, local_schema: Dict[str, List[Dict[str, Any]]],
+                                      production_schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[str]]:
+        """Claves cuyas definiciones difieren o existen solo en un lado"""
+        differing = {}
+        for object_type in DEFINITION_COLUMNS:
+            local_digests = self._definition_digests(local_schema.get(object_type, []), object_type)
+            production_digests = self._definition_digests(production_schema.get(object_type, []), object_type)
+            differing[object_type] = sorted(
+                key for key in set(local_digests) | set(production_digests)
+                if local_digests.get(key) != production_digests.get(key)
+            )
+        return differing
+    
+    def fetch_definitions(self, db_manager, schema: Dict[str, List[Dict[str, Any]]],
+                          keys: Dict[str, List[str]]) -> int:
+        """Descargar las definiciones completas de las claves indicadas y
+        reemplazar con ellas las filas con solo el hash. Retorna el número de
+        filas descargadas."""
+        fetched_count = 0
+        with db_manager.snapshot_session() as session:
+            for object_type, object_keys in keys.items():
+                if not object_keys:
+                    continue
+                key_expression = DEFINITION_COLUMNS[object_type][1]
+                query = (f"SELECT * FROM ({CATALOG_QUERIES[object_type]}) q "
+                         f"WHERE {key_expression} = ANY(%(definition_keys)s)")
+                params = dict(self._catalog_params(), definition_keys=list(object_keys))
+                
+                fetched = {}
+                for row in session.execute_query(query, params):
+                    fetched.setdefault(self._definition_key(row, object_type), []).append(row)
+                    fetched_count += 1
+                
+                # Reemplazar manteniendo el orden original de las filas
+                objects = []
+                for obj in schema.get(object_type, []):
+                    key = self._definition_key(obj, object_type)
+                    if key not in fetched:
+                        objects.append(obj)
+                    elif fetched[key] is not None:
+                        objects.extend(fetched[key])
+                        fetched[key] = None
+                schema[object_type] = objects
+        
+        return fetched_count
+    
+    def save_schema_snapshot(self, schema: Dict[str, List[Dict[str, Any]]], filename: str,
+                             compress: bool = False) -> str:
+        """Guardar el esquema como snapshot JSON (opcionalmente comprimido con gzip)"""
+        if compress and not filename.endswith('.gz'):
+            filename += '.gz'
+        filepath = os.path.join(OUTPUT_DIR, filename)
+        self.load_definitions(schema)
+        
+        data = json.dumps(schema, ensure_ascii=False, default=str).encode('utf-8')
+        if compress:
+            data = gzip.compress(data)
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        
+        logger.info(f"Snapshot guardado en {filepath} ({len(data)} bytes)")
+        return filepath
+    
+    def load_schema_snapshot(self, filepath: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Cargar un snapshot JSON guardado con save_schema_snapshot"""
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        # Detectar gzip por su número mágico, independientemente de la extensión
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        return json.loads(data.decode('utf-8'))
+    
+    def get_timings_table(self, schema_name: str) -> str:
+        """Obtener tabla con la duración de cada consulta de la última extracción"""
+        timings = self.timings.get(schema_name)
+        if not timings:
+            return f"No hay tiempos registrados para el esquema {schema_name}."
+        
+        headers = ["Consulta", "Filas", "Tiempo (ms)"]
+        rows = [[t['step'], '' if t['rows'] is None else t['rows'], f"{t['seconds'] * 1000:.1f}"]
+                for t in timings]
+        total = sum(t['seconds'] for t in timings)
+        rows.append(["TOTAL", sum(t['rows'] or 0 for t in timings), f"{total * 1000:.1f}"])
+        return tabulate(rows, headers=headers, tablefmt="grid")
+    
+    def extract_fleet(self, targets: Dict[str, Any], max_workers: int = FLEET_MAX_WORKERS,
+                      refresh: bool = False, compress: bool = False) -> List[Dict[str, Any]]:
+        """Extraer en paralelo el esquema de cada destino con nombre y guardar un
+        snapshot por destino en OUTPUT_DIR/FLEET_SNAPSHOT_DIR.
+        
+        Como mucho max_workers extracciones a la vez; el fallo de un destino no
+        detiene a los demás. Retorna un resultado por destino, en orden."""
+        if max_workers < 1:
+            raise ValueError(f"Número de workers no válido: {max_workers}")
+        os.makedirs(os.path.join(OUTPUT_DIR, FLEET_SNAPSHOT_DIR), exist_ok=True)
+        
+        def run(name, db_manager):
+            start = time.perf_counter()
+            try:
+                schema = self.extract_complete_schema(db_manager, name, refresh=refresh)
+                path = self.save_schema_snapshot(
+                    schema, os.path.join(FLEET_SNAPSHOT_DIR, f"{name}_snapshot.json"), compress)
+                return {'name': name, 'status': 'ok', 'path': path, 'error': None,
+                        'objects': sum(len(objects) for objects in schema.values()),
+                        'seconds': time.perf_counter() - start}
+            except Exception as e:
+                logger.error(f"Error extrayendo esquema {name}: {e}")
+                return {'name': name, 'status': 'error', 'path': None, 'error': str(e).strip(),
+                        'objects': None, 'seconds': time.perf_counter() - start}
+            finally:
+                # Las definiciones ya están en el snapshot: no retenerlas en memoria
+                self.definition_loaders.pop(name, None)
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as executor:
+            futures = [executor.submit(run, name, db_manager) for name, db_manager in targets.items()]
+        return [future.result() for future in futures]
+    
+    def get_fleet_snapshot_path(self, name: str) -> Optional[str]:
+        """Ruta del snapshot de un destino guardado por extract_fleet (comprimido
+        o no), o None si todavía no se extrajo"""
+        for filename in (f"{name}_snapshot.json", f"{name}_snapshot.json.gz"):
+            filepath = os.path.join(OUTPUT_DIR, FLEET_SNAPSHOT_DIR, filename)
+            if os.path.exists(filepath):
+                return filepath
+        return None
+    
+    def get_fleet_table(self, results: List[Dict[str, Any]]) -> str:
+        """Obtener tabla con el resultado de extract_fleet"""
+        headers = ["Destino", "Estado", "Objetos", "Tiempo (ms)", "Snapshot / Error"]
+        rows = [[result['name'],
+                 '✅' if result['status'] == 'ok' else '❌',
+                 '' if result['objects'] is None else result['objects'],
+                 f"{result['seconds'] * 1000:.1f}",
+                 result['path'] or result['error']]
+                for result in results]
+        return tabulate(rows, headers=headers, tablefmt="grid")
+    
     def save_schema_to_file(self, schema: Dict[str, List[Dict[str, Any]]], filename: str):
-        """Guardar esquema en archivo SQL"""
+        """Guardar esquema en archivo SQL.
+        
+        Se escribe en una sola pasada con salida en búfer: cada tabla sale como
+        un CREATE TABLE completo, con sus columnas y sus PRIMARY KEY y UNIQUE
+        en línea, en lugar de una sentencia ALTER TABLE por columna."""
         filepath = os.path.join(OUTPUT_DIR, filename)
+        self.load_definitions(schema)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with open(filepath, 'w', encoding='utf-8', buffering=SQL_WRITE_BUFFER_SIZE) as f:
             f.write(f"-- Esquema extraído automáticamente\n")
             f.write(f"-- Fecha: {self._get_current_timestamp()}\n\n")
             
@@ -248,44 +988,47 @@ class SchemaExtractor:
                     f.write(f"CREATE SEQUENCE IF NOT EXISTS {seq['sequence_schema']}.{seq['sequence_name']};\n")
                 f.write("\n")
             
-            # Tablas
+            # Tablas con sus columnas y restricciones PRIMARY KEY / UNIQUE
+            pending = {f"{table['schemaname']}.{table['tablename']}" for table in schema['tables']}
+            inline_constraints = {}
+            for constraint in schema['constraints']:
+                table_key = f"{constraint['table_schema']}.{constraint['table_name']}"
+                if constraint['constraint_type'] in INLINE_CONSTRAINT_TYPES and table_key in pending:
+                    inline_constraints.setdefault(table_key, []).append(constraint)
+            
             if schema['tables']:
                 f.write("-- TABLAS\n")
+                # Las columnas llegan agrupadas por tabla; las de vistas y tablas
+                # foráneas no tienen tabla en pending y se omiten
+                for table_key, columns in groupby(schema['columns'],
+                                                  key=lambda col: f"{col['table_schema']}.{col['table_name']}"):
+                    if table_key in pending:
+                        pending.discard(table_key)
+                        self._write_create_table(f, table_key, columns, inline_constraints.get(table_key, []))
+                # Tablas sin columnas
                 for table in schema['tables']:
-                    f.write(f"-- Tabla: {table['schemaname']}.{table['tablename']}\n")
-                    f.write(f"CREATE TABLE IF NOT EXISTS {table['schemaname']}.{table['tablename']} ();\n")
-                f.write("\n")
-            
-            # Columnas
-            if schema['columns']:
-                f.write("-- COLUMNAS\n")
-                current_table = None
-                for col in schema['columns']:
-                    table_key = f"{col['table_schema']}.{col['table_name']}"
-                    if current_table != table_key:
-                        current_table = table_key
-                        f.write(f"\n-- Columnas de {table_key}\n")
-                    
-                    col_def = self._build_column_definition(col)
-                    f.write(f"ALTER TABLE {table_key} ADD COLUMN IF NOT EXISTS {col['column_name']} {col_def};\n")
+                    table_key = f"{table['schemaname']}.{table['tablename']}"
+                    if table_key in pending:
+                        self._write_create_table(f, table_key, [], inline_constraints.get(table_key, []))
                 f.write("\n")
             
-            # Restricciones
-            if schema['constraints']:
+            # Claves foráneas, al final para no depender del orden de las tablas
+            foreign_keys = [constraint for constraint in schema['constraints']
+                            if constraint['constraint_type'] == 'FOREIGN KEY']
+            if foreign_keys:
                 f.write("-- RESTRICCIONES\n")
-                for constraint in schema['constraints']:
-                    if constraint['constraint_type'] == 'PRIMARY KEY':
-                        f.write(f"ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint['constraint_name']} PRIMARY KEY ({constraint['column_name']});\n")
-                    elif constraint['constraint_type'] == 'FOREIGN KEY':
-                        f.write(f"ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint['constraint_name']} FOREIGN KEY ({constraint['column_name']}) REFERENCES {constraint['foreign_table_schema']}.{constraint['foreign_table_name']}({constraint['foreign_column_name']});\n")
-                    elif constraint['constraint_type'] == 'UNIQUE':
-                        f.write(f"ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint['constraint_name']} UNIQUE ({constraint['column_name']});\n")
+                for constraint in foreign_keys:
+                    f.write(f"ALTER TABLE {constraint['table_schema']}.{constraint['table_name']} ADD CONSTRAINT {constraint['constraint_name']} FOREIGN KEY ({constraint['column_name']}) REFERENCES {constraint['foreign_table_schema']}.{constraint['foreign_table_name']}({constraint['foreign_column_name']});\n")
                 f.write("\n")
             
-            # Índices
-            if schema['indexes']:
+            # Índices (los de PRIMARY KEY y UNIQUE ya se crean con la tabla)
+            constraint_indexes = {(constraint['table_schema'], constraint['constraint_name'])
+                                  for constraints in inline_constraints.values() for constraint in constraints}
+            indexes = [index for index in schema['indexes']
+                       if (index['schemaname'], index['indexname']) not in constraint_indexes]
+            if indexes:
                 f.write("-- ÍNDICES\n")
-                for index in schema['indexes']:
+                for index in indexes:
                     f.write(f"-- Índice: {index['indexname']}\n")
                     f.write(f"{index['indexdef']};\n\n")
             
@@ -312,12 +1055,31 @@ class SchemaExtractor:
         
         logger.info(f"Esquema guardado en {filepath}")
     
+    def _write_create_table(self, f, table_key: str, columns, constraints: List[Dict[str, Any]]):
+        """Escribir el CREATE TABLE completo de una tabla"""
+        lines = [f"    {col['column_name']} {self._build_column_definition(col)}" for col in columns]
+        for constraint in constraints:
+            # pg_get_constraintdef conserva INCLUDE, NULLS NOT DISTINCT, DEFERRABLE...
+            definition = constraint.get('definition') or f"{constraint['constraint_type']} ({constraint['column_name']})"
+            lines.append(f"    CONSTRAINT {constraint['constraint_name']} {definition}")
+        
+        f.write(f"-- Tabla: {table_key}\n")
+        if lines:
+            f.write(f"CREATE TABLE IF NOT EXISTS {table_key} (\n")
+            f.write(",\n".join(lines))
+            f.write("\n);\n\n")
+        else:
+            f.write(f"CREATE TABLE IF NOT EXISTS {table_key} ();\n\n")
+    
     def _build_column_definition(self, col: Dict[str, Any]) -> str:
         """Construir definición de columna"""
         col_def = col['data_type']
         
+        # format_type da el tipo real de los arrays y tipos de usuario
+        if col.get('formatted_type'):
+            col_def = col['formatted_type']
         # Solo agregar precisión/escala para tipos específicos
-        if col['data_type'] in ['character varying', 'varchar', 'char'] and col['character_maximum_length']:
+        elif col['data_type'] in ['character varying', 'varchar', 'char'] and col['character_maximum_length']:
             col_def += f"({col['character_maximum_length']})"
         elif col['data_type'] in ['numeric', 'decimal'] and col['numeric_precision']:
             if col['numeric_scale']:
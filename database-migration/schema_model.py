@@ -0,0 +1,279 @@
+"""
+Modelo compacto de objetos de esquema para comparación
+"""
+import sys
+import hashlib
+from typing import Dict, List, Any, Tuple
+
+# Campos que forman la clave única de cada tipo de objeto
+OBJECT_KEY_FIELDS = {
+    'tables': ('schemaname', 'tablename'),
+    'columns': ('table_schema', 'table_name', 'column_name'),
+    'indexes': ('schemaname', 'indexname'),
+    'constraints': ('table_schema', 'table_name', 'constraint_name'),
+    'functions': ('schema_name', 'function_name'),
+    'triggers': ('trigger_schema', 'trigger_name'),
+    'views': ('table_schema', 'table_name'),
+    'sequences': ('sequence_schema', 'sequence_name'),
+    'types': ('schema_name', 'type_name'),
+    'extensions': ('extname',)
+}
+
+# Campos que determinan si un objeto cambió. Los tipos que no aparecen aquí
+# se comparan por todos sus campos.
+COMPARED_FIELDS = {
+    'columns': ('data_type', 'is_nullable', 'column_default'),
+    'functions': ('definition',),
+    'triggers': ('action_statement', 'action_timing'),
+    'views': ('view_definition',)
+}
+
+# Tamaño y actividad de cada tabla (filas y páginas estimadas, tamaño total,
+# scans, tuplas muertas, último vacuum/analyze). Cambian sin que cambie el
+# esquema, así que sirven para planificar la migración pero no se comparan.
+TABLE_STATS_FIELDS = (
+    'reltuples', 'relpages', 'total_size', 'seq_scan', 'idx_scan', 'n_dead_tup',
+    'last_vacuum', 'last_autovacuum', 'last_analyze', 'last_autoanalyze'
+)
+
+# Campos que no cuentan como cambio en los tipos que se comparan por todos
+# sus campos (los que no aparecen en COMPARED_FIELDS)
+UNCOMPARED_FIELDS = {
+    'tables': TABLE_STATS_FIELDS
+}
+
+# Campos con definiciones SQL que se comparan por su huella normalizada (sin
+# comentarios ni diferencias de formato, ver definition_fingerprints)
+NORMALIZED_FIELDS = {
+    'functions': ('definition',),
+    'triggers': ('action_statement',),
+    'views': ('view_definition',)
+}
+
+# Campos con valores muy repetidos (esquemas, tablas, tipos...) que se
+# internan para que todas las filas compartan la misma cadena
+INTERNED_FIELDS = {
+    'schemaname', 'tablename', 'tableowner', 'table_schema', 'table_name',
+    'data_type', 'udt_name', 'formatted_type', 'is_nullable', 'constraint_type',
+    'foreign_table_schema', 'foreign_table_name', 'delete_rule', 'update_rule',
+    'schema_name', 'trigger_schema', 'event_object_table', 'event_manipulation',
+    'action_timing', 'action_orientation', 'sequence_schema', 'function_kind'
+}
+
+# Campos que pueden llegar sin cargar (LazyValue) y se piden al servidor solo
+# cuando el comparador o el generador los necesitan
+LAZY_FIELDS = {
+    'functions': ('definition',)
+}
+
+_NULL_DIGEST = hashlib.md5(b'').hexdigest()
+
+class LazyValue:
+    """Valor de un campo que se carga al primer acceso (p. ej. la definición
+    de una función). El cargador memoriza los valores ya obtenidos."""
+    
+    __slots__ = ('loader', 'key')
+    
+    def __init__(self, loader, key: Any):
+        self.loader = loader
+        self.key = key
+    
+    def resolve(self) -> Any:
+        return self.loader.load([self.key]).get(self.key)
+    
+    def __repr__(self) -> str:
+        return f"<diferido {self.key}>"
+
+class SchemaObject:
+    """Objeto de esquema con slots, clave internada y huella cacheada.
+    
+    Se comporta como un diccionario de solo lectura (obj['campo'], obj.get,
+    keys, items) para que el comparador y el generador lo usen igual que las
+    filas RealDictRow que reemplaza."""
+    
+    __slots__ = ('key', '_digest', '_fingerprints')
+    object_type = None
+    _fields = ()
+    _compared_fields = ()
+    
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._fields:
+            raise KeyError(name)
+        return self._resolve(name)
+    
+    def get(self, name: str, default: Any = None) -> Any:
+        if name not in self._fields:
+            return default
+        return self._resolve(name)
+    
+    def _resolve(self, name: str) -> Any:
+        """Valor del campo, cargando y memorizando los valores diferidos"""
+        value = getattr(self, name, None)
+        if isinstance(value, LazyValue):
+            value = value.resolve()
+            setattr(self, name, value)
+        return value
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._fields
+    
+    def __iter__(self):
+        return iter(self._fields)
+    
+    def __len__(self) -> int:
+        return len(self._fields)
+    
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+    
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(name, self._resolve(name)) for name in self._fields]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convertir de vuelta a diccionario (p. ej. para serializar a JSON)"""
+        return {name: self._resolve(name) for name in self._fields}
+    
+    def __repr__(self) -> str:
+        return f"<{self.object_type} {self.key}>"
+    
+    def compared_values(self) -> Tuple[Any, ...]:
+        """Valores de los campos que determinan si el objeto cambió"""
+        return tuple(self._resolve(name)
+                     for name in COMPARED_FIELDS.get(self.object_type) or self._compared_fields)
+    
+    def same_source(self, other: 'SchemaObject') -> bool:
+        """Verificar si ambos lados tienen la misma huella de origen
+        (source_md5), con lo que el objeto no cambió y no hace falta cargar
+        sus campos diferidos"""
+        source = getattr(self, 'source_md5', None)
+        return source is not None and source == getattr(other, 'source_md5', None)
+    
+    def is_loaded(self, name: str) -> bool:
+        """Verificar si el campo existe y no está pendiente de cargar"""
+        return name in self._fields and not isinstance(getattr(self, name, None), LazyValue)
+    
+    def get_fingerprint(self, name: str) -> Any:
+        """Huella normalizada ya conocida de un campo (None si no se calculó)"""
+        return self._fingerprints.get(name) if self._fingerprints else None
+    
+    def set_fingerprint(self, name: str, fingerprint: str):
+        """Recordar la huella normalizada de un campo"""
+        if self._fingerprints is None:
+            self._fingerprints = {}
+        self._fingerprints[name] = fingerprint
+    
+    def differs(self, other: 'SchemaObject') -> bool:
+        """Verificar si el objeto cambió respecto a otro con la misma clave.
+        
+        Con la misma estructura de campos se comparan los valores directamente
+        (las cadenas internadas se comparan por identidad); si un lado viene de
+        una extracción hash-first se comparan las huellas."""
+        if self.same_source(other):
+            return False
+        if self._fields is other._fields:
+            return self.compared_values() != other.compared_values()
+        return self.digest != other.digest
+    
+    @property
+    def digest(self) -> str:
+        """Huella md5 de los campos comparados, calculada una sola vez.
+        
+        Cada campo se resume con su propio md5, de modo que una fila extraída
+        en modo hash-first (que trae '<campo>_md5' en lugar del texto) tiene la
+        misma huella que la fila con la definición completa."""
+        if self._digest is None:
+            parts = []
+            for name in COMPARED_FIELDS.get(self.object_type) or sorted(self._compared_fields):
+                if name in self._fields:
+                    value = self._resolve(name)
+                    parts.append(_NULL_DIGEST if value is None
+                                 else hashlib.md5(str(value).encode('utf-8')).hexdigest())
+                elif f"{name}_md5" in self._fields:
+                    parts.append(getattr(self, f"{name}_md5") or _NULL_DIGEST)
+                else:
+                    parts.append(_NULL_DIGEST)
+            self._digest = sys.intern(hashlib.md5("|".join(parts).encode('ascii')).hexdigest())
+        return self._digest
+
+def compared_fields(object_type: str, fields) -> Tuple[str, ...]:
+    """Campos de un objeto que determinan si cambió cuando su tipo se
+    compara por todos los campos"""
+    uncompared = UNCOMPARED_FIELDS.get(object_type, ())
+    return tuple(name for name in fields if name not in uncompared)
+
+# Una clase con slots por combinación de tipo de objeto y campos
+_object_classes = {}
+
+def _get_object_class(object_type: str, fields: Tuple[str, ...]) -> type:
+    """Obtener (o crear) la clase con slots para un tipo y un conjunto de campos"""
+    cls = _object_classes.get((object_type, fields))
+    if cls is None:
+        cls = type(f"{object_type.title()}Object", (SchemaObject,), {
+            '__slots__': fields,
+            'object_type': object_type,
+            '_fields': fields,
+            '_compared_fields': compared_fields(object_type, fields)
+        })
+        _object_classes[(object_type, fields)] = cls
+    return cls
+
+def get_object_key(obj: Dict[str, Any], object_type: str) -> str:
+    """Clave única del objeto dentro de su tipo"""
+    if isinstance(obj, SchemaObject):
+        return obj.key
+    return ".".join(str(obj[name]) for name in OBJECT_KEY_FIELDS[object_type])
+
+def get_sort_key(obj: Dict[str, Any], object_type: str) -> Tuple[str, ...]:
+    """Clave del objeto como tupla, en el mismo orden que las consultas
+    ordenadas con COLLATE "C" (ver SchemaExtractor.build_ordered_query)"""
+    return tuple(str(obj[name]) for name in OBJECT_KEY_FIELDS[object_type])
+
+def make_schema_object(object_type: str, row: Dict[str, Any]) -> SchemaObject:
+    """Crear un objeto compacto a partir de una fila del catálogo"""
+    if isinstance(row, SchemaObject):
+        return row
+    
+    cls = _get_object_class(object_type, tuple(row.keys()))
+    obj = cls.__new__(cls)
+    for name, value in row.items():
+        if name in INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(obj, name, value)
+    obj.key = sys.intern(get_object_key(row, object_type)) if object_type in OBJECT_KEY_FIELDS else str(row)
+    obj._digest = None
+    obj._fingerprints = None
+    return obj
+
+def build_schema_objects(schema: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[SchemaObject]]:
+    """Convertir un esquema de filas (diccionarios) al modelo compacto.
+    Los objetos que ya son SchemaObject se reutilizan sin copiarlos."""
+    return {
+        object_type: [make_schema_object(object_type, row) for row in objects]
+        for object_type, objects in schema.items()
+    }
+
+def load_lazy_values(objects: List[Any], fields: Tuple[str, ...]):
+    """Cargar en lote los valores diferidos de los campos indicados: una sola
+    consulta por cargador en lugar de una por objeto. Acepta objetos del
+    modelo compacto y filas como diccionarios."""
+    pending = {}
+    for obj in objects:
+        for name in fields:
+            value = getattr(obj, name, None) if isinstance(obj, SchemaObject) else obj.get(name)
+            if isinstance(value, LazyValue):
+                pending.setdefault(value.loader, []).append((obj, name, value.key))
+    
+    for loader, entries in pending.items():
+        values = loader.load([key for _, _, key in entries])
+        for obj, name, key in entries:
+            if isinstance(obj, SchemaObject):
+                setattr(obj, name, values.get(key))
+            else:
+                obj[name] = values.get(key)
+
+def schema_to_dicts(schema: Dict[str, List[Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Convertir un esquema del modelo compacto a diccionarios"""
+    return {
+        object_type: [obj.to_dict() if isinstance(obj, SchemaObject) else dict(obj) for obj in objects]
+        for object_type, objects in schema.items()
+    }
@@ -0,0 +1,102 @@
+"""
+Caché en disco de snapshots de esquema indexada por huella del catálogo
+"""
+import os
+import glob
+import gzip
+import json
+import hashlib
+import time
+import logging
+from typing import Dict, List, Any, Optional
+from config import OUTPUT_DIR, SNAPSHOT_CACHE_DIR, SNAPSHOT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+def options_digest(options: Optional[Dict[str, Any]]) -> str:
+    """Huella corta de las opciones de extracción (filtros, tipos de objeto...)
+    con las que se obtuvo un snapshot"""
+    payload = json.dumps(options or {}, sort_keys=True, default=list)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:8]
+
+class SnapshotCache:
+    """Caché de esquemas extraídos, válida mientras no cambie el catálogo.
+    
+    Cada combinación de opciones de extracción tiene sus propios snapshots:
+    uno extraído con filtros no reemplaza ni se confunde con el completo."""
+    
+    def __init__(self, cache_dir: str = os.path.join(OUTPUT_DIR, SNAPSHOT_CACHE_DIR),
+                 ttl: int = SNAPSHOT_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def _get_pattern(self, name: str, options: Optional[Dict[str, Any]]) -> str:
+        """Patrón glob de los snapshots de un nombre y unas opciones"""
+        return os.path.join(self.cache_dir, f"{glob.escape(name)}-{options_digest(options)}-*.json.gz")
+    
+    def _get_path(self, name: str, fingerprint: str, options: Optional[Dict[str, Any]]) -> str:
+        """Ruta del snapshot para un nombre, unas opciones y una huella"""
+        return os.path.join(self.cache_dir, f"{name}-{options_digest(options)}-{fingerprint[:16]}.json.gz")
+    
+    def get(self, name: str, fingerprint: str,
+            options: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Obtener el snapshot si existe para la huella y no ha caducado"""
+        path = self._get_path(name, fingerprint, options)
+        if not os.path.exists(path):
+            return None
+        
+        age = time.time() - os.path.getmtime(path)
+        if age > self.ttl:
+            logger.info(f"Snapshot en caché de {name} caducado ({age:.0f}s > {self.ttl}s)")
+            return None
+        
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry.get('fingerprint') != fingerprint:
+            return None
+        
+        logger.info(f"Usando snapshot en caché de {name} ({path})")
+        return entry['schema']
+    
+    def get_latest(self, name: str, options: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Obtener la última entrada guardada de un nombre con las mismas
+        opciones de extracción, sin comprobar la huella ni la caducidad (puede
+        no reflejar el catálogo actual). None si solo hay snapshots extraídos
+        con otras opciones (p. ej. con filtros), que no están completos."""
+        paths = glob.glob(self._get_pattern(name, options))
+        if not paths:
+            return None
+        path = max(paths, key=os.path.getmtime)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+        if options_digest(entry.get('options')) != options_digest(options):
+            return None
+        
+        logger.info(f"Usando el último snapshot en caché de {name} ({path})")
+        return entry
+    
+    def put(self, name: str, fingerprint: str, schema: Dict[str, List[Dict[str, Any]]],
+            options: Optional[Dict[str, Any]] = None) -> str:
+        """Guardar el snapshot y descartar los anteriores del mismo nombre y
+        las mismas opciones de extracción"""
+        path = self._get_path(name, fingerprint, options)
+        for old_path in glob.glob(self._get_pattern(name, options)):
+            if old_path != path:
+                os.remove(old_path)
+        
+        entry = {
+            'name': name,
+            'fingerprint': fingerprint,
+            'options': options or {},
+            'created_at': time.time(),
+            'schema': schema
+        }
+        # Escribir en un archivo temporal para no dejar snapshots a medias
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        
+        logger.info(f"Snapshot de {name} guardado en caché ({path})")
+        return path
@@ -0,0 +1,8 @@
+"""
+Configuración común de las pruebas: los módulos de la herramienta están en
+el directorio padre y se importan por su nombre, igual que desde main.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
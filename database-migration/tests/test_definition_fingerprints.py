@@ -0,0 +1,42 @@
+"""
+Pruebas de las huellas normalizadas de definiciones
+"""
+from definition_fingerprints import normalize_definition, definition_fingerprint, FingerprintStore
+
+def test_normalize_ignores_formatting_and_comments():
+    a = "CREATE FUNCTION f() RETURNS int AS $body$\nBEGIN\n    -- suma\n    RETURN 1;\nEND;\n$body$ LANGUAGE plpgsql;"
+    b = 'create function f() returns INT as $$ begin /* suma */ return 1; end; $$ language "plpgsql"'
+    assert normalize_definition(a) == normalize_definition(b)
+    assert definition_fingerprint(a) == definition_fingerprint(b)
+
+def test_normalize_unifies_execute_procedure():
+    assert (normalize_definition("EXECUTE PROCEDURE registrar()") ==
+            normalize_definition("EXECUTE FUNCTION registrar()"))
+
+def test_normalize_keeps_literals_and_quoted_identifiers():
+    assert normalize_definition("SELECT 'Hola  Mundo'") != normalize_definition("SELECT 'hola mundo'")
+    assert normalize_definition('SELECT "Total" FROM t') != normalize_definition('SELECT total FROM t')
+
+def test_store_persists_fingerprints(tmp_path):
+    path = str(tmp_path / "fingerprints.json.gz")
+    store = FingerprintStore(path)
+    fingerprint = store.fingerprint("SELECT 1")
+    assert store.fingerprint("SELECT 1") == fingerprint
+    assert store.computed == 1
+    store.save()
+    
+    reloaded = FingerprintStore(path)
+    assert reloaded.fingerprint("SELECT 1") == fingerprint
+    assert reloaded.computed == 0
+
+def test_store_keeps_most_recent_entries(tmp_path):
+    path = str(tmp_path / "fingerprints.json.gz")
+    store = FingerprintStore(path, max_entries=2)
+    for text in ("SELECT 1", "SELECT 2", "SELECT 3"):
+        store.fingerprint(text)
+    store.save()
+    
+    reloaded = FingerprintStore(path)
+    reloaded.fingerprint("SELECT 1")
+    reloaded.fingerprint("SELECT 3")
+    assert reloaded.computed == 1
@@ -0,0 +1,79 @@
+"""
+Pruebas de las diferencias en NDJSON
+"""
+import json
+import pytest
+from diff_stream import DiffWriter, read_diff_file, read_diff_header
+from dump_parser import DumpParser
+from schema_comparator import SchemaComparator
+
+PRODUCTION = """
+CREATE TABLE public.ventas (
+    id_venta integer NOT NULL,
+    total numeric(10,2)
+);
+CREATE TABLE public.cajas (
+    id_caja integer NOT NULL
+);
+"""
+
+LOCAL = """
+CREATE TABLE public.ventas (
+    id_venta integer NOT NULL,
+    total numeric(10,2) NOT NULL,
+    propina numeric(10,2) DEFAULT 0
+);
+CREATE INDEX ventas_total_idx ON public.ventas USING btree (total);
+"""
+
+def _schema(sql):
+    return DumpParser(search_path=['public']).parse(sql)
+
+def _as_dicts(differences):
+    """Diferencias como diccionarios simples, para compararlas"""
+    result = {}
+    for object_type, changes in differences.items():
+        for change_type, objects in changes.items():
+            for obj in objects:
+                if change_type == 'modified':
+                    entry = {side: dict(obj[side]) for side in ('local', 'production')}
+                else:
+                    entry = dict(obj)
+                result.setdefault((object_type, change_type), []).append(entry)
+    return result
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "schema_diff.ndjson")
+    with DiffWriter(path, {'fingerprints': {'local': 'a', 'production': 'b'}}) as writer:
+        differences = SchemaComparator().compare_schemas(_schema(LOCAL), _schema(PRODUCTION), writer)
+    
+    header, loaded = read_diff_file(path)
+    assert header['fingerprints'] == {'local': 'a', 'production': 'b'}
+    assert read_diff_header(path)['fingerprints'] == header['fingerprints']
+    assert _as_dicts(loaded) == _as_dicts(differences)
+    
+    changes = _as_dicts(loaded)
+    assert [c['column_name'] for c in changes[('columns', 'added')]] == ['propina']
+    assert [c['local']['column_name'] for c in changes[('columns', 'modified')]] == ['total']
+    assert [t['tablename'] for t in changes[('tables', 'removed')]] == ['cajas']
+    assert [i['indexname'] for i in changes[('indexes', 'added')]] == ['ventas_total_idx']
+
+def test_failed_comparison_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "schema_diff.ndjson")
+    with DiffWriter(path) as writer:
+        writer.write('tables', 'added', {'schemaname': 'public', 'tablename': 'ventas'})
+    
+    with pytest.raises(RuntimeError):
+        with DiffWriter(path) as writer:
+            writer.write('tables', 'added', {'schemaname': 'public', 'tablename': 'cajas'})
+            raise RuntimeError("comparación interrumpida")
+    
+    _, loaded = read_diff_file(path)
+    assert [t['tablename'] for t in loaded['tables']['added']] == ['ventas']
+    assert not (tmp_path / "schema_diff.ndjson.tmp").exists()
+
+def test_rejects_other_formats(tmp_path):
+    path = tmp_path / "otro.ndjson"
+    path.write_text(json.dumps({'format': 'schema-diff', 'version': 0}) + "\n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        read_diff_file(str(path))
@@ -0,0 +1,122 @@
+"""
+Pruebas del intérprete de volcados de pg_dump
+"""
+import pytest
+from dump_parser import (DumpParser, split_top_level, split_qualified_name, unquote_identifier,
+                         like_to_regex, find_closing_paren)
+
+DUMP = """
+SET search_path = '';
+
+CREATE TYPE public.estado_t AS ENUM (
+    'a',
+    'b'
+);
+
+CREATE TABLE public.mesas (
+    id_mesa integer NOT NULL,
+    numero integer,
+    tags character varying(20)[],
+    CONSTRAINT mesas_numero_check CHECK ((numero > 0))
+);
+
+CREATE TABLE public.ventas (
+    id_venta integer NOT NULL,
+    id_mesa integer,
+    estado public.estado_t DEFAULT 'a'::public.estado_t,
+    total numeric(10,2)
+);
+
+ALTER TABLE ONLY public.mesas
+    ADD CONSTRAINT mesas_pkey PRIMARY KEY (id_mesa);
+
+ALTER TABLE ONLY public.ventas
+    ADD CONSTRAINT ventas_mesa_fk FOREIGN KEY (id_mesa) REFERENCES public.mesas(id_mesa) ON DELETE CASCADE;
+
+CREATE INDEX ventas_mesa_idx ON public.ventas USING btree (id_mesa);
+"""
+
+@pytest.fixture(scope="module")
+def schema():
+    return DumpParser(search_path=['public']).parse(DUMP)
+
+def _by_name(rows, field):
+    return {row[field]: row for row in rows}
+
+def test_tables(schema):
+    assert [(t['schemaname'], t['tablename']) for t in schema['tables']] == [('public', 'mesas'), ('public', 'ventas')]
+
+def test_columns_like_catalog(schema):
+    columns = {(c['table_name'], c['column_name']): c for c in schema['columns']}
+    
+    id_mesa = columns[('mesas', 'id_mesa')]
+    assert id_mesa['is_nullable'] == 'NO'
+    assert id_mesa['ordinal_position'] == 1
+    assert id_mesa['udt_name'] == 'int4'
+    
+    tags = columns[('mesas', 'tags')]
+    assert tags['data_type'] == 'ARRAY'
+    assert tags['udt_name'] == '_varchar'
+    assert tags['formatted_type'] == 'character varying(20)[]'
+    
+    estado = columns[('ventas', 'estado')]
+    assert estado['formatted_type'] == 'estado_t'
+    assert estado['column_default'] == "'a'::estado_t"
+    
+    total = columns[('ventas', 'total')]
+    assert (total['numeric_precision'], total['numeric_scale']) == (10, 2)
+
+def test_constraints(schema):
+    constraints = _by_name(schema['constraints'], 'constraint_name')
+    
+    check = constraints['mesas_numero_check']
+    assert check['constraint_type'] == 'CHECK'
+    assert check['check_clause'] == '(numero > 0)'
+    assert check['column_names'] == ['numero']
+    
+    assert constraints['mesas_pkey']['constraint_type'] == 'PRIMARY KEY'
+    assert constraints['mesas_pkey']['definition'] == 'PRIMARY KEY (id_mesa)'
+    
+    fk = constraints['ventas_mesa_fk']
+    assert fk['constraint_type'] == 'FOREIGN KEY'
+    assert (fk['foreign_table_schema'], fk['foreign_table_name']) == ('public', 'mesas')
+    assert fk['foreign_column_names'] == ['id_mesa']
+    assert fk['delete_rule'] == 'CASCADE'
+    assert fk['update_rule'] == 'NO ACTION'
+    # Sin el esquema del search_path, como pg_get_constraintdef
+    assert fk['definition'] == 'FOREIGN KEY (id_mesa) REFERENCES mesas(id_mesa) ON DELETE CASCADE'
+
+def test_indexes_include_constraint_indexes(schema):
+    indexes = _by_name(schema['indexes'], 'indexname')
+    assert indexes['mesas_pkey']['indexdef'] == 'CREATE UNIQUE INDEX mesas_pkey ON public.mesas USING btree (id_mesa)'
+    assert indexes['ventas_mesa_idx']['tablename'] == 'ventas'
+
+def test_types(schema):
+    types = _by_name(schema['types'], 'type_name')
+    assert types['estado_t']['type_type'] == 'e'
+    # Cada tabla tiene además su tipo compuesto
+    assert types['mesas']['type_type'] == 'c'
+
+def test_filters():
+    schema = DumpParser(search_path=['public'], filters={'include_tables': ['mes%']}).parse(DUMP)
+    assert [t['tablename'] for t in schema['tables']] == ['mesas']
+    assert {c['table_name'] for c in schema['columns']} == {'mesas'}
+
+def test_split_statements_ignores_comments_and_copy_data():
+    sql = ("-- comentario; con punto y coma\n"
+           "CREATE TABLE public.t (a text DEFAULT ';');\n"
+           "COPY public.t (a) FROM stdin;\nx;y\n\\.\n"
+           "CREATE INDEX t_idx ON public.t USING btree (a);\n")
+    assert DumpParser().split_statements(sql) == [
+        "CREATE TABLE public.t (a text DEFAULT ';')",
+        "CREATE INDEX t_idx ON public.t USING btree (a)"
+    ]
+
+def test_helpers():
+    assert split_top_level("a, f(b, c), 'x,y'") == ['a', 'f(b, c)', "'x,y'"]
+    assert find_closing_paren("f(a, (b)) + 1", 1) == 8
+    assert split_qualified_name('"Mi Esq".tabla') == ('Mi Esq', 'tabla')
+    assert split_qualified_name('tabla') == (None, 'tabla')
+    assert unquote_identifier('"A""b"') == 'A"b'
+    assert like_to_regex('ven%_x').match('ventas_x')
+    assert not like_to_regex('ven%').match('mesas')
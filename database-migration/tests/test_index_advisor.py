@@ -0,0 +1,83 @@
+"""
+Pruebas del asesor de índices (sin conexión: índices y restricciones escritos a mano)
+"""
+from index_advisor import IndexAdvisor
+
+# Clase de operadores, collation y opciones de una columna btree por defecto
+DEFAULT_OPTIONS = '1978 0 0'
+
+def _index(name, columns, scans=0, **kw):
+    index = {
+        'schemaname': 'public', 'tablename': 'ventas', 'indexname': name,
+        'indexdef': f"CREATE INDEX {name} ON public.ventas USING btree ({', '.join(columns)})",
+        'idx_scan': scans, 'index_size': 8192, 'index_method': 'btree',
+        'is_unique': False, 'is_primary': False, 'is_valid': True, 'is_partial': False,
+        'backs_constraint': False, 'column_names': list(columns),
+        'column_options': [DEFAULT_OPTIONS] * len(columns)
+    }
+    index.update(kw)
+    return index
+
+def _fk(name, columns):
+    return {'table_schema': 'public', 'table_name': 'ventas', 'constraint_name': name,
+            'constraint_type': 'FOREIGN KEY', 'column_names': list(columns),
+            'foreign_table_schema': 'public', 'foreign_table_name': 'mesas'}
+
+def _redundant(indexes):
+    return {index['indexname']: (index['reason'], index['covered_by'])
+            for index in IndexAdvisor(None)._find_redundant_indexes({('public', 'ventas'): indexes})}
+
+def test_exact_duplicate_keeps_the_most_used():
+    assert _redundant([_index('a_idx', ['fecha'], scans=1), _index('b_idx', ['fecha'], scans=10)]) == {
+        'a_idx': ('duplicado', 'b_idx')
+    }
+
+def test_duplicate_of_a_constraint_index():
+    pkey = _index('ventas_pkey', ['id_venta'], is_unique=True, is_primary=True, backs_constraint=True,
+                  indexdef="CREATE UNIQUE INDEX ventas_pkey ON public.ventas USING btree (id_venta)")
+    copy = _index('ventas_id_idx', ['id_venta'], scans=100, is_unique=True,
+                  indexdef="CREATE UNIQUE INDEX ventas_id_idx ON public.ventas USING btree (id_venta)")
+    assert _redundant([copy, pkey]) == {'ventas_id_idx': ('duplicado', 'ventas_pkey')}
+
+def test_prefix_is_redundant():
+    assert _redundant([_index('fecha_idx', ['fecha']), _index('fecha_mesa_idx', ['fecha', 'id_mesa'])]) == {
+        'fecha_idx': ('prefijo', 'fecha_mesa_idx')
+    }
+
+def test_chain_is_covered_by_the_index_that_remains():
+    assert _redundant([_index('a_idx', ['a']), _index('ab_idx', ['a', 'b']), _index('abc_idx', ['a', 'b', 'c'])]) == {
+        'a_idx': ('prefijo', 'abc_idx'),
+        'ab_idx': ('prefijo', 'abc_idx')
+    }
+
+def test_prefix_needs_same_operator_class_collation_and_order():
+    composite = _index('ab_idx', ['a', 'b'], column_options=['3126 100 0', DEFAULT_OPTIONS])
+    # text_pattern_ops, COLLATE "C" y DESC sirven a otras consultas
+    for options in ('4217 100 0', '3126 950 0', '3126 100 3'):
+        assert _redundant([_index('a_idx', ['a'], column_options=[options]), composite]) == {}
+    assert _redundant([_index('a_idx', ['a'], column_options=['3126 100 0']), composite]) == {
+        'a_idx': ('prefijo', 'ab_idx')
+    }
+
+def test_prefix_exceptions():
+    composite = _index('fecha_mesa_idx', ['fecha', 'id_mesa'])
+    assert _redundant([_index('fecha_idx', ['fecha'], is_unique=True), composite]) == {}
+    assert _redundant([_index('fecha_idx', ['fecha'], is_partial=True), composite]) == {}
+    assert _redundant([_index('fecha_idx', ['fecha']), dict(composite, index_method='brin')]) == {}
+    # Otro orden de columnas no sirve a las mismas consultas
+    assert _redundant([_index('mesa_idx', ['id_mesa']), composite]) == {}
+
+def test_missing_fk_index():
+    advisor = IndexAdvisor(None)
+    by_table = {('public', 'ventas'): [_index('ventas_mesa_fecha_idx', ['id_mesa', 'fecha'])]}
+    missing = advisor._find_missing_fk_indexes(
+        [_fk('ventas_mesa_fk', ['id_mesa']), _fk('ventas_cliente_fk', ['id_cliente'])], by_table, {})
+    assert [(item['constraint_name'], item['indexname']) for item in missing] == [
+        ('ventas_cliente_fk', 'idx_ventas_id_cliente')
+    ]
+
+def test_unused_keeps_the_only_fk_index():
+    advisor = IndexAdvisor(None)
+    by_table = {('public', 'ventas'): [_index('mesa_idx', ['id_mesa']), _index('notas_idx', ['notas'])]}
+    unused = advisor._find_unused_indexes([_fk('ventas_mesa_fk', ['id_mesa'])], by_table, [])
+    assert [index['indexname'] for index in unused] == ['notas_idx']
@@ -0,0 +1,115 @@
+"""
+Pruebas del SQL que escribe el generador de migraciones
+"""
+import pytest
+from migration_generator import MigrationGenerator
+from migration_planner import MigrationPlanner
+from dump_parser import DumpParser
+
+LOCAL = """
+CREATE TYPE public.estado_t AS ENUM ('a', 'b');
+CREATE TABLE public.mesas (
+    id_mesa integer NOT NULL
+);
+CREATE TABLE public.notas (
+    id integer NOT NULL,
+    id_mesa integer,
+    etiquetas text[],
+    estado public.estado_t DEFAULT 'a'::public.estado_t,
+    precio numeric(10,2),
+    CONSTRAINT notas_precio_check CHECK ((precio >= (0)::numeric))
+);
+ALTER TABLE ONLY public.mesas
+    ADD CONSTRAINT mesas_pkey PRIMARY KEY (id_mesa);
+ALTER TABLE ONLY public.notas
+    ADD CONSTRAINT notas_pkey PRIMARY KEY (id);
+ALTER TABLE ONLY public.notas
+    ADD CONSTRAINT notas_mesa_fk FOREIGN KEY (id_mesa) REFERENCES public.mesas(id_mesa) ON DELETE CASCADE;
+CREATE INDEX notas_estado_idx ON public.notas USING btree (estado);
+"""
+
+PRODUCTION = """
+CREATE TABLE public.mesas (
+    id_mesa integer NOT NULL
+);
+ALTER TABLE ONLY public.mesas
+    ADD CONSTRAINT mesas_pkey PRIMARY KEY (id_mesa);
+"""
+
+@pytest.fixture
+def generator():
+    return MigrationGenerator(MigrationPlanner(two_phase_constraints=True))
+
+@pytest.fixture
+def script(generator):
+    parser = DumpParser(search_path=['public'])
+    local, production = parser.parse(LOCAL), parser.parse(PRODUCTION)
+    differences = {object_type: {'added': [obj for obj in local[object_type] if obj not in production[object_type]]}
+                   for object_type in ('tables', 'columns', 'constraints', 'indexes')}
+    stats = [dict(schemaname='public', tablename='mesas', reltuples=10, relpages=1, total_size=None)]
+    return generator.generate_migration_script(differences, stats)
+
+def test_create_table_is_complete(script):
+    create = script[script.index("CREATE TABLE IF NOT EXISTS public.notas ("):]
+    create = create[:create.index(");") + 2]
+    assert create.splitlines() == [
+        "CREATE TABLE IF NOT EXISTS public.notas (",
+        "    id integer NOT NULL,",
+        "    id_mesa integer,",
+        "    etiquetas text[],",
+        "    estado estado_t DEFAULT 'a'::estado_t,",
+        "    precio numeric(10,2),",
+        "    CONSTRAINT notas_pkey PRIMARY KEY (id),",
+        "    CONSTRAINT notas_precio_check CHECK ((precio >= (0)::numeric))",
+        ");"
+    ]
+
+def test_foreign_key_keeps_referential_actions(script):
+    assert ("ALTER TABLE public.notas ADD CONSTRAINT notas_mesa_fk "
+            "FOREIGN KEY (id_mesa) REFERENCES mesas(id_mesa) ON DELETE CASCADE;") in script
+
+def test_inline_indexes_are_not_repeated(script):
+    assert "CREATE UNIQUE INDEX notas_pkey" not in script
+    assert "CREATE INDEX notas_estado_idx ON public.notas USING btree (estado);" in script
+
+def test_column_definition(generator):
+    column = {'data_type': 'ARRAY', 'formatted_type': 'character varying(20)[]', 'column_default': None,
+              'is_nullable': 'NO'}
+    assert generator._build_column_definition(column) == "character varying(20)[] NOT NULL"
+    # Sin format_type (p. ej. diferencias antiguas) se arma desde data_type
+    column = {'data_type': 'character varying', 'character_maximum_length': 50, 'column_default': "'x'::text",
+              'is_nullable': 'YES'}
+    assert generator._build_column_definition(column) == "character varying(50) DEFAULT 'x'::text"
+    column = {'data_type': 'numeric', 'numeric_precision': 10, 'numeric_scale': 2, 'column_default': None,
+              'is_nullable': 'YES'}
+    assert generator._build_column_definition(column) == "numeric(10,2)"
+
+def test_constraint_definition(generator):
+    constraint = {'constraint_type': 'FOREIGN KEY', 'column_name': 'id_mesa', 'foreign_table_schema': 'public',
+                  'foreign_table_name': 'mesas', 'foreign_column_name': 'id_mesa',
+                  'definition': 'FOREIGN KEY (id_mesa) REFERENCES mesas(id_mesa) ON UPDATE CASCADE NOT VALID'}
+    # NOT VALID lo decide el planificador
+    assert generator._constraint_definition(constraint) == \
+        'FOREIGN KEY (id_mesa) REFERENCES mesas(id_mesa) ON UPDATE CASCADE'
+    del constraint['definition']
+    assert generator._constraint_definition(constraint) == 'FOREIGN KEY (id_mesa) REFERENCES public.mesas(id_mesa)'
+    assert generator._constraint_definition({'constraint_type': 'CHECK', 'check_clause': None}) is None
+
+def test_build_alter_table(generator):
+    assert generator._build_alter_table('public.mesas', [
+        ("ADD COLUMN IF NOT EXISTS zona text", None),
+        ("ALTER COLUMN numero SET NOT NULL", None)
+    ]) == [
+        "ALTER TABLE public.mesas",
+        "    ADD COLUMN IF NOT EXISTS zona text,",
+        "    ALTER COLUMN numero SET NOT NULL;"
+    ]
+    
+    sql = "\n".join(generator._build_alter_table('public.mesas', [
+        ("ADD COLUMN IF NOT EXISTS zona text", None),
+        ("ADD CONSTRAINT mesas_zona_check CHECK (zona <> '')", 'mesas_zona_check')
+    ]))
+    assert "IF NOT EXISTS (SELECT 1 FROM information_schema.table_constraints WHERE constraint_name = 'mesas_zona_check'" in sql
+    # Las comillas del subcomando se duplican dentro del literal
+    assert "array_append(clauses, 'ADD CONSTRAINT mesas_zona_check CHECK (zona <> '''')');" in sql
+    assert "EXECUTE 'ALTER TABLE public.mesas ' || array_to_string(clauses, ', ');" in sql
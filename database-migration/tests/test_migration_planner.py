@@ -0,0 +1,170 @@
+"""
+Pruebas del plan de migración por bloqueos (diferencias y estadísticas
+escritas a mano, sin conexión)
+"""
+from migration_generator import MigrationGenerator
+from migration_planner import (MigrationPlanner, PHASE_ONLINE, PHASE_CONCURRENT, PHASE_VALIDATE,
+                               PHASE_MAINTENANCE)
+
+# 100000 páginas de 8 kB: unos 780 MB
+LARGE = {'reltuples': 5e6, 'relpages': 100000}
+# 5000 páginas: unos 40 MB, ~1.3 s por índice a 30 MB/s
+MEDIUM = {'reltuples': 1e5, 'relpages': 5000}
+SMALL = {'reltuples': 100, 'relpages': 1}
+
+def _stats(**tables):
+    return [dict(schemaname='public', tablename=name, total_size=None, **size) for name, size in tables.items()]
+
+def _column(table, name, data_type='integer', nullable='YES', default=None):
+    return {'table_schema': 'public', 'table_name': table, 'column_name': name, 'data_type': data_type,
+            'is_nullable': nullable, 'column_default': default, 'ordinal_position': 9}
+
+def _constraint(table, name, constraint_type, columns, **kw):
+    constraint = {'table_schema': 'public', 'table_name': table, 'constraint_name': name,
+                  'constraint_type': constraint_type, 'column_names': columns, 'column_name': ', '.join(columns)}
+    constraint.update(kw)
+    return constraint
+
+def _check(table, name, column, clause):
+    return _constraint(table, name, 'CHECK', [column], check_clause=clause)
+
+def _foreign_key(table, name, column, foreign_table, foreign_column):
+    return _constraint(table, name, 'FOREIGN KEY', [column], foreign_table_schema='public',
+                       foreign_table_name=foreign_table, foreign_column_names=[foreign_column],
+                       foreign_column_name=foreign_column)
+
+def _index(table, name, columns):
+    return {'schemaname': 'public', 'tablename': table, 'indexname': name,
+            'indexdef': f"CREATE INDEX {name} ON public.{table} USING btree ({', '.join(columns)})"}
+
+def _plan(differences, stats, **planner_options):
+    """Generar la migración con los límites de la configuración por defecto,
+    independientes de config.py"""
+    options = dict(hot_tables=['ventas'], online_max_seconds=2, hot_online_max_seconds=0.2,
+                   two_phase_constraints=True)
+    options.update(planner_options)
+    generator = MigrationGenerator(MigrationPlanner(**options))
+    generator.generate_migration_script(differences, stats)
+    return generator
+
+def _by_object(generator):
+    """Sentencias planificadas por nombre de su objeto, en orden"""
+    planned = {}
+    for statement in generator.statements:
+        obj = statement.get('object') or {}
+        name = obj.get('constraint_name') or obj.get('indexname') or obj.get('column_name')
+        planned.setdefault(name, []).append(statement)
+    return planned
+
+def test_small_table_stays_online():
+    generator = _plan({
+        'constraints': {'added': [_check('mesas', 'mesas_numero_check', 'numero', 'numero > 0')]},
+        'indexes': {'added': [_index('mesas', 'mesas_numero_idx', ['numero'])]}
+    }, _stats(mesas=SMALL))
+    assert {statement['phase'] for statement in generator.statements} == {PHASE_ONLINE}
+    assert generator.concurrent_script is None
+    assert generator.maintenance_script is None
+
+def test_large_hot_table():
+    generator = _plan({
+        'constraints': {'added': [
+            _constraint('ventas', 'ventas_codigo_key', 'UNIQUE', ['codigo']),
+            _check('ventas', 'ventas_total_check', 'total', 'total >= 0'),
+            _foreign_key('ventas', 'ventas_mesa_fk', 'id_mesa', 'mesas', 'id_mesa')
+        ]},
+        'indexes': {'added': [_index('ventas', 'ventas_fecha_idx', ['fecha'])]}
+    }, _stats(ventas=LARGE, mesas=SMALL))
+    planned = _by_object(generator)
+    
+    # UNIQUE construye su índice bajo ACCESS EXCLUSIVE
+    assert [s['phase'] for s in planned['ventas_codigo_key']] == [PHASE_MAINTENANCE]
+    
+    # CHECK y FK: NOT VALID en línea, validación aparte
+    for name in ('ventas_total_check', 'ventas_mesa_fk'):
+        added, validation = planned[name]
+        assert (added['phase'], added['work']) == (PHASE_ONLINE, 'not_valid')
+        assert 'NOT VALID' in "\n".join(added['sql'])
+        assert (validation['phase'], validation['lock']) == (PHASE_VALIDATE, 'SHARE UPDATE EXCLUSIVE')
+        assert validation['sql'] == [f"ALTER TABLE public.ventas VALIDATE CONSTRAINT {name};"]
+    
+    index, = planned['ventas_fecha_idx']
+    assert index['phase'] == PHASE_CONCURRENT
+    assert 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ventas_fecha_idx' in "\n".join(index['sql'])
+    assert 'ventas_fecha_idx' in generator.concurrent_script
+    assert 'VALIDATE CONSTRAINT ventas_mesa_fk' in generator.validate_script
+
+def test_without_two_phase_constraints():
+    generator = _plan({
+        'constraints': {'added': [_check('ventas', 'ventas_total_check', 'total', 'total >= 0')]}
+    }, _stats(ventas=LARGE), two_phase_constraints=False)
+    statement, = generator.statements
+    assert statement['phase'] == PHASE_MAINTENANCE
+    assert generator.validate_script is None
+
+def test_unknown_table_size_is_not_online():
+    generator = _plan({
+        'constraints': {'added': [_constraint('ventas', 'ventas_codigo_key', 'UNIQUE', ['codigo'])]},
+        'indexes': {'added': [_index('ventas', 'ventas_fecha_idx', ['fecha'])]}
+    }, None)
+    planned = _by_object(generator)
+    assert planned['ventas_codigo_key'][0]['estimate'] is None
+    assert planned['ventas_codigo_key'][0]['phase'] == PHASE_MAINTENANCE
+    assert planned['ventas_fecha_idx'][0]['phase'] == PHASE_CONCURRENT
+
+def test_not_null_in_two_phases():
+    column = _column('ventas', 'total', nullable='NO')
+    generator = _plan({
+        'columns': {'modified': [{'local': column, 'production': dict(column, is_nullable='YES')}]}
+    }, _stats(ventas=LARGE))
+    check, validation, finish = generator.statements
+    assert (check['phase'], check['work']) == (PHASE_ONLINE, 'not_valid')
+    assert 'CHECK (total IS NOT NULL) NOT VALID' in "\n".join(check['sql'])
+    assert (validation['phase'], validation['lock']) == (PHASE_VALIDATE, 'SHARE UPDATE EXCLUSIVE')
+    # SET NOT NULL no recorre la tabla tras la validación, pero bloquea todo
+    assert (finish['phase'], finish['lock'], finish['work']) == (PHASE_VALIDATE, 'ACCESS EXCLUSIVE', 'metadata')
+    assert finish['sql'][0] == "ALTER TABLE public.ventas ALTER COLUMN total SET NOT NULL;"
+
+def test_statements_on_deferred_objects_are_deferred():
+    generator = _plan({
+        'columns': {'added': [_column('ventas', 'folio', default="nextval('ventas_folio_seq'::regclass)")]},
+        'constraints': {'added': [
+            _check('ventas', 'ventas_folio_check', 'folio', 'folio > 0'),
+            _check('ventas', 'ventas_total_check', 'total', 'total >= 0')
+        ]},
+        'indexes': {'added': [_index('ventas', 'ventas_folio_idx', ['folio']),
+                              _index('ventas', 'ventas_fecha_idx', ['fecha'])]}
+    }, _stats(ventas=LARGE))
+    planned = _by_object(generator)
+    phases = {name: [statement['phase'] for statement in statements] for name, statements in planned.items()}
+    
+    # Una DEFAULT volátil reescribe la tabla; el CHECK sobre la columna nueva
+    # espera a que exista y se combina con ella
+    maintenance = "\n".join("\n".join(statement['sql']) for statement in generator.planner.get_phase(PHASE_MAINTENANCE))
+    assert 'ADD COLUMN IF NOT EXISTS folio' in maintenance
+    assert 'ADD CONSTRAINT ventas_folio_check' in maintenance
+    assert phases['ventas_folio_idx'] == [PHASE_MAINTENANCE]
+    # Lo demás de la tabla no
+    assert phases['ventas_total_check'] == [PHASE_ONLINE, PHASE_VALIDATE]
+    assert phases['ventas_fecha_idx'] == [PHASE_CONCURRENT]
+
+def test_coalesce_same_table():
+    generator = _plan({
+        'columns': {'added': [_column('mesas', 'zona'), _column('mesas', 'piso')]},
+        'constraints': {'added': [_check('mesas', 'mesas_piso_check', 'piso', 'piso >= 0')]}
+    }, _stats(mesas=SMALL))
+    statement, = generator.statements
+    assert statement['action'] == 'alter_table'
+    assert generator.planner.coalesced == 2
+    sql = "\n".join(statement['sql'])
+    assert sql.index('ADD COLUMN IF NOT EXISTS zona') < sql.index('ADD COLUMN IF NOT EXISTS piso')
+    assert 'ADD CONSTRAINT mesas_piso_check CHECK (piso >= 0)' in sql
+
+def test_coalesce_respects_online_budget():
+    # Cada UNIQUE cabe en el límite de 2 s, dos juntos no
+    generator = _plan({
+        'constraints': {'added': [_constraint('clientes', f'clientes_c{i}_key', 'UNIQUE', [f'c{i}'])
+                                  for i in range(3)]}
+    }, _stats(clientes=MEDIUM))
+    assert [statement['phase'] for statement in generator.statements] == [PHASE_ONLINE] * 3
+    assert all(statement['estimate'] <= 2 for statement in generator.statements)
+    assert generator.planner.coalesced == 0
@@ -0,0 +1,25 @@
+"""
+Pruebas de los filtros de extracción y de lo que se guarda en la caché
+"""
+from schema_extractor import SchemaExtractor, glob_to_like
+from schema_model import TABLE_STATS_FIELDS
+
+def test_glob_wildcards():
+    assert glob_to_like('venta*') == 'venta%'
+    assert glob_to_like('mesa?') == 'mesa_'
+
+def test_glob_escapes_like_wildcards():
+    assert glob_to_like('detalle_ventas') == 'detalle\\_ventas'
+    assert glob_to_like('100%') == '100\\%'
+    assert glob_to_like('a\\b') == 'a\\\\b'
+
+def test_table_stats_are_not_cached():
+    table = {'schemaname': 'public', 'tablename': 'ventas', 'hasindexes': True}
+    table.update((name, 1) for name in TABLE_STATS_FIELDS)
+    schema = {'tables': [table], 'columns': [{'table_name': 'ventas', 'column_name': 'total'}]}
+    
+    cached = SchemaExtractor()._without_table_stats(schema)
+    assert cached['tables'] == [{'schemaname': 'public', 'tablename': 'ventas', 'hasindexes': True}]
+    assert cached['columns'] is schema['columns']
+    # El esquema extraído conserva los valores actuales
+    assert schema['tables'][0]['reltuples'] == 1
@@ -0,0 +1,36 @@
+"""
+Pruebas de la caché de snapshots
+"""
+from snapshot_cache import SnapshotCache
+
+FULL = {'include_tables': [], 'object_types': ['tables', 'functions']}
+FILTERED = {'include_tables': ['ventas'], 'object_types': ['tables', 'functions']}
+
+def _schema(*tables):
+    return {'tables': [{'schemaname': 'public', 'tablename': table} for table in tables]}
+
+def test_get_requires_same_options(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    cache.put('local', 'a' * 64, _schema('ventas', 'mesas'), FULL)
+    assert cache.get('local', 'a' * 64, FULL) == _schema('ventas', 'mesas')
+    assert cache.get('local', 'a' * 64, FILTERED) is None
+
+def test_latest_ignores_snapshots_with_other_options(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    cache.put('local', 'a' * 64, _schema('ventas', 'mesas'), FULL)
+    # Una extracción posterior con filtros no reemplaza al snapshot completo
+    cache.put('local', 'b' * 64, _schema('ventas'), FILTERED)
+    
+    assert cache.get_latest('local', FULL)['schema'] == _schema('ventas', 'mesas')
+    assert cache.get_latest('local', FILTERED)['schema'] == _schema('ventas')
+    assert cache.get_latest('local', {'object_types': ['tables']}) is None
+
+def test_put_replaces_older_snapshots_with_same_options(tmp_path):
+    cache = SnapshotCache(str(tmp_path))
+    cache.put('local', 'a' * 64, _schema('ventas'), FULL)
+    cache.put('local', 'b' * 64, _schema('ventas', 'mesas'), FULL)
+    cache.put('local.hashed', 'c' * 64, _schema('ventas'), dict(FULL, hash_definitions=True))
+    
+    assert cache.get('local', 'a' * 64, FULL) is None
+    assert cache.get_latest('local', FULL)['fingerprint'] == 'b' * 64
+    assert len(list(tmp_path.iterdir())) == 2